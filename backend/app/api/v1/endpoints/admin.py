@@ -0,0 +1,93 @@
+"""
+Admin-only diagnostics and model roll-outs. Every route needs
+`X-Admin-Token: $ADMIN_TOKEN`; with ADMIN_TOKEN unset the whole router
+answers 403.
+"""
+import secrets
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+
+from ....config import settings
+from .... import profiling
+from ....services import bert_classifier, model_registry
+
+
+def valid_token(token: Optional[str]) -> bool:
+    return bool(settings.ADMIN_TOKEN and token) and secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+
+def require_admin(x_admin_token: Annotated[Optional[str], Header()] = None):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN unset)")
+    if not valid_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def require_profiling():
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (PROFILING_ENABLED=false)")
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+profiling_deps = [Depends(require_profiling)]
+
+
+@router.post("/profile", dependencies=profiling_deps)
+async def start_profile(seconds: Annotated[float, Query(gt=0)] = 30):
+    """Sample every thread for `seconds`; fetch the result from GET /profile/{name}."""
+    name = profiling.profile_window(seconds)
+    if name is None:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    return {"file": name, "seconds": min(seconds, settings.PROFILE_MAX_SECONDS)}
+
+
+@router.get("/profile", dependencies=profiling_deps)
+async def list_profiles():
+    return profiling.list_profiles()
+
+
+@router.get("/profile/{name}", dependencies=profiling_deps)
+async def get_profile(name: str):
+    path = profiling.profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile")
+    return FileResponse(path, filename=path.name)
+
+
+@router.post("/profile/torch", dependencies=profiling_deps)
+async def arm_torch_profiler(calls: Annotated[int, Query(ge=0, le=100)] = 5):
+    """Record the next `calls` classifier forward passes (0 disarms)."""
+    profiling.arm_torch(calls)
+    return {"armed_calls": calls}
+
+
+@router.post("/memory/snapshot", dependencies=profiling_deps)
+async def memory_snapshot(top: Annotated[int, Query(ge=1, le=200)] = 20):
+    """First call starts tracemalloc; later calls diff against the previous snapshot."""
+    return await run_in_threadpool(profiling.memory_snapshot, top)
+
+
+@router.delete("/memory", dependencies=profiling_deps)
+async def stop_memory_tracing():
+    profiling.stop_tracing()
+    return {"tracing": "stopped"}
+
+
+@router.get("/models")
+async def list_models():
+    """Registered classifier versions and the state of the active one."""
+    status = await run_in_threadpool(bert_classifier.classifier_status)
+    return {"versions": model_registry.manifest()["versions"], **status}
+
+
+@router.post("/models/{version}/activate", status_code=202)
+async def activate_model(version: str):
+    """Load `version` in the background, warm it up, swap it in and drain the old model."""
+    if version not in model_registry.manifest()["versions"]:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {version!r}")
+    if not await run_in_threadpool(bert_classifier.activate, version):
+        raise HTTPException(status_code=409, detail="A model swap is already in progress")
+    return {"loading": version}
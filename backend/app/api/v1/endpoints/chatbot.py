@@ -9,23 +9,41 @@ Works with:
 
 from __future__ import annotations
 
+import asyncio
 import datetime as _dt
 from datetime import datetime
 import json
 import re
+import threading
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+import pandas as pd
 
+from ....config import settings
 from ....models import ChatRequest, ChatResponse
-from ....reports import basic_metrics, fetch_messages, spike_dates
+from ....reports import basic_metrics, fetch_messages, has_messages, spike_dates
 from ....services import LLMServiceProtocol, get_llm_service
+from ....services.dimensions import dimensions
+from ....services.heavy_hitters import KINDS, heavy_hitters
+from ....telemetry import span
 
 router = APIRouter()
 
-# Dataset date range
-DATASET_START = datetime(2024, 1, 11)  # January 11, 2024
-DATASET_END = datetime(2025, 1, 30)    # January 30, 2025
+
+def _data_range() -> Optional[Tuple[datetime, datetime]]:
+    """(first, last) message timestamp as naive UTC, or None for an empty dataset."""
+    first, last = dimensions.confirmed_bounds()
+    if first is None or last is None:
+        return None
+    utc = lambda ts: ts.astimezone(_dt.timezone.utc).replace(tzinfo=None)
+    return utc(first), utc(last)
+
+
+def _range_text(data_range: Tuple[datetime, datetime]) -> str:
+    return f"{data_range[0].strftime('%B %d, %Y')} to {data_range[1].strftime('%B %d, %Y')}"
 
 # ────────────────────────
 #  Conversational memory
@@ -39,37 +57,76 @@ def _remember(user_id: str, category, source, days):
 # ────────────────────────
 #  LLM tool schema (aka function spec)
 # ────────────────────────
+MAX_FILTER_SETS = 6
+
+_FILTER_PROPERTIES = {
+    "category": {
+        "type": "string",
+        "enum": [
+            "bonus",
+            "deposit",
+            "withdraw",
+            "game_issue",
+            "login_account",
+            "anger_feedback",
+            "other",
+        ],
+    },
+    "source": {
+        "type": "string",
+        "enum": ["livechat", "telegram"],
+    },
+    "days_back": {
+        "type": "integer",
+        "description": "Look-back window in days",
+        "maximum": 365  # Allow up to a year
+    },
+}
+
 FILTER_SCHEMA = {
     "name": "filter_messages",
     "description": "Extract filters from the user query",
     "parameters": {
         "type": "object",
         "properties": {
-            "category": {
-                "type": "string",
-                "enum": [
-                    "bonus",
-                    "deposit",
-                    "withdraw",
-                    "game_issue",
-                    "login_account",
-                    "anger_feedback",
-                    "other",
-                ],
-            },
-            "source": {
-                "type": "string",
-                "enum": ["livechat", "telegram"],
-            },
-            "days_back": {
-                "type": "integer",
-                "description": "Look-back window in days",
-                "maximum": 365  # Allow up to a year
+            **_FILTER_PROPERTIES,
+            "filter_sets": {
+                "type": "array",
+                "maxItems": MAX_FILTER_SETS,
+                "description": "Only for comparisons (categories, sources or periods): one entry per "
+                               "side, e.g. deposit vs withdraw this month vs last month = 4 entries",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "label": {"type": "string", "description": "Short name, e.g. 'deposit, last month'"},
+                        **_FILTER_PROPERTIES,
+                        "offset_days": {
+                            "type": "integer",
+                            "description": "The window ends this many days before the latest data "
+                                           "(30 with days_back 30 = the previous month)",
+                            "minimum": 0,
+                        },
+                    },
+                },
             },
         },
     },
 }
 
+TOP_SCHEMA = {
+    "name": "top_contacts",
+    "description": "Users who contacted support most often, or the most repeated message phrasings",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "by": {"type": "string", "enum": list(KINDS)},
+            "days_back": _FILTER_PROPERTIES["days_back"],
+            "limit": {"type": "integer", "minimum": 1, "maximum": 20},
+        },
+        "required": ["by"],
+    },
+}
+
 # ────────────────────────
 #  Fallback regex parser (HF models ignore tool schema)
 # ────────────────────────
@@ -78,6 +135,17 @@ _CAT_RE = re.compile(
 )
 _SRC_RE = re.compile(r"\b(livechat|telegram)\b", re.I)
 _DAYS_RE = re.compile(r"\b(\d+)\s*day", re.I)
+_TOP_RE = re.compile(r"\b(top|most|repeat\w*|frequent\w*|recurring)\b", re.I)
+_TOP_BY_RE = re.compile(r"\b(?:(users?|customers?|players?|contacters?)|(phras\w*|wording\w*|texts?))\b", re.I)
+
+
+_CAT_ALIASES = {"login": "login_account", "angry": "anger_feedback", "anger": "anger_feedback"}
+
+
+def _category(word: str) -> str:
+    """Map a regex hit onto the FILTER_SCHEMA category enum."""
+    word = word.lower()
+    return "game_issue" if word.startswith("game") else _CAT_ALIASES.get(word, word)
 
 
 def _regex_parse(text: str) -> Tuple[Optional[str], Optional[str], int]:
@@ -85,11 +153,215 @@ def _regex_parse(text: str) -> Tuple[Optional[str], Optional[str], int]:
     src = _SRC_RE.search(text)
     days = _DAYS_RE.search(text)
     return (
-        cat.group(1).lower() if cat else None,
+        _category(cat.group(1)) if cat else None,
         src.group(1).lower() if src else None,
-        int(days.group(1)) if days else 30,
+        min(int(days.group(1)), 365) if days else 30,
     )
 
+
+def _top_request(text: str) -> Optional[Dict[str, Any]]:
+    """top_contacts arguments for "top users / most repeated phrases" questions, else None."""
+    by = _TOP_BY_RE.search(text)
+    if not (by and _TOP_RE.search(text)):
+        return None
+    return {"by": "user" if by.group(1) else "phrase", "days_back": _regex_parse(text)[2]}
+
+
+def _tool_args(filter_response: Any) -> Optional[Dict[str, Any]]:
+    """Arguments of the filter tool call, or None if the LLM did not call it.
+
+    OpenAI returns `{"tool_call": {"function": {"arguments": "<json>"}}}`;
+    a bare `{"tool_call": {"arguments": ...}}` is accepted as well.
+    """
+    if not isinstance(filter_response, dict) or not filter_response.get("tool_call"):
+        return None
+    call = filter_response["tool_call"]
+    args = (call.get("function") or call).get("arguments")
+    try:
+        return json.loads(args) if isinstance(args, str) else dict(args or {})
+    except (TypeError, ValueError):
+        return None
+
+
+def _tool_name(filter_response: Dict[str, Any]) -> Optional[str]:
+    call = filter_response["tool_call"]
+    return (call.get("function") or call).get("name")
+
+
+# ────────────────────────
+#  Filter sets → shared scans
+# ────────────────────────
+Filters = Tuple[Optional[str], Optional[str], int, int]  # category, source, days_back, offset_days
+
+
+def _parse_filter_sets(args: Dict[str, Any]) -> List[Tuple[Filters, Optional[str]]]:
+    """(filters, label) per requested set; the top-level fields when there are no filter_sets."""
+    sets = []
+    for item in (args.get("filter_sets") or [args])[:MAX_FILTER_SETS]:
+        if not isinstance(item, dict):
+            continue
+        try:
+            days = min(int(item.get("days_back") or 30), 365)  # Cap at 1 year
+            offset = max(int(item.get("offset_days") or 0), 0)
+        except (TypeError, ValueError):
+            days, offset = 30, 0
+        sets.append(((item.get("category"), item.get("source"), days, offset), item.get("label")))
+    return sets or [((None, None, 30, 0), None)]
+
+
+def _window(filters: Filters, data_range: Tuple[datetime, datetime]) -> Tuple[datetime, datetime]:
+    days, offset = filters[2], filters[3]
+    end = min(data_range[1], _dt.datetime.utcnow()) - _dt.timedelta(days=offset)
+    return max(data_range[0], end - _dt.timedelta(days=days)), end
+
+
+def _plan_scans(sets: List[Filters], data_range: Tuple[datetime, datetime]):
+    """Merge filter sets with overlapping windows into one fetch that covers them all.
+
+    Returns each set's window and the scans as (category, source, start, end, set indexes).
+    """
+    windows = [_window(f, data_range) for f in sets]
+    groups: List[List[int]] = []
+    for i in sorted(range(len(sets)), key=lambda i: windows[i][0]):
+        if groups and windows[i][0] <= max(windows[j][1] for j in groups[-1]):
+            groups[-1].append(i)
+        else:
+            groups.append([i])
+    scans = []
+    for idxs in groups:
+        cats = [sets[i][0] for i in idxs]
+        srcs = {sets[i][1] for i in idxs}
+        scans.append((
+            None if None in cats else ",".join(dict.fromkeys(cats)),
+            srcs.pop() if len(srcs) == 1 else None,
+            min(windows[i][0] for i in idxs),
+            max(windows[i][1] for i in idxs),
+            idxs,
+        ))
+    return windows, scans
+
+
+def _fetch_scan(category: Optional[str], source: Optional[str], start: datetime, end: datetime,
+                cancelled: threading.Event | None = None) -> Optional[pd.DataFrame]:
+    # categories with no messages at all need no query (probe: the snapshot can lag other writers)
+    if category and dimensions.count(category=category) == 0 and not has_messages(category, None, None, None):
+        return None
+    with span("chat.fetch"):
+        df = fetch_messages(category, source, start, end)
+    return None if df.empty or (cancelled is not None and cancelled.is_set()) else df
+
+
+def _aggregate(df: Optional[pd.DataFrame], filters: Filters, start: datetime, end: datetime,
+               shared: bool = False) -> Dict[str, Any]:
+    """Facts for one filter set; a `shared` scan is first cut down to the set's rows."""
+    result: Dict[str, Any] = {"start": start, "end": end, "stats": None}
+    if df is not None and shared:
+        ts = df['timestamp']
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        if ts.dt.tz is not None:
+            lo, hi = lo.tz_localize("UTC"), hi.tz_localize("UTC")
+        mask = (ts >= lo) & (ts <= hi)
+        if filters[0]:
+            mask &= df['category'] == filters[0]
+        if filters[1]:
+            mask &= df['source'] == filters[1]
+        df = df[mask]
+    if df is None or df.empty:
+        return result
+    with span("chat.aggregate"):
+        result.update(
+            stats=basic_metrics(df),
+            spikes=spike_dates(df),
+            actual_start=df['timestamp'].min(),
+            actual_end=df['timestamp'].max(),
+            category_counts=df.groupby('category').size().to_dict(),
+        )
+    return result
+
+
+async def _gather_sets(sets: List[Filters], data_range: Tuple[datetime, datetime]) -> List[Dict[str, Any]]:
+    """All filter sets' facts: overlapping windows share a scan, scans run concurrently."""
+    windows, scans = _plan_scans(sets, data_range)
+    frames = await asyncio.gather(*(
+        run_in_threadpool(_fetch_scan, category, source, start, end)
+        for category, source, start, end, _ in scans
+    ))
+
+    def aggregate_all():
+        results: List[Dict[str, Any]] = [{}] * len(sets)
+        for scan, df in zip(scans, frames):
+            for i in scan[4]:
+                results[i] = _aggregate(df, sets[i], *windows[i], shared=len(scan[4]) > 1)
+        return results
+    return await run_in_threadpool(aggregate_all)
+
+
+# ────────────────────────
+#  Speculative fetch
+# ────────────────────────
+_speculation = {"attempts": 0, "hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+def _speculate(text: str, user_id: str) -> Filters:
+    """Best guess at the LLM's filters: regex hits, gaps filled from the previous turn."""
+    category, source, days = _regex_parse(text)
+    prev = _memory.get(user_id)
+    if prev:
+        category = category or prev["category"]
+        source = source or prev["source"]
+        days = days if _DAYS_RE.search(text) else prev["days"]
+    return category, source, days, 0
+
+
+def _gather(filters: Filters, data_range: Tuple[datetime, datetime],
+            cancelled: threading.Event | None = None) -> Dict[str, Any]:
+    """Fetch + aggregate for one filter set; runs in a worker thread."""
+    t0 = time.perf_counter()
+    start, end = _window(filters, data_range)
+    result = _aggregate(_fetch_scan(filters[0], filters[1], start, end, cancelled), filters, start, end)
+    result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+def _describe(filters: Filters, label: Optional[str], result: Dict[str, Any]) -> str:
+    period = f"{result['start'].strftime('%B %d, %Y')} to {result['end'].strftime('%B %d, %Y')}"
+    name = label or f"{_format_category(filters[0])}, {_format_source(filters[1])}"
+    return f"{name} ({period})"
+
+# ────────────────────────
+#  Heavy hitters (top_contacts tool)
+# ────────────────────────
+def _int_arg(value: Any, default: int, lo: int, hi: int) -> int:
+    """An LLM-supplied count: numbers or numeric strings, clamped to [lo, hi]; else default."""
+    try:
+        n = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        return default
+    return max(lo, min(n, hi))
+
+
+def _top_facts(args: Dict[str, Any], data_range: Tuple[datetime, datetime]) -> Tuple[str, str, str]:
+    """(period, facts, context) for a top_contacts call, read from the heavy-hitter sketches."""
+    by = args.get("by") if args.get("by") in KINDS else "user"
+    days = _int_arg(args.get("days_back"), 30, 1, 365)
+    limit = _int_arg(args.get("limit"), 5, 1, 20)
+    start, end = _window((None, None, days, 0), data_range)
+    result = heavy_hitters.top(by, start, end, limit)
+    period = f"{start.strftime('%B %d, %Y')} to {end.strftime('%B %d, %Y')}"
+    lines = [f"- Messages in the period: {result['rows']}"]
+    for item in result["items"]:
+        name = f"user {item['key']}" if by == "user" else f'"{item["key"]}"'
+        lines.append(
+            f"- {name}: {item['count']} messages"
+            + (f" (possibly up to {item['error']} fewer)" if item["error"] else "")
+            + f"; {item['previous']} in the {days} days before"
+        )
+    if not result["items"]:
+        lines.append(f"- No {by} counts recorded for this period")
+    context = f"Top {len(result['items'])} {by}s by message count, {period}"
+    return period, "\n".join(lines), context
+
+
 def _format_category(cat: str) -> str:
     """Make category name more readable"""
     if not cat:
@@ -147,6 +419,32 @@ def _format_response(stats: Dict[str, Any], category: str, source: str, days: in
     
     return "".join(parts) + "."
 
+
+async def _answer(svc: LLMServiceProtocol, req: ChatRequest, data_range: Tuple[datetime, datetime],
+                  period: str, facts: str) -> str:
+    """Second LLM pass: phrase the facts as a short answer to the user's question."""
+    prompt = f"""You are a support analytics assistant. Answer the following query concisely in 1-2 sentences: "{req.message}"
+
+Available data range: {_range_text(data_range)}
+Current query period: {period}
+
+Facts:
+{facts}
+
+Rules:
+1. Only report numbers that are explicitly shown in the facts above
+2. If asked about dates outside our data range, mention the actual data range
+3. Never make up or estimate numbers
+4. If unsure, say you don't have that specific information"""
+
+    with span("chat.answer_llm"):
+        response = await svc.chat(prompt=prompt, history=[msg.content for msg in req.history])
+    
+    if isinstance(response, dict):
+        response = response.get("content", "I couldn't analyze the support data properly.")
+    return response
+
+
 # ────────────────────────
 #  Endpoint
 # ────────────────────────
@@ -156,76 +454,121 @@ async def chat(
     svc: LLMServiceProtocol = Depends(get_llm_service),
 ):
     user_id = "demo"  # replace with auth-derived id in prod
+    data_range = await run_in_threadpool(_data_range)
+    if data_range is None:
+        return ChatResponse(response="There are no support messages in the dataset yet.",
+                            context="Dataset is empty")
 
-    # ---------- 1) Extract filters with LLM ----------
-    filter_response = await svc.chat(
-        prompt=f"""Extract date range and filters from: "{req.message}"
-Note: Our dataset only contains support messages from {DATASET_START.strftime('%B %d, %Y')} to {DATASET_END.strftime('%B %d, %Y')}.""",
-        history=[msg.content for msg in req.history],
-        tools=[FILTER_SCHEMA],
-    )
+    # ---------- 1) Extract filters with LLM, speculatively fetching meanwhile ----------
+    guess = _speculate(req.message, user_id)
+    cancelled = threading.Event()
+    speculative = None
+    # a "top users / phrases" question is answered from the sketches, there is nothing to prefetch
+    if settings.CHAT_SPECULATIVE_FETCH and _top_request(req.message) is None:
+        speculative = asyncio.ensure_future(run_in_threadpool(_gather, guess, data_range, cancelled))
+    t0 = time.perf_counter()
+    extracted = False
+    try:
+        with span("chat.filter_llm"):
+            filter_response = await svc.chat(
+                prompt=f"""Extract date range and filters from: "{req.message}"
+Note: Our dataset only contains support messages from {_range_text(data_range)}.""",
+                history=[msg.content for msg in req.history],
+                tools=[FILTER_SCHEMA, TOP_SCHEMA],
+            )
+        extracted = True
+    finally:
+        # an LLM error (or a client disconnect) must not leave the prefetch running unowned
+        if not extracted and speculative is not None:
+            cancelled.set()
+            speculative.cancel()
+    llm_seconds = time.perf_counter() - t0
 
-    # ---------- 2) Parse filters ----------
-    category = source = None
-    days = 30  # Default to last 30 days
+    # ---------- 2) Parse filters (one set, or several for a comparison) ----------
+    args = _tool_args(filter_response)
+    top = _top_request(req.message) if args is None else \
+        args if _tool_name(filter_response) == TOP_SCHEMA["name"] else None
+    if top is not None:
+        if speculative is not None:
+            cancelled.set()
+            speculative.cancel()
+            _speculation["attempts"] += 1
+            _speculation["misses"] += 1
+        period, facts, context = await run_in_threadpool(_top_facts, top, data_range)
+        return ChatResponse(response=await _answer(svc, req, data_range, period, facts), context=context)
+
+    # no tool call (e.g. HF): the regex parse is all we have
+    labelled = [(guess, None)] if args is None else _parse_filter_sets(args)
+    sets = [f for f, _ in labelled]
+    category, source, days, _ = sets[0]
+    _remember(user_id, category, source, days)
+
+    # ---------- 3) fetch data and analyze (reusing the speculative fetch if it guessed right) ----------
+    results = None
+    if speculative is not None:
+        _speculation["attempts"] += 1
+        if sets == [guess]:
+            result = await speculative
+            results = [result]
+            _speculation["hits"] += 1
+            # sequential would have been llm + fetch; the overlap is what we saved
+            _speculation["saved_seconds"] += min(llm_seconds, result.get("seconds", 0.0))
+        else:
+            cancelled.set()     # the thread finishes its query but skips the aggregation
+            speculative.cancel()
+            _speculation["misses"] += 1
+    if results is None:
+        results = await _gather_sets(sets, data_range)
 
-    if isinstance(filter_response, dict) and filter_response.get("tool_call"):
-        try:
-            args = json.loads(filter_response["tool_call"]["arguments"])
-            category = args.get("category")
-            source = args.get("source")
-            days = min(args.get("days_back", 30), 365)  # Cap at 1 year
-        except Exception:
-            pass
-
-    # ---------- 3) fetch data and analyze ----------
-    end = min(DATASET_END, _dt.datetime.utcnow())
-    start = max(DATASET_START, end - _dt.timedelta(days=days))
-    df = fetch_messages(category, source, start, end)
-    
     # Validate we have data
-    if df.empty:
+    if all(r["stats"] is None for r in results):
         return ChatResponse(
-            response=f"I found no support messages for your query in our dataset (which covers {DATASET_START.strftime('%B %d, %Y')} to {DATASET_END.strftime('%B %d, %Y')}).",
-            context=f"No data found between {start.date()} and {end.date()}"
+            response=f"I found no support messages for your query in our dataset (which covers {_range_text(data_range)}).",
+            context=f"No data found between {min(r['start'] for r in results).date()} and {max(r['end'] for r in results).date()}"
         )
 
-    stats = basic_metrics(df)
-    spikes = spike_dates(df)
-
-    # Get actual date range from data
-    actual_start = df['timestamp'].min()
-    actual_end = df['timestamp'].max()
-    
-    # Get category breakdown if any messages found
-    category_counts = {}
-    if not df.empty:
-        category_counts = df.groupby('category').size().to_dict()
-
     # ---------- 4) Generate contextual response ----------
-    prompt = f"""You are a support analytics assistant. Answer the following query concisely in 1-2 sentences: "{req.message}"
-
-Available data range: {DATASET_START.strftime('%B %d, %Y')} to {DATASET_END.strftime('%B %d, %Y')}
-Current query period: {actual_start.strftime('%B %d, %Y')} to {actual_end.strftime('%B %d, %Y')}
-
-Facts:
-- Total messages: {stats['total_messages']}
-- By category: {category_counts}
+    if len(results) == 1:
+        result = results[0]
+        stats, spikes = result["stats"], result["spikes"]
+        actual_start, actual_end = result["actual_start"], result["actual_end"]
+        period = f"{actual_start.strftime('%B %d, %Y')} to {actual_end.strftime('%B %d, %Y')}"
+        facts = f"""- Total messages: {stats['total_messages']}
+- By category: {result['category_counts']}
 - Unique users: {stats['unique_users']}
-{f"- Spike detected: {spikes[-1]['count']} messages on {spikes[-1]['date']}" if spikes else ""}
+{f"- Spike detected: {spikes[-1]['count']} messages on {spikes[-1]['date']}" if spikes else ""}"""
+        context = f"Found {stats['total_messages']} messages from {actual_start.strftime('%B %d')} to {actual_end.strftime('%B %d, %Y')}"
+    else:
+        period = f"{len(results)} sets compared, see the facts"
+        lines = []
+        for (filters, label), result in zip(labelled, results):
+            stats = result["stats"]
+            if stats is None:
+                lines.append(f"- {_describe(filters, label, result)}: no messages")
+                continue
+            spikes = result["spikes"]
+            lines.append(
+                f"- {_describe(filters, label, result)}: {stats['total_messages']} messages from "
+                f"{stats['unique_users']} unique users; by category {result['category_counts']}"
+                + (f"; spike of {spikes[-1]['count']} messages on {spikes[-1]['date']}" if spikes else "")
+            )
+        facts = "\n".join(lines)
+        context = "Compared " + ", ".join(
+            f"{label or _format_category(filters[0])}: {r['stats']['total_messages'] if r['stats'] else 0}"
+            for (filters, label), r in zip(labelled, results)
+        )
 
-Rules:
-1. Only report numbers that are explicitly shown in the facts above
-2. If asked about dates outside our data range, mention the actual data range
-3. Never make up or estimate numbers
-4. If unsure, say you don't have that specific information"""
+    return ChatResponse(response=await _answer(svc, req, data_range, period, facts), context=context)
 
-    response = await svc.chat(prompt=prompt, history=[msg.content for msg in req.history])
-    
-    if isinstance(response, dict):
-        response = response.get("content", "I couldn't analyze the support data properly.")
 
-    return ChatResponse(
-        response=response,
-        context=f"Found {stats['total_messages']} messages from {actual_start.strftime('%B %d')} to {actual_end.strftime('%B %d, %Y')}"
-    )
+@router.get("/speculation")
+async def speculation_stats():
+    """How often the speculative fetch matched the LLM's filters, and the latency it saved."""
+    attempts, hits = _speculation["attempts"], _speculation["hits"]
+    return {
+        "enabled": settings.CHAT_SPECULATIVE_FETCH,
+        **_speculation,
+        "saved_seconds": round(_speculation["saved_seconds"], 3),
+        "hit_rate": round(hits / attempts, 3) if attempts else None,
+        "avg_saved_ms": round(_speculation["saved_seconds"] / hits * 1000, 1) if hits else None,
+    }
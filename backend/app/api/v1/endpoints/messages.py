@@ -1,15 +1,29 @@
-from datetime import datetime as dt
-from typing import Annotated, Optional, Union
-from pydantic import BaseModel
-from fastapi import APIRouter, Query
+import hashlib
+import json
+from datetime import datetime as dt, timezone
+from typing import Annotated, Literal, Optional, Union
+from pydantic import BaseModel, ValidationError
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 #from ....services.classifier_service import classify
-from ....services.bert_classifier import classify
+from ....services.bert_classifier import classify, classify_batch, classify_multi, embed, model_version
+from ....services.embedding_index import get_index
+from ....ml.dedup import classify_deduplicated
+from ....ml.labels import labels_to_mask
+from ....config import settings
 
 from ....models import Message
-from .... import reports  # new helper
-
-import csv, pathlib, datetime
-CSV_PATH = pathlib.Path("data/messages_mirror.csv")
+from .... import export, reports  # new helper
+from .... import rollups
+from ....services.anomaly import detector
+from ....services import local_store
+from ....services.mirror import mirror
+from ....services import jobs
+from ....services.dimensions import dimensions
+from ....services.heavy_hitters import heavy_hitters
+from ....services.hll import user_sketches
 
 router = APIRouter()
 
@@ -24,45 +38,326 @@ def parse_date(date_str: Optional[str]) -> Optional[dt]:
     except ValueError:
         return None
 
+def _index_rows(rows: list[dict]):
+    get_index().append([r["id"] for r in rows], embed([r["message"] for r in rows]))
+
+async def _classifier_version(msgs: list[Message]) -> str | None:
+    """model_version() if the request classifies anything; it hashes model dirs or asks the model server."""
+    if settings.CLASSIFY_ASYNC or all(m.category is not None for m in msgs):
+        return None
+    return await run_in_threadpool(model_version)
+
+def _stamp_version(msg: Message, version: str | None):
+    """Record which classifier labels the row; caller-supplied labels are never re-run."""
+    if msg.category is not None:
+        msg.model_version = msg.model_version or "manual"
+    elif not settings.CLASSIFY_ASYNC:
+        msg.model_version = version
+
+def _post_ingest(stored: list[dict], background: BackgroundTasks):
+    """Fan freshly stored rows out to roll-ups, local store, embeddings and mirror."""
+    # unclassified rows reach the roll-ups and local store once a worker labels them
+    labelled = [r for r in stored if r.get("category")]
+    pending = [r for r in stored if not r.get("category") and r.get("id")]
+    rollups.observe(labelled)
+    if settings.ANALYTICS_BACKEND == "local":
+        local_store.append(labelled)
+    if pending:
+        jobs.submit(pending)
+    with_ids = [r for r in stored if r.get("id")]
+    if settings.EMBED_ON_INGEST and with_ids:
+        background.add_task(_index_rows, with_ids)
+
+    # local mirror – queued, written by the background writer
+    mirror.enqueue(stored)
+
 @router.post("")
-async def ingest(msg: Message):
-    if msg.category is None:
+async def ingest(msg: Message, background: BackgroundTasks):
+    _stamp_version(msg, await _classifier_version([msg]))
+    # with CLASSIFY_ASYNC a worker fills category / labels_mask after the insert
+    if settings.MULTI_LABEL and msg.labels_mask is None and not settings.CLASSIFY_ASYNC:
+        labels = classify_multi([msg.message])[0]
+        msg.labels_mask = labels_to_mask(labels)
+        msg.category = msg.category or labels[0]
+    if msg.category is None and not settings.CLASSIFY_ASYNC:
         msg.category = classify(msg.message)
     # insert into Supabase
-    _ = reports.supabase.table("messages").insert(msg.dict()).execute()
-
-    # local CSV upsert (append)
-    write_header = not CSV_PATH.exists()
-    with CSV_PATH.open("a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=msg.dict().keys())
-        if write_header: w.writeheader()
-        w.writerow(msg.dict())
+    row = jsonable_encoder(msg, exclude_none=True)  # let Supabase fill id / created_at
+    res = reports.supabase.table("messages").insert(row).execute()
+    _post_ingest(res.data or [row], background)
 
     return msg
 
+async def _read_items(request: Request) -> list:
+    """JSON array body, or NDJSON streamed line by line (stops at the size cap)."""
+    limit = settings.BULK_MAX_ITEMS
+    if "ndjson" not in request.headers.get("content-type", ""):
+        try:
+            items = json.loads(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of messages")
+        if len(items) > limit:
+            raise HTTPException(status_code=413, detail=f"At most {limit} messages per request")
+        return items
+
+    items, tail = [], b""
+    async for chunk in request.stream():
+        *lines, tail = (tail + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                items.append(line)
+        if len(items) > limit:
+            raise HTTPException(status_code=413, detail=f"At most {limit} messages per request")
+    if tail.strip():
+        items.append(tail)
+        if len(items) > limit:
+            raise HTTPException(status_code=413, detail=f"At most {limit} messages per request")
+    return items
+
+@router.post("/bulk")
+async def ingest_bulk(request: Request, background: BackgroundTasks):
+    """Validate, batch-classify and insert many messages; per-item status in order."""
+    items = await _read_items(request)
+    results: list[dict] = [{"index": i} for i in range(len(items))]
+
+    valid: list[tuple[int, Message]] = []
+    for i, item in enumerate(items):
+        try:
+            obj = json.loads(item) if isinstance(item, bytes) else item
+            valid.append((i, Message(**obj)))
+        except (ValueError, TypeError, ValidationError) as e:
+            results[i].update(status="invalid", error=str(e))
+    version = await _classifier_version([m for _, m in valid])
+    for _, m in valid:
+        _stamp_version(m, version)
+
+    # one batched model call for everything unlabeled (exact repeats share it)
+    # (with CLASSIFY_ASYNC both are left to the classification workers)
+    if settings.MULTI_LABEL and not settings.CLASSIFY_ASYNC:
+        todo = [m for _, m in valid if m.labels_mask is None]
+        if todo:
+            multi = await run_in_threadpool(classify_multi, [m.message for m in todo])
+            for m, labels in zip(todo, multi):
+                m.labels_mask = labels_to_mask(labels)
+                m.category = m.category or labels[0]
+    todo = [m for _, m in valid if m.category is None]
+    if todo and not settings.CLASSIFY_ASYNC:
+        labels, _ = await run_in_threadpool(
+            classify_deduplicated, [m.message for m in todo], classify_batch, 1.0
+        )
+        for m, label in zip(todo, labels):
+            m.category = label
+
+    stored: list[dict] = []
+    chunk = settings.BULK_INSERT_CHUNK
+    for start in range(0, len(valid), chunk):
+        part = valid[start:start + chunk]
+        rows = [jsonable_encoder(m, exclude_none=True) for _, m in part]
+        try:
+            res = await run_in_threadpool(reports.supabase.table("messages").insert(rows).execute)
+        except Exception as e:
+            for i, _ in part:
+                results[i].update(status="error", error=str(e))
+            continue
+        data = res.data or rows
+        for (i, m), row in zip(part, data):
+            results[i].update(status="inserted", id=row.get("id"), category=m.category)
+        stored.extend(data)
+
+    _post_ingest(stored, background)
+    return {
+        "received": len(items),
+        "inserted": len(stored),
+        "failed": len(items) - len(stored),
+        "items": results,
+    }
+
+def _no_matching_rows(category: str | None, source: str | None, start: dt | None, end: dt | None) -> bool:
+    """True when the query is provably empty: the dimensions snapshot says so and a
+    limit-1 probe agrees (the snapshot can lag writes from other workers or scripts)."""
+    if dimensions.loaded_at is None:
+        return False
+    first, last = dimensions.bounds()
+    utc = lambda ts: ts.astimezone(timezone.utc).replace(tzinfo=None)
+    hint = first is None or (start and start > utc(last)) or (end and end < utc(first)) or \
+        (bool(category) and dimensions.count(category=category) == 0) or \
+        (bool(source) and dimensions.count(source=source) == 0)
+    return bool(hint) and not reports.has_messages(category, source, start, end)
+
 @router.get("/metrics")
 async def metrics(
     category: Annotated[Optional[str], Query()] = None,
     source: Annotated[Optional[str], Query()] = None,
     start: Annotated[Optional[str], Query()] = None,
     end: Annotated[Optional[str], Query()] = None,
+    exact: Annotated[bool, Query(description="count distinct users exactly instead of via HyperLogLog")] = False,
 ):
     dt_start = parse_date(start)
     dt_end = parse_date(end)
-    df = reports.fetch_messages(category, source, dt_start, dt_end)
+    empty = await run_in_threadpool(_no_matching_rows, category, source, dt_start, dt_end)
+    first, last = dimensions.first, dimensions.last
+    if empty:
+        return {
+            "total_messages": 0, "unique_users": 0, "unique_users_exact": True, "categories": {},
+            "spikes": [], "anomalies": {"hour": [], "day": []},
+            "data_range": {"first": first, "last": last},
+        }
+    # the local store counts distinct users inside its single scan anyway
+    approx = not exact and user_sketches.warm and settings.ANALYTICS_BACKEND != "local"
+    stats = await run_in_threadpool(reports.metrics, category, source, dt_start, dt_end, exact_users=not approx)
+    if approx:
+        users, error = user_sketches.unique_users(category, source, dt_start, dt_end)
+        stats.update(unique_users=users, unique_users_error=error)
+    stats["unique_users_exact"] = not approx
+    anomalies = {
+        gran: detector.anomalies(category, source, gran, dt_start, dt_end) if detector.warm else None
+        for gran in ("hour", "day")
+    }
     return {
-        **reports.basic_metrics(df),
-        "spikes": reports.spike_dates(df),
+        **stats,
+        "spikes": anomalies["day"] if anomalies["day"] is not None else stats["spikes"],
+        "anomalies": anomalies,
+        "data_range": {"first": first, "last": last},
     }
 
+@router.get("/metrics/top")
+async def top_contacts(
+    by: Annotated[Literal["user", "phrase"], Query(description="id_user, or normalised message text")] = "user",
+    start: Annotated[Optional[str], Query()] = None,
+    end: Annotated[Optional[str], Query()] = None,
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+):
+    """Most frequent users / phrasings over whole days, from the heavy-hitter sketches.
+
+    `count` never under-counts and is at most `error` too high; `previous` is the
+    count over the same number of days before `start`.
+    """
+    result = await run_in_threadpool(heavy_hitters.top, by, parse_date(start), parse_date(end), k)
+    return {**result, "complete": heavy_hitters.warm}
+
+@router.get("/timeseries")
+async def timeseries(
+    category: Annotated[Optional[str], Query()] = None,
+    source: Annotated[Optional[str], Query()] = None,
+    start: Annotated[Optional[str], Query()] = None,
+    end: Annotated[Optional[str], Query()] = None,
+    interval: Annotated[Literal["hour", "day", "week"], Query()] = "day",
+    group_by: Annotated[Optional[Literal["category", "source"]], Query()] = None,
+    max_points: Annotated[int, Query(ge=3, le=5000)] = 500,
+):
+    """Pre-binned counts for charting; payload size is capped at max_points."""
+    columns = "timestamp" + (f",{group_by}" if group_by else "")
+    df = reports.fetch_messages(category, source, parse_date(start), parse_date(end), columns=columns)
+    return {
+        "interval": interval,
+        "group_by": group_by,
+        **reports.timeseries(df, interval, group_by, max_points),
+    }
+
+@router.get("/export")
+async def export_messages(
+    fmt: Annotated[Literal["csv", "ndjson", "parquet"], Query(alias="format")] = "csv",
+    gzip: Annotated[bool, Query(description="gzip csv/ndjson; gzip column codec for parquet")] = False,
+    category: Annotated[Optional[str], Query()] = None,
+    source: Annotated[Optional[str], Query()] = None,
+    start: Annotated[Optional[str], Query()] = None,
+    end: Annotated[Optional[str], Query()] = None,
+    columns: Annotated[Optional[str], Query(description="comma-separated subset of the exported columns")] = None,
+):
+    """Stream every matching row in (timestamp, id) order; memory stays at one page."""
+    cols = columns.split(",") if columns else list(export.EXPORT_COLUMNS)
+    unknown = set(cols) - set(export.EXPORT_COLUMNS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(sorted(unknown))}")
+    if fmt == "parquet" and export.pa is None:
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow installed on the server")
+    pages = reports.iter_messages(",".join(cols), category, source, parse_date(start), parse_date(end),
+                                  page_size=settings.EXPORT_PAGE_ROWS)
+    return StreamingResponse(
+        export.encode(pages, fmt, cols, gzip),
+        media_type=export.media_type(fmt, gzip),
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(fmt, gzip)}"'},
+    )
+
+@router.get("/jobs")
+async def classification_jobs():
+    """Depth, lag and throughput of the asynchronous classification queue."""
+    return {"enabled": settings.CLASSIFY_ASYNC, **jobs.get_queue().stats()}
+
 @router.post("/classify")
 async def classify_snippet(request: ClassifyRequest):
     return {"category": classify(request.message)}
 
+@router.get("/similar")
+async def similar(
+    id: Annotated[Optional[str], Query()] = None,
+    text: Annotated[Optional[str], Query()] = None,
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+):
+    """Top-k most similar messages to a stored message id or a free-text query."""
+    # the model, the matrix scan and the lookup all block – keep them off the event loop
+    index = await run_in_threadpool(get_index)
+    if id:
+        vec = await run_in_threadpool(index.vector_for, id)
+        if vec is None:
+            raise HTTPException(status_code=404, detail=f"Message {id} is not indexed")
+    elif text:
+        vec = (await run_in_threadpool(embed, [text]))[0]
+    else:
+        raise HTTPException(status_code=400, detail="Pass either `id` or `text`")
+
+    hits = await run_in_threadpool(index.search, vec, k, exclude=id)
+    if not hits:
+        return []
+    query = reports.supabase.table("messages") \
+        .select("id,id_user,timestamp,source,message,category") \
+        .in_("id", [mid for mid, _ in hits])
+    rows = (await run_in_threadpool(query.execute)).data
+    by_id = {r["id"]: r for r in rows}
+    return [{**by_id.get(mid, {"id": mid}), "score": round(score, 4)} for mid, score in hits]
+
+@router.get("/search")
+async def search(
+    q: Annotated[str, Query(min_length=1, max_length=200, description='words, "a phrase", -excluded')],
+    category: Annotated[Optional[str], Query()] = None,
+    source: Annotated[Optional[str], Query()] = None,
+    start: Annotated[Optional[str], Query()] = None,
+    end: Annotated[Optional[str], Query()] = None,
+    partial: Annotated[bool, Query(description="words may be part of longer ones (piggy → piggybank)")] = False,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    cursor: Annotated[Optional[str], Query(description="next_cursor of the previous page")] = None,
+):
+    """Messages matching a full-text query, best first, with **highlighted** snippets."""
+    try:
+        return await run_in_threadpool(
+            reports.search_messages, q, category, source, parse_date(start), parse_date(end), limit, cursor, partial)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _cacheable(request: Request, payload) -> Response:
+    """JSON response with an ETag; 304 when the client already has this version."""
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+    etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """Return list of unique categories from the database."""
-    query = reports.supabase.table("messages").select("category").execute()
-    categories = set(row["category"] for row in query.data if row["category"])
-    return sorted(list(categories))
+    snap = await run_in_threadpool(dimensions.snapshot)
+    return _cacheable(request, snap["categories"])
+
+@router.get("/sources")
+async def get_sources(request: Request):
+    snap = await run_in_threadpool(dimensions.snapshot)
+    return _cacheable(request, snap["sources"])
 
+@router.get("/bounds")
+async def get_bounds(request: Request):
+    """Earliest / latest message timestamp, total and per-category counts."""
+    snap = await run_in_threadpool(dimensions.snapshot)
+    return _cacheable(request, {k: snap[k] for k in ("first", "last", "total", "category_counts")})
@@ -9,6 +9,82 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_KEY: str
     MEMORY_WINDOW: int = 5  # number of turns to remember
+    CHAT_SPECULATIVE_FETCH: bool = True  # fetch regex/memory-guessed filters while the LLM extracts them
+
+    # message classifier
+    CLASSIFIER_BACKEND: str = "distilbert"  # "distilbert" | "student"
+    STUDENT_MODEL_DIR: str = "distilbert-classifier-student"
+    MULTI_LABEL: bool = False  # also store a labels_mask on ingest
+    MULTILABEL_MODEL_DIR: str = "distilbert-classifier-multilabel"
+    MULTILABEL_THRESHOLD: float = 0.5  # used for labels missing from thresholds.json
+    TORCH_THREADS: int = 0  # intra-op threads; 0 = cores / WEB_CONCURRENCY (all cores in the model server)
+
+    # shared inference process (python -m app.services.model_server); unset = load the model per worker
+    MODEL_SERVER_SOCKET: str | None = None
+    MODEL_SERVER_MAX_BATCH: int = 64  # texts per merged forward pass
+    MODEL_SERVER_MAX_WAIT_MS: float = 5  # how long a batch waits for more requests
+
+    # versioned classifier directories + ACTIVE pointer (scripts/register_model.py)
+    MODEL_REGISTRY_DIR: str = "models/registry"
+    MODEL_REGISTRY_POLL_SECONDS: float = 10  # how soon other workers follow a changed ACTIVE pointer
+    MODEL_DRAIN_SECONDS: float = 60  # max wait for in-flight calls on the old model after a swap
+
+    # similar-message embedding index
+    EMBEDDING_INDEX_DIR: str = "data/embeddings"
+    EMBED_ON_INGEST: bool = True
+    EMBEDDING_IVF_MIN_ROWS: int = 200_000  # below this, brute force beats IVF
+    EMBEDDING_IVF_NPROBE: int = 8
+
+    # analytics source for /metrics, /timeseries and chat
+    ANALYTICS_BACKEND: str = "supabase"  # "supabase" | "local" (Parquet + DuckDB)
+    LOCAL_STORE_DIR: str = "data/store"
+    LOCAL_STORE_FLUSH_ROWS: int = 1000  # ingest rows buffered before a Parquet part is written
+    SEARCH_INDEX_DIR: str = "data/search_index"  # inverted index over the local store's Parquet parts
+
+    # bulk ingest
+    BULK_MAX_ITEMS: int = 5000
+    BULK_INSERT_CHUNK: int = 500  # rows per multi-row insert
+
+    # streaming export
+    EXPORT_PAGE_ROWS: int = 5000  # rows per keyset page / CSV chunk / Parquet row group
+
+    # asynchronous classification: ingest stores category NULL, workers backfill
+    CLASSIFY_ASYNC: bool = False
+    CLASSIFY_QUEUE_PATH: str = "data/jobs.sqlite"
+    CLASSIFY_WORKERS: int = 1
+    CLASSIFY_BATCH: int = 64  # messages per model call / claim
+    CLASSIFY_POLL_SECONDS: float = 1.0
+    CLASSIFY_LEASE_SECONDS: float = 300.0  # a claim older than this belongs to a dead worker and is retried
+    CLASSIFY_MAX_ATTEMPTS: int = 5  # claims per job before it moves to the dead-letter state
+
+    # write-behind local mirror of ingested rows
+    MIRROR_PATH: str = "data/messages_mirror.csv"
+    MIRROR_FORMAT: str = "csv"  # csv | csv.gz | ndjson | ndjson.gz | parquet
+    MIRROR_FLUSH_ROWS: int = 500
+    MIRROR_FLUSH_SECONDS: float = 2.0
+    MIRROR_ROTATE_BYTES: int = 64 * 1024 * 1024  # files also rotate daily
+
+    # streaming roll-ups (anomalies, …) rebuilt from the DB at startup
+    ROLLUP_WARMUP: bool = True
+    ANOMALY_THRESHOLD: float = 3.5  # robust z-score (median/MAD)
+    ANOMALY_WINDOW_DAYS: int = 28
+    ANOMALY_WINDOW_HOURS: int = 48
+    ANOMALY_MIN_PERIODS: int = 7  # closed buckets needed before scoring
+    USER_SKETCH_PATH: str = "data/sketches/users.npz"  # HyperLogLog per (day, category, source)
+    HEAVY_HITTERS_PATH: str = "data/sketches/heavy_hitters.npz"  # Count-Min + Space-Saving per (day, user|phrase)
+    HEAVY_HITTERS_SYNC_SECONDS: int = 60  # heavy hitters and roll-ups catch up on rows past their high-water marks; 0 = startup only
+    DIMENSIONS_TTL_SECONDS: int = 300  # reload bounds/counts snapshot (catches external writes); 0 = never
+
+    # stage timings, Server-Timing header and Prometheus text at GET /metrics
+    TELEMETRY_ENABLED: bool = True
+
+    # admin-only diagnostics (X-Admin-Token header); unset token = admin endpoints off
+    ADMIN_TOKEN: str | None = None
+    PROFILING_ENABLED: bool = False  # sampling / torch / tracemalloc profilers under /api/v1/admin
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_INTERVAL_SECONDS: float = 0.005  # stack sampling period
+    PROFILE_MAX_SECONDS: float = 300  # cap for window profiles
+    TRACEMALLOC_FRAMES: int = 10
 
     # provider keys
     llm_provider: str | None = Field(default=None, env="LLM_PROVIDER")
@@ -0,0 +1,138 @@
+"""
+Streaming encoders for GET /messages/export.
+
+Rows arrive as pages from `reports.iter_messages` (keyset pagination on
+Supabase, DuckDB record batches locally). Each page is encoded and yielded
+before the next one is fetched. Memory therefore stays at one page however
+large the export is, and a slow client slows the fetching down:
+StreamingResponse only asks for the next chunk once the previous one has
+been handed to the socket.
+
+    csv      header once, then rows
+    ndjson   one JSON object per line
+    parquet  one row group per page; `gzip` picks the gzip column codec
+             (a gzipped Parquet file would be unreadable by Parquet tools)
+
+For csv and ndjson, `gzip` wraps the stream in one gzip member compressed
+incrementally (a .gz download, not Content-Encoding).
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional – only needed for format=parquet
+    pa = None
+
+EXPORT_COLUMNS = ("id", "id_user", "timestamp", "source", "message", "category", "labels_mask", "created_at")
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+_TIMESTAMPS = {"timestamp", "created_at"}
+
+
+def _iso(value: Any) -> Any:
+    """ISO-8601 UTC for datetimes (DuckDB hands back naive UTC), everything else as is."""
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return value
+
+
+def _csv(pages: Iterable[List[dict]], columns: List[str]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for page in pages:
+        writer.writerows([_iso(row.get(c)) for c in columns] for row in page)
+        yield buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode()   # header of an empty export
+
+
+def _ndjson(pages: Iterable[List[dict]], columns: List[str]) -> Iterator[bytes]:
+    for page in pages:
+        yield "".join(
+            json.dumps({c: _iso(row.get(c)) for c in columns}, ensure_ascii=False) + "\n" for row in page
+        ).encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file for ParquetWriter whose bytes are drained after every row group."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.chunks.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self.size
+
+    def drain(self) -> bytes:
+        out, self.chunks = b"".join(self.chunks), []
+        return out
+
+
+def _arrow_schema(columns: List[str]) -> "pa.Schema":
+    types = {
+        "id_user": pa.int64(), "labels_mask": pa.int16(),
+        "timestamp": pa.timestamp("us", tz="UTC"), "created_at": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _parquet(pages: Iterable[List[dict]], columns: List[str], compression: str) -> Iterator[bytes]:
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet exports")
+    schema = _arrow_schema(columns)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for page in pages:
+            data: Dict[str, list] = {c: [row.get(c) for row in page] for c in columns}
+            for c in _TIMESTAMPS.intersection(columns):
+                # Supabase sends ISO strings, DuckDB naive-UTC datetimes
+                data[c] = [datetime.fromisoformat(v) if isinstance(v, str) else
+                           v.replace(tzinfo=timezone.utc) if v is not None and v.tzinfo is None else v
+                           for v in data[c]]
+            writer.write_table(pa.table(data, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()   # footer
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)   # wbits 31 → gzip header and trailer
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
+
+
+def encode(pages: Iterable[List[dict]], fmt: str, columns: List[str], gzip: bool = False) -> Iterator[bytes]:
+    """Byte chunks of `pages` in `fmt`, encoded one page at a time."""
+    if fmt == "parquet":
+        return _parquet(pages, columns, "gzip" if gzip else "zstd")
+    chunks = _csv(pages, columns) if fmt == "csv" else _ndjson(pages, columns)
+    return _gzip(chunks) if gzip else chunks
+
+
+def filename(fmt: str, gzip: bool) -> str:
+    return f"messages.{fmt}" + (".gz" if gzip and fmt != "parquet" else "")
+
+
+def media_type(fmt: str, gzip: bool) -> str:
+    return "application/gzip" if gzip and fmt != "parquet" else FORMATS[fmt]
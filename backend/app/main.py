@@ -3,10 +3,35 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+import asyncio
 import os
 
+from loguru import logger
+
 from .config import settings
-from .api.v1.endpoints import chatbot, messages, health
+from . import profiling, rollups, telemetry
+from .services import jobs, local_store
+from .services.dimensions import dimensions
+from .services.heavy_hitters import heavy_hitters
+from .services.hll import user_sketches
+from .services.mirror import mirror
+from .services.search_index import search_index
+from .api.v1.endpoints import admin, chatbot, messages, health
+
+async def _sync_heavy_hitters():
+    while True:
+        await asyncio.sleep(settings.HEAVY_HITTERS_SYNC_SECONDS)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, heavy_hitters.catch_up)
+            await asyncio.get_running_loop().run_in_executor(None, heavy_hitters.save)
+        except Exception as e:
+            logger.warning(f"Heavy-hitter sync failed: {e}")
+        try:
+            # same interval: the detector and user sketches also miss rows other workers stored
+            await asyncio.get_running_loop().run_in_executor(None, rollups.catch_up)
+        except Exception as e:
+            logger.warning(f"Roll-up catch-up failed: {e}")
+
 
 def create_app() -> FastAPI:
     app = FastAPI(
@@ -29,6 +54,56 @@ def create_app() -> FastAPI:
     app.include_router(health.router, prefix="/api/v1")
     app.include_router(messages.router, prefix="/api/v1/messages")
     app.include_router(chatbot.router, prefix="/api/v1/chat")
+    app.include_router(admin.router, prefix="/api/v1/admin")
+
+    @app.on_event("startup")
+    async def start_mirror():
+        await mirror.start()
+
+    @app.on_event("startup")
+    async def start_classifier_workers():
+        if settings.CLASSIFY_ASYNC:
+            await jobs.start()
+
+    @app.on_event("startup")
+    async def load_dimensions():
+        asyncio.get_running_loop().run_in_executor(None, dimensions.snapshot)
+
+    @app.on_event("startup")
+    async def warm_rollups():
+        # persisted sketches give the replay a head start; unique_users is exact until it finishes
+        user_sketches.load()
+        # replay runs in a thread so the server accepts traffic straight away
+        if settings.ROLLUP_WARMUP:
+            asyncio.get_running_loop().run_in_executor(None, rollups.warm_up)
+
+    @app.on_event("startup")
+    async def sync_heavy_hitters():
+        # saved state + rows created past its high-water mark (crash, other workers, scripts)
+        heavy_hitters.load()
+        asyncio.get_running_loop().run_in_executor(None, heavy_hitters.catch_up)
+        if settings.HEAVY_HITTERS_SYNC_SECONDS:
+            app.state.heavy_hitters_sync = asyncio.create_task(_sync_heavy_hitters())
+
+    @app.on_event("startup")
+    async def load_search_index():
+        # index Parquet parts written while the server was down
+        if settings.ANALYTICS_BACKEND == "local":
+            asyncio.get_running_loop().run_in_executor(None, search_index.refresh)
+
+    @app.on_event("shutdown")
+    async def flush_local_writers():
+        await jobs.stop()
+        await mirror.stop()
+        user_sketches.save()
+        heavy_hitters.save()
+        if settings.ANALYTICS_BACKEND == "local":
+            local_store.flush()
+
+    # timing middleware + GET /metrics (Prometheus); must precede the static mount
+    telemetry.install(app)
+    # X-Profile: 1 sampling per request (admin token + PROFILING_ENABLED)
+    profiling.install(app)
 
     # Ensure static directory exists
     static_dir = os.path.join(os.path.dirname(__file__), "static")
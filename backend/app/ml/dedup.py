@@ -0,0 +1,110 @@
+"""
+Near-duplicate clustering for message batches (MinHash + LSH banding).
+
+Verbatim repeats are collapsed by normalised text first; the remaining
+unique texts are compared on character 4-gram MinHash signatures. Every
+message maps to the index of its cluster's first occurrence, so callers
+can classify representatives only and propagate the labels.
+"""
+import re
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", str(text).lower())).strip()
+
+
+def _shingles(text: str, k: int = 4) -> List[int]:
+    grams = {text[i:i + k] for i in range(max(1, len(text) - k + 1))}
+    return [zlib.crc32(g.encode()) for g in grams]
+
+
+def signatures(texts: Sequence[str], num_perm: int = 64, seed: int = 1) -> np.ndarray:
+    # multiply-shift hashing: (a*h + b) mod 2^64, top 32 bits; a must be odd
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, np.iinfo(np.uint64).max, num_perm, dtype=np.uint64)
+    out = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for i, t in enumerate(texts):
+        h = np.array(_shingles(t), dtype=np.uint64)
+        out[i] = ((a[:, None] * h[None, :] + b[:, None]) >> np.uint64(32)).min(axis=1)
+    return out
+
+
+def _bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """(bands, rows) whose S-curve midpoint (1/b)^(1/r) is closest to threshold."""
+    pairs = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(pairs, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+def cluster(texts: Sequence[str], threshold: float = 0.9, num_perm: int = 64) -> np.ndarray:
+    """Representative index for every text (itself when it is a singleton)."""
+    norm = [normalize(t) for t in texts]
+    first: Dict[str, int] = {}
+    reps = np.array([first.setdefault(t, i) for i, t in enumerate(norm)])
+    if threshold >= 1.0:
+        return reps
+
+    uniq = list(first.values())
+    sig = signatures([norm[i] for i in uniq], num_perm)
+    parent = list(range(len(uniq)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    n_bands, rows = _bands(num_perm, threshold)
+    for band in range(n_bands):
+        buckets: Dict[bytes, int] = {}
+        for j, key in enumerate(sig[:, band * rows:(band + 1) * rows]):
+            head = buckets.setdefault(key.tobytes(), j)
+            if head != j and (sig[head] == sig[j]).mean() >= threshold:
+                ra, rb = find(head), find(j)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)   # keep the earliest message as root
+
+    root_of = {uniq[j]: uniq[find(j)] for j in range(len(uniq))}
+    return np.array([root_of[r] for r in reps])
+
+
+def cluster_stats(reps: np.ndarray, texts: Sequence[str] | None = None, top: int = 5) -> dict:
+    sizes = Counter(reps.tolist())
+    stats = {
+        "messages": len(reps),
+        "clusters": len(sizes),
+        "collapsed": len(reps) - len(sizes),
+        "largest": [
+            {"size": n, "text": texts[r] if texts is not None else r}
+            for r, n in sizes.most_common(top) if n > 1
+        ],
+    }
+    stats["reduction"] = round(stats["collapsed"] / max(1, len(reps)), 3)
+    return stats
+
+
+def classify_deduplicated(
+    texts: Sequence[str],
+    classify_batch: Callable[[List[str]], List[str]],
+    threshold: float = 0.9,
+) -> Tuple[List[str], dict]:
+    """Classify one message per near-duplicate cluster and propagate its label."""
+    reps = cluster(texts, threshold)
+    uniq = sorted(set(reps.tolist()))
+    labels = dict(zip(uniq, classify_batch([texts[i] for i in uniq])))
+    return [labels[r] for r in reps.tolist()], cluster_stats(reps, texts)
+
+
+def print_stats(stats: dict):
+    print(f"Dedup: {stats['messages']} messages → {stats['clusters']} clusters "
+          f"({stats['reduction']:.1%} collapsed)")
+    for c in stats["largest"]:
+        print(f"  ×{c['size']:<5} {str(c['text'])[:70]}")
@@ -0,0 +1,15 @@
+"""Classifier label set and the bitmask encoding used for multi-label rows."""
+from typing import Iterable, List
+
+LABELS = ["bonus", "deposit", "withdraw", "game_issue", "login_account", "anger_feedback", "other"]
+
+
+def labels_to_mask(labels: Iterable[str]) -> int:
+    mask = 0
+    for lab in labels:
+        mask |= 1 << LABELS.index(lab)
+    return mask
+
+
+def mask_to_labels(mask: int) -> List[str]:
+    return [lab for i, lab in enumerate(LABELS) if mask >> i & 1]
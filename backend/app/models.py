@@ -22,6 +22,8 @@ class Message(BaseModel):
     source: Source
     message: str
     category: str | None = None
+    labels_mask: int | None = None       # multi-label bitmask over LABELS
+    model_version: str | None = None     # classifier that set category; "manual" if supplied
     created_at: datetime | None = None
 
 
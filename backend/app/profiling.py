@@ -0,0 +1,250 @@
+"""
+On-demand profiling for live workers (admin only, PROFILING_ENABLED=true).
+
+* Sampling profiler – a thread snapshots every thread's Python stack each
+  PROFILE_INTERVAL_SECONDS and writes collapsed stacks (`a;b;c 42`), the
+  input format of flamegraph.pl, speedscope and inferno. Runs for one
+  request (`X-Profile: 1` + `X-Admin-Token`) or for a time window
+  (POST /api/v1/admin/profile). All threads are sampled, so concurrent
+  requests show up in a per-request profile too.
+* Torch profiler – the next N classifier forward passes are recorded to a
+  Chrome trace plus an operator table (POST /api/v1/admin/profile/torch).
+* tracemalloc – snapshots diffed against the previous one, with the
+  allocations held by the chat session stores broken out
+  (POST /api/v1/admin/memory/snapshot).
+
+Nothing runs until it is asked for; the classifier hook costs one integer
+check per forward pass while unarmed.
+"""
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from loguru import logger
+
+from .config import settings
+
+# leaf frames of threads parked waiting for work – not worth a flame
+_IDLE = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+         ("thread.py", "_worker"), ("_asyncio.py", "run"), ("profiling.py", "_run")}
+
+
+def _profile_dir() -> Path:
+    path = Path(settings.PROFILE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _stamp() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+# ── sampling profiler ─────────────────────────────────────────────────────
+class Sampler:
+    """Samples Python stacks of all other threads into collapsed-stack counts."""
+
+    def __init__(self, interval: float | None = None):
+        self.interval = interval or settings.PROFILE_INTERVAL_SECONDS
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self, me: int):
+        for tid, frame in sys._current_frames().items():
+            if tid == me:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self, deadline: float | None, path: Path | None):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(me)
+            if deadline and time.monotonic() >= deadline:
+                break
+        if path:
+            self.write(path)
+            _release()
+
+    def start(self, seconds: float | None = None, path: Path | None = None) -> "Sampler":
+        deadline = time.monotonic() + seconds if seconds else None
+        self._thread = threading.Thread(target=self._run, args=(deadline, path), daemon=True, name="profiler")
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self
+
+    def write(self, path: Path):
+        with open(path, "w") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+        logger.info(f"Profile: {self.samples} samples → {path}")
+
+
+_active = threading.Lock()   # one sampler at a time
+
+
+def _release():
+    if _active.locked():
+        _active.release()
+
+
+def profile_window(seconds: float) -> str | None:
+    """Sample for `seconds` in the background; returns the output file name (None if busy)."""
+    if not _active.acquire(blocking=False):
+        return None
+    name = f"window-{_stamp()}.folded"
+    Sampler().start(min(seconds, settings.PROFILE_MAX_SECONDS), _profile_dir() / name)
+    return name
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    return [{"name": p.name, "bytes": p.stat().st_size}
+            for p in sorted(_profile_dir().iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)]
+
+
+def profile_path(name: str) -> Path | None:
+    path = _profile_dir() / os.path.basename(name)
+    return path if path.is_file() else None
+
+
+# ── torch profiler around classifier inference ───────────────────────────
+_torch_remaining = 0
+_torch_lock = threading.Lock()
+
+
+def arm_torch(calls: int):
+    global _torch_remaining
+    with _torch_lock:
+        _torch_remaining = calls
+
+
+class _TorchCapture:
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.prof = None
+
+    def __enter__(self):
+        global _torch_remaining
+        with _torch_lock:
+            if _torch_remaining <= 0:
+                return self
+            _torch_remaining -= 1
+        from torch.profiler import ProfilerActivity, profile
+        self.prof = profile(activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True)
+        self.prof.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.prof is None:
+            return False
+        self.prof.__exit__(*exc)
+        base = _profile_dir() / f"torch-{self.stage}-{_stamp()}-{time.monotonic_ns() % 10**6}"
+        self.prof.export_chrome_trace(f"{base}.json")
+        Path(f"{base}.txt").write_text(
+            self.prof.key_averages(group_by_input_shape=True).table(sort_by="self_cpu_time_total", row_limit=30))
+        logger.info(f"Torch profile → {base}.json")
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def torch_profile(stage: str):
+    """Wrap a forward pass; records it only while the torch profiler is armed."""
+    return _TorchCapture(stage) if _torch_remaining else _NOOP
+
+
+# ── tracemalloc ───────────────────────────────────────────────────────────
+_baseline: tracemalloc.Snapshot | None = None
+_STORES = ("*/services/memory.py", "*/endpoints/chatbot.py")
+
+
+def _stores() -> Dict[str, int]:
+    from .api.v1.endpoints import chatbot
+    from .services import memory
+    return {
+        "memory._sessions": len(memory._sessions),
+        "memory._sessions_queries": sum(len(dq) for dq in memory._sessions.values()),
+        "chatbot._memory": len(chatbot._memory),
+    }
+
+
+def memory_snapshot(top: int = 20) -> Dict[str, Any]:
+    """Start tracing on the first call; afterwards diff against the previous snapshot."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.TRACEMALLOC_FRAMES)
+        _baseline = None
+        return {"tracing": "started", "stores": _stores()}
+    snap = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    diff = _baseline is not None
+    stats = snap.compare_to(_baseline, "lineno") if diff else snap.statistics("lineno")
+    held = snap.filter_traces([tracemalloc.Filter(True, p) for p in _STORES]).statistics("lineno")
+    _baseline = snap
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "tracing": "diff" if diff else "snapshot",
+        "traced_bytes": current,
+        "peak_bytes": peak,
+        "top": [{"where": str(s.traceback[0]), "bytes": s.size, "bytes_diff": getattr(s, "size_diff", None),
+                 "blocks": s.count} for s in stats[:top]],
+        "stores": _stores(),
+        "stores_held": [{"where": str(s.traceback[0]), "bytes": s.size, "blocks": s.count} for s in held[:top]],
+    }
+
+
+def stop_tracing():
+    global _baseline
+    tracemalloc.stop()
+    _baseline = None
+
+
+# ── FastAPI wiring ────────────────────────────────────────────────────────
+def install(app: FastAPI):
+    """Per-request profiling middleware (`X-Profile: 1` with a valid `X-Admin-Token`)."""
+    if not (settings.PROFILING_ENABLED and settings.ADMIN_TOKEN):
+        return
+    from .api.v1.endpoints.admin import valid_token
+
+    @app.middleware("http")
+    async def profile_request(request: Request, call_next):
+        if request.headers.get("x-profile") != "1" or not valid_token(request.headers.get("x-admin-token")):
+            return await call_next(request)
+        if not _active.acquire(blocking=False):
+            response = await call_next(request)
+            response.headers["X-Profile-File"] = "busy"
+            return response
+        sampler = Sampler().start()
+        try:
+            response = await call_next(request)
+        finally:
+            sampler.stop()
+            name = f"request-{_stamp()}-{request.url.path.strip('/').replace('/', '_') or 'root'}.folded"
+            sampler.write(_profile_dir() / name)
+            _release()
+        response.headers["X-Profile-File"] = name
+        return response
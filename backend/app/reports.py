@@ -1,22 +1,26 @@
-"""Stats helpers that talk to Supabase."""
+"""Stats helpers that talk to Supabase (or the local columnar store)."""
 
 from datetime import datetime
-from typing import Any, Dict, List, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Tuple
 
+import numpy as np
 import pandas as pd
 from supabase import create_client
 from .config import settings
+from .ml.labels import LABELS
+from .services import anomaly, local_store, search_index
+from .telemetry import observe_size, span, timed
 
 supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 
+METRIC_COLUMNS = "id_user,category,timestamp,labels_mask"
 
-def fetch_messages(
-    category: str | None,
-    source: str | None,
-    start: datetime | None,
-    end: datetime | None,
-) -> pd.DataFrame:
-    query = supabase.table("messages").select("*")
+
+def _local() -> bool:
+    return settings.ANALYTICS_BACKEND == "local"
+
+
+def _apply_filters(query, category, source, start, end):
     if category:
         # Handle multiple categories
         categories = category.split(',') if ',' in category else [category]
@@ -30,14 +34,177 @@ def fetch_messages(
         query = query.gte("timestamp", start.isoformat())
     if end:
         query = query.lte("timestamp", end.isoformat())
+    return query
+
 
-    data = query.execute().data
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+@timed("reports.fetch_messages")
+def fetch_messages(
+    category: str | None,
+    source: str | None,
+    start: datetime | None,
+    end: datetime | None,
+    columns: str = "*",
+) -> pd.DataFrame:
+    if _local():
+        df = local_store.fetch(category, source, start, end, columns)
+    else:
+        query = _apply_filters(supabase.table("messages").select(columns), category, source, start, end)
+        data = query.execute().data
+        df = pd.DataFrame(data)
+        if not df.empty:
+            df['timestamp'] = pd.to_datetime(df['timestamp'])
+    observe_size("rows", len(df), "reports.fetch_messages")
     return df
 
 
+def iter_messages(
+    columns: str = "*",
+    category: str | None = None,
+    source: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    page_size: int = 1000,
+) -> Iterator[List[dict]]:
+    """Yield pages of rows ordered by (timestamp, id) from the analytics backend."""
+    if _local():
+        return local_store.iter_pages(columns, category, source, start, end, page_size)
+    return iter_supabase_messages(columns, category, source, start, end, page_size)
+
+
+def iter_created_after(columns: str, after: datetime | None, page_size: int = 1000) -> Iterator[List[dict]]:
+    """Pages of rows whose created_at is past `after` (all rows for None), any order.
+
+    Unlike `timestamp`, created_at is set by the database, so it also finds
+    rows other processes or scripts inserted with old timestamps.
+    """
+    if _local():
+        return local_store.iter_pages(columns, page_size=page_size, created_after=after)
+    where = (lambda q: q.gt("created_at", after.isoformat())) if after else None
+    return iter_supabase_messages(columns, page_size=page_size, where=where)
+
+
+def iter_supabase_messages(
+    columns: str = "*",
+    category: str | None = None,
+    source: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    page_size: int = 1000,
+    where: Callable | None = None,
+) -> Iterator[List[dict]]:
+    """Yield pages of Supabase rows ordered by (timestamp, id) using keyset pagination.
+
+    `where` can add further filters to each page query (e.g. `lambda q: q.is_(...)`).
+    """
+    if columns != "*":
+        columns = ",".join(dict.fromkeys(columns.split(",") + ["timestamp", "id"]))
+    last = None
+    while True:
+        query = _apply_filters(supabase.table("messages").select(columns), category, source, start, end)
+        if where:
+            query = where(query)
+        if last:
+            ts, mid = last
+            query = query.or_(f'timestamp.gt."{ts}",and(timestamp.eq."{ts}",id.gt.{mid})')
+        with span("reports.page"):
+            rows = query.order("timestamp").order("id").limit(page_size).execute().data
+        observe_size("rows", len(rows), "reports.page")
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]["timestamp"], rows[-1]["id"]
+
+
+def has_messages(category: str | None, source: str | None,
+                 start: datetime | None, end: datetime | None) -> bool:
+    """Limit-1 probe: does any stored row match? Confirms a cached "nothing there"."""
+    if _local():
+        return local_store.any_rows(category, source, start, end)
+    query = _apply_filters(supabase.table("messages").select("id"), category, source, start, end)
+    return bool(query.limit(1).execute().data)
+
+
+def edge_timestamp(latest: bool, beyond: datetime | None = None) -> datetime | None:
+    """Newest (or oldest) message timestamp, looking only at or past `beyond` – a limit-1 probe."""
+    start, end = (beyond, None) if latest else (None, beyond)
+    if _local():
+        return local_store.edge_timestamp(latest, start, end)
+    query = _apply_filters(supabase.table("messages").select("timestamp"), None, None, start, end)
+    rows = query.order("timestamp", desc=latest).limit(1).execute().data
+    return datetime.fromisoformat(rows[0]["timestamp"].replace("Z", "+00:00")) if rows else None
+
+
+@timed("reports.search_messages")
+def search_messages(
+    q: str,
+    category: str | None = None,
+    source: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+    partial: bool = False,
+) -> Dict[str, Any]:
+    """Ranked full-text matches with highlighted snippets: {total, results, next_cursor}.
+
+    Raises ValueError for a query without words or a malformed cursor.
+    """
+    if _local():
+        return search_index.search_index.search(q, category, source, start, end, limit, cursor, partial)
+    words, phrases, excluded = search_index.parse_query(q)
+    after = search_index.decode_cursor(cursor, 3)
+    rows = supabase.rpc("search_messages", {
+        "q": q,
+        # a phrase is one term with spaces: its words in order (009_messages_search_partial_phrases.sql)
+        "partial_terms": words + [" ".join(p) for p in phrases] if partial else None,
+        "excluded_terms": excluded if partial else None,
+        "categories": category.split(",") if category else None,
+        "src": source,
+        "start_ts": start.isoformat() if start else None,
+        "end_ts": end.isoformat() if end else None,
+        "after_score": after[0] if after else None,
+        "after_ts": after[1] if after else None,
+        "after_id": after[2] if after else None,
+        "page_size": limit + 1,
+    }).execute().data or []
+    observe_size("rows", len(rows), "reports.search_messages")
+    total = rows[0].pop("total") if rows else 0
+    for row in rows[1:]:
+        row.pop("total", None)
+    last = rows[limit - 1] if len(rows) > limit else None
+    return {
+        "total": total,
+        "results": rows[:limit],
+        "next_cursor": search_index.encode_cursor([last["score"], last["timestamp"], last["id"]]) if last else None,
+    }
+
+
+@timed("reports.metrics")
+def metrics(
+    category: str | None,
+    source: str | None,
+    start: datetime | None,
+    end: datetime | None,
+    exact_users: bool = True,
+) -> Dict[str, Any]:
+    """basic_metrics + daily spikes, aggregated where the data lives.
+
+    With exact_users=False the Supabase path skips the id_user column and
+    leaves unique_users as None for the caller to fill from the sketches.
+    """
+    if _local():
+        daily = local_store.daily_counts(category, source, start, end)
+        return {
+            **local_store.basic_metrics(category, source, start, end),
+            "spikes": anomaly.score_counts(daily.items(), "day"),
+        }
+    columns = METRIC_COLUMNS if exact_users else METRIC_COLUMNS.replace("id_user,", "")
+    df = fetch_messages(category, source, start, end, columns=columns)
+    return {**basic_metrics(df), "spikes": spike_dates(df)}
+
+
+@timed("reports.basic_metrics")
 def basic_metrics(df: pd.DataFrame) -> Dict[str, Any]:
     if df.empty:
         return {
@@ -48,32 +215,92 @@ def basic_metrics(df: pd.DataFrame) -> Dict[str, Any]:
     
     category_counts = df.groupby('category').size().to_dict()
     
-    return {
+    metrics = {
         "total_messages": len(df),
-        "unique_users": df["id_user"].nunique(),
+        "unique_users": df["id_user"].nunique() if "id_user" in df else None,
         "categories": category_counts
     }
+    if "labels_mask" in df and df["labels_mask"].notna().any():
+        metrics["labels"] = label_counts(df["labels_mask"])
+    return metrics
+
 
+def label_counts(masks: pd.Series) -> Dict[str, int]:
+    """Per-label message counts over the multi-label bitmask column."""
+    m = masks.dropna().to_numpy(dtype=np.int64)
+    counts = ((m[:, None] >> np.arange(len(LABELS))) & 1).sum(axis=0)
+    return {label: int(c) for label, c in zip(LABELS, counts) if c}
 
-def spike_dates(df: pd.DataFrame, threshold: float = 2.0) -> List[Dict[str, Any]]:
-    """Return dates where count > mean + threshold*std."""
+
+@timed("reports.spike_dates")
+def spike_dates(df: pd.DataFrame, threshold: float | None = None) -> List[Dict[str, Any]]:
+    """Return days whose count is a robust outlier vs. the preceding window.
+
+    Same scoring as the streaming detector in `services.anomaly`, applied to
+    an already-fetched frame (e.g. ad-hoc chat queries)."""
     if df.empty:
         return []
 
     # Group by date and count messages
-    daily = df.groupby(df['timestamp'].dt.date).size()
-    
-    if len(daily) < 2:  # Need at least 2 points for std
-        return []
+    daily = df.groupby(df['timestamp'].dt.floor("D")).size().sort_index()
+    return anomaly.score_counts(daily.items(), "day", threshold)
 
-    mean, std = daily.mean(), daily.std()
-    spikes = daily[daily > mean + threshold * std]
-    
-    return [
-        {
-            "date": date.strftime("%Y-%m-%d"),
-            "count": int(count),
-            "message": f"Spike of {int(count)} messages (vs avg {int(mean)})"
-        }
-        for date, count in spikes.items()
-    ]
+
+# ────────────────────────
+#  Time series
+# ────────────────────────
+def _buckets(ts: pd.Series, interval: str) -> pd.Series:
+    if ts.dt.tz is not None:
+        ts = ts.dt.tz_convert(None)
+    if interval == "week":
+        return ts.dt.to_period("W-SUN").dt.start_time   # weeks start on Monday
+    return ts.dt.floor("h" if interval == "hour" else "D")
+
+
+def lttb(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the points that keep the shape."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+    every = (n - 2) / (n_out - 2)
+    a, out = 0, [0]
+    for i in range(n_out - 2):
+        s, e = int(i * every) + 1, int((i + 1) * every) + 1
+        ne = min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[e:ne].mean(), y[e:ne].mean()
+        area = np.abs((x[a] - avg_x) * (y[s:e] - y[a]) - (x[a] - x[s:e]) * (avg_y - y[a]))
+        a = s + int(area.argmax())
+        out.append(a)
+    out.append(n - 1)
+    return np.array(out)
+
+
+@timed("reports.timeseries")
+def timeseries(
+    df: pd.DataFrame,
+    interval: str = "day",
+    group_by: str | None = None,
+    max_points: int = 500,
+) -> Dict[str, Any]:
+    """Zero-filled message counts per bucket, LTTB-downsampled to max_points."""
+    if df.empty:
+        return {"points": [], "downsampled": False}
+
+    buckets = _buckets(df["timestamp"], interval)
+    if group_by:
+        counts = pd.crosstab(buckets, df[group_by].fillna("unknown"))
+    else:
+        counts = buckets.value_counts().to_frame("count")
+    freq = {"hour": "h", "day": "D", "week": "W-MON"}[interval]
+    counts = counts.reindex(pd.date_range(counts.index.min(), counts.index.max(), freq=freq), fill_value=0)
+
+    totals = counts.sum(axis=1).to_numpy()
+    keep = lttb(totals, max_points)
+    fmt = "%Y-%m-%d %H:00" if interval == "hour" else "%Y-%m-%d"
+    dates = counts.index[keep].strftime(fmt)
+    points = [{"date": d, "count": int(c)} for d, c in zip(dates, totals[keep])]
+    if group_by:
+        for p, row in zip(points, counts.iloc[keep].to_dict("records")):
+            p["groups"] = {k: int(v) for k, v in row.items() if v}
+    return {"points": points, "downsampled": len(keep) < len(counts)}
@@ -0,0 +1,130 @@
+"""In-process roll-ups kept current on ingest and rebuilt from Supabase at startup.
+
+After the replay, `catch_up` reads rows created past a created_at mark, so
+the anomaly detector and user sketches also see rows other workers and
+scripts stored. Detector counts are not idempotent: ids applied past the
+mark – by the replay, ingest or a catch-up – are remembered, like the
+heavy hitters do, so no row is counted twice.
+"""
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List
+
+from loguru import logger
+
+from . import reports
+from .services.anomaly import detector
+from .services.dimensions import dimensions
+from .services.heavy_hitters import CATCH_UP_LAG, _created, heavy_hitters
+from .services.hll import user_sketches
+
+CATCH_UP_COLUMNS = "id,id_user,timestamp,category,source,created_at"
+
+_lock = threading.Lock()
+_warming = False
+_pending: List[dict] = []   # rows ingested while the warm-up replay is running
+_mark: datetime | None = None   # newest created_at read, less CATCH_UP_LAG; None until a full replay
+_counted: Dict[str, datetime] = {}   # ids applied with created_at past the mark
+_catching_up = threading.Lock()
+
+
+def _apply(rows: Iterable[dict]):
+    rows = list(rows)
+    detector.observe_rows(rows)
+    user_sketches.observe_rows(rows)
+
+
+def _claim(rows: Iterable[dict], floor: datetime | None) -> List[dict]:
+    """Rows not applied yet; remembers those created past `floor`. Call under _lock."""
+    fresh = []
+    for r in rows:
+        rid = r.get("id")
+        if rid is not None and rid in _counted:
+            continue
+        created = _created(r.get("created_at"))
+        if rid is not None and created is not None and (floor is None or created > floor):
+            _counted[rid] = created
+        fresh.append(r)
+    return fresh
+
+
+def observe(rows: List[dict]):
+    # dimensions hold counts from their own snapshot, so they only take new rows, never the replay
+    dimensions.observe_rows(rows)
+    # heavy hitters skip ids they already counted; their catch-up replaces the replay
+    heavy_hitters.observe_rows(rows)
+    with _lock:
+        if _warming:
+            _pending.extend(rows)
+            return
+        if _mark is not None:
+            # without an id or created_at a row can only be counted once stored – by catch_up
+            rows = _claim((r for r in rows if r.get("id") is not None and r.get("created_at")), _mark)
+    _apply(rows)
+
+
+def warm_up():
+    """Replay every stored message (timestamp order) through the roll-ups."""
+    global _warming, _mark, _counted
+    with _lock:
+        _warming = True
+    total, ok, newest = 0, False, None
+    try:
+        for page in reports.iter_messages(CATCH_UP_COLUMNS):
+            latest = max((_created(r["created_at"]) for r in page if r.get("created_at")), default=None)
+            if latest and (newest is None or latest > newest):
+                newest = latest
+            with _lock:
+                pending_ids = {r.get("id") for r in _pending}
+                # only ids past the running mark can come again in a catch-up
+                rows = _claim((r for r in page if r["id"] not in pending_ids),
+                              newest - CATCH_UP_LAG if newest else None)
+            _apply(rows)
+            total += len(page)
+        ok = True
+    except Exception as e:
+        logger.warning(f"Roll-up warm-up stopped after {total} rows: {e}")
+    finally:
+        with _lock:
+            _warming = False
+            late, _pending[:] = sorted(_pending, key=lambda r: str(r["timestamp"])), []
+            _apply(_claim(late, None))
+            # a partial replay would under-count, so callers keep rescanning
+            detector.warm = ok
+            if ok:
+                user_sketches.warm = True
+                _mark = newest - CATCH_UP_LAG if newest else datetime.min.replace(tzinfo=timezone.utc)
+                _counted = {rid: ts for rid, ts in _counted.items() if ts > _mark}
+            else:
+                _counted.clear()
+    logger.info(f"Roll-ups warmed from {total} rows")
+    if ok:
+        user_sketches.save()
+
+
+def catch_up() -> int:
+    """Apply rows created past the mark that were not applied yet; returns how many were read.
+
+    Unlabelled rows are left to the classification worker, which passes them
+    to `observe` once labelled. Waits for the first full replay, which sets
+    the mark.
+    """
+    global _mark, _counted
+    if _mark is None or not _catching_up.acquire(blocking=False):
+        return 0
+    try:
+        total, newest = 0, None
+        for page in reports.iter_created_after(CATCH_UP_COLUMNS, _mark):
+            latest = max(_created(r["created_at"]) for r in page)
+            newest = latest if newest is None or latest > newest else newest
+            with _lock:
+                rows = _claim((r for r in page if r.get("category")), max(_mark, newest - CATCH_UP_LAG))
+            _apply(rows)
+            total += len(page)
+        with _lock:
+            if newest is not None and newest - CATCH_UP_LAG > _mark:
+                _mark = newest - CATCH_UP_LAG
+                _counted = {rid: ts for rid, ts in _counted.items() if ts > _mark}
+        return total
+    finally:
+        _catching_up.release()
@@ -0,0 +1,168 @@
+"""
+Streaming anomaly detection over message counts.
+
+Counts are bucketed hourly and daily per (category, source) series, plus
+the "*" roll-ups so each /metrics filter combination maps to exactly one
+series. When a bucket closes it is scored against a sliding window of the
+buckets before it with a robust z-score (median / MAD), so one spike does
+not inflate the baseline for the next. Each update and lookup touches a
+fixed-size window, independent of how many messages are stored.
+"""
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from statistics import median
+from typing import Any, Dict, Iterable, List, Tuple
+
+from ..config import settings
+
+ALL = "*"
+STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+
+def _naive_utc(ts: datetime | str) -> datetime:
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+    elif hasattr(ts, "to_pydatetime"):  # pandas Timestamp
+        ts = ts.to_pydatetime()
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def _floor(ts: datetime, granularity: str) -> datetime:
+    ts = ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if granularity == "day" else ts
+
+
+def _window(granularity: str) -> int:
+    return settings.ANOMALY_WINDOW_DAYS if granularity == "day" else settings.ANOMALY_WINDOW_HOURS
+
+
+def _label(bucket: datetime, granularity: str) -> str:
+    return bucket.strftime("%Y-%m-%d" if granularity == "day" else "%Y-%m-%d %H:00")
+
+
+class Series:
+    """Open bucket + sliding window of closed bucket counts for one series."""
+    __slots__ = ("granularity", "bucket", "count", "history", "anomalies", "threshold", "min_periods")
+
+    def __init__(self, granularity: str, window: int, threshold: float, min_periods: int, keep: int = 500):
+        self.granularity = granularity
+        self.bucket: datetime | None = None
+        self.count = 0
+        self.history: deque = deque(maxlen=window)
+        self.anomalies: deque = deque(maxlen=keep)
+        self.threshold = threshold
+        self.min_periods = min_periods
+
+    def _score(self, x: int) -> Tuple[float, float] | None:
+        if len(self.history) < self.min_periods:
+            return None
+        med = median(self.history)
+        mad = median(abs(h - med) for h in self.history)
+        # a flat baseline has MAD 0 – fall back to a Poisson-ish scale
+        scale = 1.4826 * mad if mad else max(1.0, med ** 0.5)
+        return (x - med) / scale, med
+
+    def _close(self):
+        scored = self._score(self.count)
+        if scored and scored[0] > self.threshold:
+            self.anomalies.append(self._anomaly(self.bucket, self.count, *scored))
+        self.history.append(self.count)
+
+    def _anomaly(self, bucket: datetime, count: int, score: float, expected: float) -> Dict[str, Any]:
+        return {
+            "date": _label(bucket, self.granularity),
+            "bucket": bucket,
+            "count": int(count),
+            "expected": round(expected, 1),
+            "score": round(score, 2),
+            "message": f"Spike of {int(count)} messages (vs typical {int(expected)})",
+        }
+
+    def observe(self, bucket: datetime, n: int = 1):
+        step = STEPS[self.granularity]
+        if self.bucket is None:
+            self.bucket = bucket
+        if bucket < self.bucket:
+            # late row: patch the closed bucket if it is still inside the window
+            back = (self.bucket - bucket) // step
+            if back <= len(self.history):
+                self.history[-back] += n
+            return
+        if bucket > self.bucket:
+            self._close()
+            gap = (bucket - self.bucket) // step - 1
+            self.history.extend([0] * min(gap, self.history.maxlen))
+            self.bucket, self.count = bucket, 0
+        self.count += n
+
+    def current(self, start: datetime | None = None, end: datetime | None = None) -> List[Dict[str, Any]]:
+        out = [a for a in self.anomalies
+               if (start is None or a["bucket"] >= start) and (end is None or a["bucket"] <= end)]
+        # the open bucket can only grow, so flagging it early is safe
+        scored = self._score(self.count) if self.bucket is not None else None
+        in_range = (start is None or self.bucket >= start) and (end is None or self.bucket <= end)
+        if scored and scored[0] > self.threshold and in_range:
+            out.append(self._anomaly(self.bucket, self.count, *scored))
+        return [{k: v for k, v in a.items() if k != "bucket"} for a in out]
+
+
+class AnomalyDetector:
+    def __init__(self, threshold: float | None = None):
+        self.threshold = threshold or settings.ANOMALY_THRESHOLD
+        self._series: Dict[Tuple[str, str, str], Series] = {}
+        self._lock = threading.Lock()
+        self.warm = False
+
+    def _get(self, granularity: str, category: str, source: str) -> Series:
+        key = (granularity, category, source)
+        s = self._series.get(key)
+        if s is None:
+            s = self._series[key] = Series(granularity, _window(granularity), self.threshold,
+                                           settings.ANOMALY_MIN_PERIODS)
+        return s
+
+    def observe(self, category: str | None, source: str | None, ts: datetime | str, n: int = 1):
+        ts = _naive_utc(ts)
+        category, source = category or ALL, source or ALL
+        keys = {(category, source), (category, ALL), (ALL, source), (ALL, ALL)}
+        with self._lock:
+            for gran in STEPS:
+                bucket = _floor(ts, gran)
+                for cat, src in keys:
+                    self._get(gran, cat, src).observe(bucket, n)
+
+    def observe_rows(self, rows: Iterable[dict]):
+        for r in rows:
+            self.observe(r.get("category"), r.get("source"), r["timestamp"])
+
+    def anomalies(
+        self,
+        category: str | None,
+        source: str | None,
+        granularity: str = "day",
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> List[Dict[str, Any]] | None:
+        """Flagged buckets for one series, or None if no such series is tracked."""
+        key = (granularity, category or ALL, source or ALL)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                return None if category and "," in category else []
+            return s.current(start and _naive_utc(start), end and _naive_utc(end))
+
+
+def score_counts(counts: Iterable[Tuple[datetime, int]], granularity: str = "day",
+                 threshold: float | None = None) -> List[Dict[str, Any]]:
+    """Run a pre-binned, time-ordered count series through the detector logic."""
+    s = Series(granularity, _window(granularity), threshold or settings.ANOMALY_THRESHOLD,
+               settings.ANOMALY_MIN_PERIODS)
+    for bucket, n in counts:
+        s.observe(_floor(_naive_utc(bucket), granularity), int(n))
+    return s.current()
+
+
+detector = AnomalyDetector()
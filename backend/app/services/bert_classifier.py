@@ -1,31 +1,214 @@
 from functools import lru_cache
 from typing import List
+import json
+import time
+import numpy as np
 import torch
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import os
 
-# Original categories from the trained model
-LABELS = ["bonus", "deposit", "withdraw", "game_issue", "login_account", "anger_feedback", "other"]
+from ..config import settings
+from ..ml.labels import LABELS
+from ..profiling import torch_profile
+from ..telemetry import observe_size, span
+from . import student_classifier
+from .model_registry import ModelSlot, content_hash
+from .model_server import model_client
 
-@lru_cache()
-def _load():
-    tok = AutoTokenizer.from_pretrained("distilbert-classifier-saved")
-    mdl = AutoModelForSequenceClassification.from_pretrained("distilbert-classifier-saved", num_labels=len(LABELS))
+MODEL_DIR = "distilbert-classifier-saved"  # used while the registry has no ACTIVE version
+
+# warm-up batch for a freshly loaded model: short and long inputs so both paddings are compiled
+WARMUP_TEXTS = [
+    "hi",
+    "I can't withdraw my winnings, the request has been pending for three days",
+    "deposit not credited",
+    "How do I verify my account? I uploaded my passport twice and it keeps getting rejected "
+    "without any explanation, please help me understand what documents you actually need",
+] * 8
+
+def _remote() -> bool:
+    """DistilBERT work goes to the shared model server (app.services.model_server)."""
+    return bool(settings.MODEL_SERVER_SOCKET)
+
+def torch_threads(workers: int | None = None) -> int:
+    """Intra-op threads: TORCH_THREADS, else the cores shared among `workers` processes."""
+    if settings.TORCH_THREADS:
+        return settings.TORCH_THREADS
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    workers = workers or int(os.environ.get("WEB_CONCURRENCY", "1"))   # uvicorn --workers default
+    return max(1, cores // workers)
+
+_threads_configured = False
+
+def configure_threads(workers: int | None = None):
+    """Size torch's intra-op pool once per process (the first caller wins)."""
+    global _threads_configured
+    if not _threads_configured:
+        torch.set_num_threads(torch_threads(workers))
+        _threads_configured = True
+
+def _load_dir(path: str):
+    configure_threads()
+    tok = AutoTokenizer.from_pretrained(path)
+    mdl = AutoModelForSequenceClassification.from_pretrained(path, num_labels=len(LABELS))
     mdl.eval()
     return tok, mdl
 
-def classify(text: str) -> str:
-    tok, mdl = _load()
+def _warmup(model):
+    tok, mdl = model
     with torch.no_grad():
-        inputs = tok(text, return_tensors="pt", truncation=True)
-        logits = mdl(**inputs).logits
-        cat = logits.argmax(-1).item()
-    return LABELS[cat]
+        mdl(**tok(WARMUP_TEXTS, return_tensors="pt", truncation=True, padding=True))
+
+# hot-swappable via the model registry (POST /api/v1/admin/models/{version}/activate)
+classifier = ModelSlot(_load_dir, _warmup, lambda: (content_hash(MODEL_DIR), MODEL_DIR))
+
+def _load():
+    """(tokenizer, model) of the active version."""
+    return classifier.current().model
+
+def bert_logits(texts: List[str]) -> torch.Tensor:
+    """Raw DistilBERT logits; also the teacher signal for the student."""
+    if not texts:
+        return torch.empty((0, len(LABELS)))
+    if _remote():
+        return torch.from_numpy(model_client().call("logits", texts)[1][0].copy())
+    return _bert_logits_local(texts)
+
+def _bert_logits_local(texts: List[str]) -> torch.Tensor:
+    with classifier.use() as (tok, mdl), torch.no_grad(), torch_profile("bert"):
+        inputs = tok(texts, return_tensors="pt", truncation=True, padding=True)
+        return mdl(**inputs).logits
+
+def _logits(texts: List[str]) -> torch.Tensor:
+    stage = f"classifier.{settings.CLASSIFIER_BACKEND}"
+    observe_size("batch", len(texts), stage)
+    with span(stage):
+        if settings.CLASSIFIER_BACKEND == "student":
+            return student_classifier.logits(texts)
+        return bert_logits(texts)
+
+def classify(text: str) -> str:
+    return classify_batch([text])[0]
+
+def classify_batch(texts: List[str], batch_size: int = 32) -> List[str]:
+    labels = []
+    for i in range(0, len(texts), batch_size):
+        idx = _logits(texts[i:i + batch_size]).argmax(-1).tolist()
+        labels.extend(LABELS[j] for j in idx)
+    return labels
+
+_remote_version = (None, 0.0)
+
+def model_version() -> str:
+    """Version that decides `category` (and labels_mask).
+
+    The registry id of the active DistilBERT; with the student or the
+    multi-label head involved, the content hash of all directories used.
+    """
+    global _remote_version
+    if _remote():
+        version, at = _remote_version
+        if version is None or time.monotonic() - at > 5:   # follows swaps in the model server
+            version = model_client().call("version")[0]["version"]
+            _remote_version = (version, time.monotonic())
+        return version
+    return _model_version_local()
+
+def _model_version_local() -> str:
+    if settings.CLASSIFIER_BACKEND != "student" and not settings.MULTI_LABEL:
+        return classifier.version()
+    dirs = [settings.STUDENT_MODEL_DIR if settings.CLASSIFIER_BACKEND == "student" else classifier.path()]
+    if settings.MULTI_LABEL:
+        dirs.append(settings.MULTILABEL_MODEL_DIR)
+    return content_hash(*dirs)
+
+def activate(version: str) -> bool:
+    """Hot-swap DistilBERT to a registered version; False if a swap is already running."""
+    if _remote():
+        return model_client().call("activate", version=version)[0]["started"]
+    return classifier.activate(version)
+
+def classifier_status() -> dict:
+    if _remote():
+        return model_client().call("status")[0]["status"]
+    return classifier.status()
 
 def get_probabilities(text: str) -> dict:
-    tok, mdl = _load()
-    with torch.no_grad():
-        inputs = tok(text, return_tensors="pt", truncation=True)
-        logits = mdl(**inputs).logits
-        probs = torch.softmax(logits, dim=-1)[0]
+    probs = torch.softmax(_logits([text]), dim=-1)[0]
     return {label: float(prob) for label, prob in zip(LABELS, probs)}
+
+def embed(texts: List[str], batch_size: int = 32) -> np.ndarray:
+    """L2-normalised mean-pooled sentence embeddings from the DistilBERT encoder."""
+    if _remote():
+        return model_client().call("embed", texts)[1][0].copy()
+    return _embed_local(texts, batch_size)
+
+def _embed_local(texts: List[str], batch_size: int = 32) -> np.ndarray:
+    out = []
+    observe_size("batch", len(texts), "classifier.embed")
+    with classifier.use() as (tok, mdl), torch.no_grad(), span("classifier.embed"), torch_profile("embed"):
+        for i in range(0, len(texts), batch_size):
+            inputs = tok(texts[i:i + batch_size], return_tensors="pt", truncation=True, padding=True)
+            hidden = mdl(**inputs, output_hidden_states=True).hidden_states[-1]
+            mask = inputs["attention_mask"].unsqueeze(-1)
+            vec = (hidden * mask).sum(1) / mask.sum(1)
+            out.append(torch.nn.functional.normalize(vec, dim=-1))
+        if not out:
+            return np.empty((0, mdl.config.hidden_size), dtype=np.float32)
+    return torch.cat(out).numpy()
+
+# ── multi-label (sigmoid head) ───────────────────────────────────────────────
+
+@lru_cache()
+def _load_multi():
+    configure_threads()
+    path = settings.MULTILABEL_MODEL_DIR
+    tok = AutoTokenizer.from_pretrained(path)
+    mdl = AutoModelForSequenceClassification.from_pretrained(
+        path, num_labels=len(LABELS), problem_type="multi_label_classification"
+    )
+    mdl.eval()
+    per_label = {}
+    th_path = os.path.join(path, "thresholds.json")
+    if os.path.exists(th_path):
+        with open(th_path) as f:
+            per_label = json.load(f)
+    thresholds = torch.tensor([per_label.get(l, settings.MULTILABEL_THRESHOLD) for l in LABELS])
+    return tok, mdl, thresholds
+
+def _multi_hits(texts: List[str]):
+    if not texts:
+        return torch.empty((0, len(LABELS))), torch.empty((0, len(LABELS)), dtype=torch.bool)
+    if _remote():
+        probs, hits = model_client().call("multi", texts)[1]
+        return torch.from_numpy(probs.copy()), torch.from_numpy(hits.copy())
+    return _multi_hits_local(texts)
+
+def _multi_hits_local(texts: List[str]):
+    tok, mdl, thresholds = _load_multi()
+    observe_size("batch", len(texts), "classifier.multi")
+    with torch.no_grad(), span("classifier.multi"), torch_profile("multi"):
+        inputs = tok(texts, return_tensors="pt", truncation=True, padding=True)
+        probs = torch.sigmoid(mdl(**inputs).logits)
+    hits = probs >= thresholds
+    # every message gets at least its most likely label
+    hits[torch.arange(len(texts)), probs.argmax(-1)] = True
+    return probs, hits
+
+def classify_multi(texts: List[str], batch_size: int = 32) -> List[List[str]]:
+    """Labels above their threshold, most probable first."""
+    out = []
+    for i in range(0, len(texts), batch_size):
+        probs, hits = _multi_hits(texts[i:i + batch_size])
+        for p, h in zip(probs, hits):
+            order = p.argsort(descending=True).tolist()
+            out.append([LABELS[j] for j in order if h[j]])
+    return out
+
+def classify_mask_batch(texts: List[str], batch_size: int = 32) -> List[int]:
+    weights = 1 << torch.arange(len(LABELS))
+    masks = []
+    for i in range(0, len(texts), batch_size):
+        _, hits = _multi_hits(texts[i:i + batch_size])
+        masks.extend((hits.long() * weights).sum(-1).tolist())
+    return masks
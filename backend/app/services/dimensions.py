@@ -0,0 +1,165 @@
+"""
+Dataset bounds, per-category / per-source counts and the filter lists,
+answered from memory instead of scanning `messages`.
+
+A snapshot is loaded from the `message_dimensions()` RPC at startup and
+again every DIMENSIONS_TTL_SECONDS to pick up writes made outside this
+process; ingest applies its rows on top in between (via app.rollups).
+With 005_message_dimension_counts.sql the RPC returns trigger-maintained
+counts. The 003 version only lists the categories and sources: the lists
+and bounds are used, and `count()` answers None (unknown) rather than 0.
+Without the RPC the snapshot falls back to one full scan.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Tuple
+
+from loguru import logger
+
+from ..config import settings
+
+
+def _ts(value) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    elif hasattr(value, "to_pydatetime"):  # pandas Timestamp
+        value = value.to_pydatetime()
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class Dimensions:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.category_counts: Counter = Counter()
+        self.source_counts: Counter = Counter()
+        self.total = 0
+        self.counts_known = True   # False while the RPC is the 003 version without counts
+        self.first: datetime | None = None
+        self.last: datetime | None = None
+        self.loaded_at: float | None = None
+
+    def observe_rows(self, rows: Iterable[dict]):
+        """Apply freshly ingested rows (each row exactly once)."""
+        with self._lock:
+            for r in rows:
+                self.total += 1
+                if r.get("category"):
+                    self.category_counts[r["category"]] += 1
+                if r.get("source"):
+                    self.source_counts[r["source"]] += 1
+                ts = _ts(r.get("timestamp"))
+                if ts is not None:
+                    self.first = ts if self.first is None or ts < self.first else self.first
+                    self.last = ts if self.last is None or ts > self.last else self.last
+
+    def _stale(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        ttl = settings.DIMENSIONS_TTL_SECONDS
+        return bool(ttl) and time.time() - self.loaded_at > ttl
+
+    def _load(self) -> Tuple[Counter, Counter, int | None, datetime | None, datetime | None]:
+        """(category counts, source counts, total, first, last); total None when counts are unknown."""
+        from .. import reports
+        try:
+            data = reports.supabase.rpc("message_dimensions").execute().data
+        except Exception as e:
+            logger.warning(f"message_dimensions RPC unavailable ({e}); scanning messages")
+            data = None
+        if data and "category_counts" in data:
+            return (Counter(data["category_counts"] or {}), Counter(data.get("source_counts") or {}),
+                    int(data.get("total") or 0), _ts(data["first"]), _ts(data["last"]))
+        if data:
+            logger.warning("message_dimensions() has no counts (003 version); apply "
+                           "005_message_dimension_counts.sql – empty-result shortcuts are off until then")
+            return (Counter(dict.fromkeys(data.get("categories") or [], 0)),
+                    Counter(dict.fromkeys(data.get("sources") or [], 0)),
+                    None, _ts(data["first"]), _ts(data["last"]))
+        cats, srcs, total, first, last = Counter(), Counter(), 0, None, None
+        for page in reports.iter_messages("category,source,timestamp"):
+            cats.update(r["category"] for r in page if r.get("category"))
+            srcs.update(r["source"] for r in page if r.get("source"))
+            total += len(page)
+            first = first or _ts(page[0]["timestamp"])
+            last = _ts(page[-1]["timestamp"])
+        return cats, srcs, total, first, last
+
+    def refresh(self):
+        if not self._refreshing.acquire(blocking=self.loaded_at is None):
+            return   # another thread is already reloading
+        try:
+            if not self._stale():
+                return
+            cats, srcs, total, first, last = self._load()
+            with self._lock:
+                self.category_counts, self.source_counts, self.total = cats, srcs, total or 0
+                self.counts_known = total is not None
+                self.first, self.last = first, last
+            self.loaded_at = time.time()
+        finally:
+            self._refreshing.release()
+
+    def _safe_refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:  # serve what we have rather than fail the request
+            logger.error(f"Dimension refresh failed: {e}")
+
+    def _current(self):
+        if self.loaded_at is None:
+            self._safe_refresh()
+        elif self._stale() and not self._refreshing.locked():
+            # periodic reloads happen off the request path
+            threading.Thread(target=self._safe_refresh, daemon=True).start()
+
+    def bounds(self) -> Tuple[datetime | None, datetime | None]:
+        """(first, last) message timestamp, UTC-aware."""
+        self._current()
+        return self.first, self.last
+
+    def confirmed_bounds(self) -> Tuple[datetime | None, datetime | None]:
+        """bounds(), checked with one limit-1 probe per side for rows written by other
+        workers or scripts since the snapshot; the cache is widened to what they find."""
+        from .. import reports
+        first, last = self.bounds()
+        newer = reports.edge_timestamp(latest=True, beyond=last)
+        older = reports.edge_timestamp(latest=False, beyond=first)
+        with self._lock:
+            if newer is not None and (self.last is None or _ts(newer) > self.last):
+                self.last = _ts(newer)
+            if older is not None and (self.first is None or _ts(older) < self.first):
+                self.first = _ts(older)
+            return self.first, self.last
+
+    def count(self, category: str | None = None, source: str | None = None) -> int | None:
+        """Messages for one category (comma list) or source; None for combinations
+        or when the RPC does not provide counts."""
+        self._current()
+        with self._lock:
+            if (category and source) or not self.counts_known:
+                return None
+            if category:
+                return sum(self.category_counts[c] for c in category.split(","))
+            if source:
+                return self.source_counts[source]
+            return self.total
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._current()
+        with self._lock:
+            return {
+                "categories": sorted(c for c, n in self.category_counts.items() if n or not self.counts_known),
+                "sources": sorted(s for s, n in self.source_counts.items() if n or not self.counts_known),
+                "category_counts": dict(self.category_counts) if self.counts_known else None,
+                "total": self.total if self.counts_known else None,
+                "first": self.first,
+                "last": self.last,
+            }
+
+
+dimensions = Dimensions()
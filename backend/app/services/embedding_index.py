@@ -0,0 +1,188 @@
+"""
+Similar-message index: a memory-mapped float16 embedding matrix plus the
+message ids it belongs to, searched by cosine similarity.
+
+Files under EMBEDDING_INDEX_DIR:
+  vectors.f16  raw (n, dim) float16 rows, L2-normalised, append-only
+  ids.txt      one message id per line, same row order
+  meta.json    {"dim": ...}
+  ivf.npz      optional coarse quantiser over the first `ivf_rows` rows;
+               rows appended after it was built are searched exhaustively
+  .lock        flock()ed around appends
+
+Workers and scripts/build_embedding_index.py append to the same files.
+An append holds the lock, first reads the ids others added, then writes
+its vectors before its ids, so an id on disk always has its vector, and
+its row is its line number in ids.txt. Readers pick up new lines before
+each search.
+"""
+import json
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows – one process per index
+    fcntl = None
+
+from ..config import settings
+
+_CHUNK = 65_536  # rows scored per matmul, keeps peak memory flat
+
+
+class EmbeddingIndex:
+    def __init__(self, path: str | Path, dim: int = 768):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = self.path / "meta.json"
+        if meta.exists():
+            dim = json.loads(meta.read_text())["dim"]
+        else:
+            meta.write_text(json.dumps({"dim": dim}))
+        self.dim = dim
+        self.ids: List[str] = []
+        self._row: dict = {}
+        self._ids_read = 0   # bytes of ids.txt already in self.ids
+        self._vectors: np.memmap | None = None
+        self._ivf = dict(np.load(self.path / "ivf.npz")) if (self.path / "ivf.npz").exists() else None
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, message_id: str) -> bool:
+        return message_id in self._row
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None or len(self._vectors) != len(self.ids):
+            if not self.ids:
+                return np.empty((0, self.dim), dtype=np.float16)
+            self._vectors = np.memmap(self.path / "vectors.f16", dtype=np.float16,
+                                      mode="r", shape=(len(self.ids), self.dim))
+        return self._vectors
+
+    def _refresh(self):
+        """Read the ids appended since the last call, by this or any other process."""
+        path = self.path / "ids.txt"
+        size = path.stat().st_size if path.exists() else 0
+        if size == self._ids_read:
+            return
+        with path.open("rb") as f:
+            f.seek(self._ids_read)
+            chunk = f.read(size - self._ids_read)
+        chunk = chunk[:chunk.rfind(b"\n") + 1]   # a line still being written waits
+        for mid in chunk.decode().split():
+            self._row[mid] = len(self.ids)
+            self.ids.append(mid)
+        self._ids_read += len(chunk)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with (self.path / ".lock").open("a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ── writes ────────────────────────────────────────────────────────────
+    def append(self, ids: List[str], vectors: np.ndarray):
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        with self._lock, self._file_lock():
+            self._refresh()
+            first: dict = {}
+            for i, mid in enumerate(ids):
+                first.setdefault(mid, i)
+            fresh = [i for mid, i in first.items() if mid not in self._row]
+            if not fresh:
+                return
+            path, row_bytes = self.path / "vectors.f16", self.dim * 2
+            rows = path.stat().st_size // row_bytes if path.exists() else 0
+            if rows < len(self.ids):
+                raise RuntimeError(f"{path} holds {rows} rows for {len(self.ids)} ids")
+            with path.open("ab") as f:
+                if rows > len(self.ids):
+                    f.truncate(len(self.ids) * row_bytes)   # vectors of a writer that died before its ids
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float16).tobytes())
+            with (self.path / "ids.txt").open("a") as f:
+                f.write("".join(f"{ids[i]}\n" for i in fresh))
+            self._refresh()
+
+    def build_ivf(self, n_lists: int | None = None, iters: int = 10, sample: int = 50_000, seed: int = 0):
+        """Spherical k-means coarse quantiser; rows are stored grouped by list."""
+        n = len(self)
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        x = self.vectors[np.sort(rng.choice(n, min(sample, n), replace=False))].astype(np.float32)
+        centroids = x[rng.choice(len(x), n_lists, replace=False)]
+        for _ in range(iters):
+            assign = (x @ centroids.T).argmax(1)
+            for j in range(n_lists):
+                members = x[assign == j]
+                if len(members):
+                    centroids[j] = members.mean(0)
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+
+        assign = np.concatenate([
+            (self.vectors[i:i + _CHUNK].astype(np.float32) @ centroids.T).argmax(1)
+            for i in range(0, n, _CHUNK)
+        ])
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._ivf = {"centroids": centroids, "order": order, "offsets": offsets, "ivf_rows": np.array(n)}
+        np.savez(self.path / "ivf.npz", **self._ivf)
+
+    # ── reads ─────────────────────────────────────────────────────────────
+    def vector_for(self, message_id: str) -> np.ndarray | None:
+        with self._lock:
+            self._refresh()
+        row = self._row.get(message_id)
+        return None if row is None else self.vectors[row].astype(np.float32)
+
+    def _candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray | None:
+        if self._ivf is None or len(self) < settings.EMBEDDING_IVF_MIN_ROWS:
+            return None
+        ivf = self._ivf
+        lists = np.argsort(ivf["centroids"] @ q)[::-1][:nprobe]
+        rows = [ivf["order"][ivf["offsets"][j]:ivf["offsets"][j + 1]] for j in lists]
+        rows.append(np.arange(int(ivf["ivf_rows"]), len(self)))   # unindexed tail
+        return np.sort(np.concatenate(rows))
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: str | None = None,
+               nprobe: int | None = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            self._refresh()
+        if not len(self):
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        q /= np.linalg.norm(q) + 1e-12
+        rows = self._candidates(q, nprobe or settings.EMBEDDING_IVF_NPROBE)
+        V = self.vectors
+        if rows is None:
+            scores = np.concatenate([V[i:i + _CHUNK].astype(np.float32) @ q for i in range(0, len(V), _CHUNK)])
+            rows = np.arange(len(V))
+        else:
+            scores = V[rows].astype(np.float32) @ q
+
+        if exclude is not None and exclude in self._row:
+            scores[rows == self._row[exclude]] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+@lru_cache()
+def get_index() -> EmbeddingIndex:
+    return EmbeddingIndex(settings.EMBEDDING_INDEX_DIR)
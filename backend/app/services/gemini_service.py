@@ -6,6 +6,7 @@ from loguru import logger
 import google.generativeai as genai
 
 from ..config import settings
+from ..telemetry import timed
 
 LLM_MODEL = "models/gemini-1.5-flash-latest"   # or -1.5-pro-latest
 MODEL_NAME = "models/gemini-1.5-flash-latest"
@@ -18,6 +19,7 @@ class GeminiService:
         genai.configure(api_key=api_key)
         self.model = _get_client()
 
+    @timed("llm.gemini")
     async def chat(
         self,
         prompt: str,
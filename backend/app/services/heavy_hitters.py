@@ -0,0 +1,352 @@
+"""
+Heavy hitters: users who contact support most often, phrasings repeated most.
+
+Per (day, kind) bucket, kind "user" (id_user) or "phrase" (normalised
+message text, digits masked so order ids and amounts do not split a
+phrasing):
+
+* a Count-Min sketch, DEPTH x WIDTH uint32 counters; any key's count is
+  the minimum of its DEPTH counters – never under, over by at most
+  e / WIDTH of the bucket's rows with probability 1 - e^-DEPTH
+* a Space-Saving summary of CAPACITY counters, which keeps every key
+  whose count exceeds rows / CAPACITY; a key it does not hold occurred at
+  most `floor` (its smallest counter) times that day
+
+Both take a row in O(1). A date range sums the Count-Min tables, takes the
+keys held by any day's summary as candidates and ranks them by the lower
+of the two upper bounds.
+
+Unlike the HyperLogLog sketches, counting a row twice counts it twice, so
+rows are tracked by id. Ingest observes its rows straight away, and
+`catch_up()` (startup and every HEAVY_HITTERS_SYNC_SECONDS) reads rows
+whose created_at is past a high-water mark. That picks up rows lost in a
+crash since the last save and rows other workers or scripts inserted. The
+mark trails the newest created_at seen by CATCH_UP_LAG, because a slow
+transaction can commit a row older than rows already read. Ids counted
+past the mark are remembered, so neither path counts a row twice. Every
+worker converges to the same table contents, which is why workers sharing
+HEAVY_HITTERS_PATH can each save over the others' file.
+"""
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+from ..config import settings
+from ..ml.dedup import normalize
+from .hll import _day, _hash64
+
+WIDTH = 2048
+DEPTH = 4
+CAPACITY = 200
+KINDS = ("user", "phrase")
+PHRASE_CHARS = 120
+CATCH_UP_LAG = timedelta(minutes=5)
+CATCH_UP_COLUMNS = "id,id_user,timestamp,message,created_at"
+_DIGITS = re.compile(r"\d+")
+
+
+def phrase(text: str) -> str:
+    return _DIGITS.sub("<n>", normalize(text))[:PHRASE_CHARS]
+
+
+def _created(value) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    elif hasattr(value, "to_pydatetime"):  # pandas Timestamp
+        value = value.to_pydatetime()
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _hash_keys(kind: str, keys: List[Hashable]) -> np.ndarray:
+    """Stable 64-bit hashes (they index persisted tables, so no built-in hash())."""
+    if kind == "user":
+        return _hash64(np.fromiter(keys, dtype=np.int64, count=len(keys)))
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(k.encode(), digest_size=8).digest(), "little") for k in keys),
+        dtype=np.uint64, count=len(keys),
+    )
+
+
+def _columns(h: np.ndarray) -> np.ndarray:
+    """(DEPTH, n) counter columns per hash: h1 + i * h2 (Kirsch–Mitzenmacher)."""
+    h1, h2 = h & np.uint64(0xFFFFFFFF), (h >> np.uint64(32)) | np.uint64(1)
+    rows = np.arange(DEPTH, dtype=np.uint64)[:, None]
+    return ((h1 + rows * h2) % np.uint64(WIDTH)).astype(np.intp)
+
+
+class CountMin:
+    __slots__ = ("table",)
+
+    def __init__(self, table: np.ndarray | None = None):
+        self.table = np.zeros((DEPTH, WIDTH), dtype=np.uint32) if table is None else table
+
+    def add(self, hashes: np.ndarray):
+        cols = _columns(hashes)
+        np.add.at(self.table, (np.arange(DEPTH)[:, None], cols), 1)
+
+
+def _estimate(table: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+    return table[np.arange(DEPTH)[:, None], _columns(hashes)].min(axis=0)
+
+
+class SpaceSaving:
+    """CAPACITY counters; keys sit in per-count buckets so the smallest is found in O(1)."""
+
+    __slots__ = ("counts", "errors", "_buckets", "_min")
+
+    def __init__(self):
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}   # count the key may have inherited from an evicted one
+        self._buckets: Dict[int, Dict[Hashable, None]] = {}
+        self._min = 0
+
+    @property
+    def floor(self) -> int:
+        """Upper bound on the count of a key that is not held."""
+        return self._min if len(self.counts) >= CAPACITY else 0
+
+    def _put(self, key: Hashable, count: int):
+        self.counts[key] = count
+        self._buckets.setdefault(count, {})[key] = None
+
+    def _take(self, key: Hashable) -> int:
+        count = self.counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+        return count
+
+    def add(self, key: Hashable):
+        if key in self.counts:
+            count = self._take(key)
+            self._put(key, count + 1)
+            if count == self._min and count not in self._buckets:
+                self._min = count + 1
+        elif len(self.counts) < CAPACITY:
+            self._put(key, 1)
+            self.errors[key] = 0
+            self._min = 1
+        else:
+            # replace the oldest key among the smallest counters; the newcomer inherits its count
+            low = self._min
+            victim = next(iter(self._buckets[low]))
+            self._take(victim)
+            del self.errors[victim]
+            self._put(key, low + 1)
+            self.errors[key] = low
+            if low not in self._buckets:
+                self._min = low + 1
+
+    @classmethod
+    def restore(cls, keys, counts, errors) -> "SpaceSaving":
+        ss = cls()
+        for key, count, error in sorted(zip(keys, counts.tolist(), errors.tolist()), key=lambda t: t[1]):
+            ss._put(key, count)
+            ss.errors[key] = error
+        ss._min = min(ss._buckets, default=0)
+        return ss
+
+
+class Bucket:
+    __slots__ = ("rows", "cms", "summary")
+
+    def __init__(self, cms: CountMin | None = None, summary: SpaceSaving | None = None, rows: int = 0):
+        self.rows = rows
+        self.cms = cms or CountMin()
+        self.summary = summary or SpaceSaving()
+
+
+def _bounds(buckets: List[Bucket], keys: List[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+    """Space-Saving (upper, lower) bounds of each key summed over `buckets`."""
+    index = {k: i for i, k in enumerate(keys)}
+    upper = np.full(len(keys), sum(b.summary.floor for b in buckets), dtype=np.int64)
+    lower = np.zeros(len(keys), dtype=np.int64)
+    for b in buckets:
+        ss = b.summary
+        if len(keys) < len(ss.counts):
+            held = [(index[k], ss.counts[k], ss.errors[k]) for k in keys if k in ss.counts]
+        else:
+            held = [(index[k], c, ss.errors[k]) for k, c in ss.counts.items() if k in index]
+        for i, count, error in held:
+            upper[i] += count - ss.floor
+            lower[i] += count - error
+    return upper, lower
+
+
+class HeavyHitters:
+    """Count-Min + Space-Saving per (day, kind); top-k over any date range."""
+
+    def __init__(self):
+        self._lock = threading.RLock()   # ids and their counts change together, or a save splits them
+        self._catching_up = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], Bucket] = {}
+        self._mark: datetime | None = None        # every row created at or before this is counted
+        self._counted: Dict[str, datetime] = {}   # ids counted past the mark → created_at
+        self.warm = False   # a catch-up has completed: every stored row up to then is counted
+
+    def observe_rows(self, rows: Iterable[dict]):
+        """Count freshly stored rows (id and created_at set); rows already counted are skipped."""
+        fresh = []
+        with self._lock:
+            for r in rows:
+                rid, created = r.get("id"), _created(r.get("created_at"))
+                if rid is None or created is None:
+                    continue   # without an id it can only be counted once stored – by catch_up
+                if (self._mark is not None and created <= self._mark) or rid in self._counted:
+                    continue
+                self._counted[rid] = created
+                fresh.append(r)
+            self._count(fresh)
+
+    def _count(self, rows: List[dict]):
+        batches: Dict[Tuple[str, str], list] = {}
+        for r in rows:
+            day = _day(r["timestamp"])
+            if r.get("id_user") is not None:
+                batches.setdefault((day, "user"), []).append(int(r["id_user"]))
+            if r.get("message"):
+                batches.setdefault((day, "phrase"), []).append(phrase(r["message"]))
+        hashed = {key: _hash_keys(key[1], keys) for key, keys in batches.items()}
+        with self._lock:
+            for key, keys in batches.items():
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = Bucket()
+                bucket.rows += len(keys)
+                bucket.cms.add(hashed[key])
+                for k in keys:
+                    bucket.summary.add(k)
+
+    def _select(self, kind: str, start: datetime | None, end: datetime | None) -> List[Bucket]:
+        lo = start.strftime("%Y-%m-%d") if start else ""
+        hi = end.strftime("%Y-%m-%d") if end else "9999"
+        return [b for (day, k), b in self._buckets.items() if k == kind and lo <= day <= hi]
+
+    def _counts(self, kind: str, buckets: List[Bucket], keys: List[Hashable]) -> Tuple[np.ndarray, np.ndarray]:
+        if not buckets or not keys:
+            return np.zeros(len(keys), np.int64), np.zeros(len(keys), np.int64)
+        table = np.sum([b.cms.table for b in buckets], axis=0, dtype=np.int64)
+        upper, lower = _bounds(buckets, keys)
+        return np.minimum(_estimate(table, _hash_keys(kind, keys)), upper), lower
+
+    def top(self, kind: str, start: datetime | None = None, end: datetime | None = None, k: int = 10) -> dict:
+        """The k most frequent keys in whole days [start, end], plus their count in the
+        same number of days before `start` (None without a start) to spot spikes."""
+        with self._lock:
+            buckets = self._select(kind, start, end)
+            candidates = sorted({key for b in buckets for key in b.summary.counts}, key=str)
+            counts, lower = self._counts(kind, buckets, candidates)
+            order = np.lexsort((-lower, -counts))[:k]
+            keys = [candidates[i] for i in order]
+            previous = None
+            if start is not None:
+                last = end or (datetime.strptime(max(day for day, _ in self._buckets), "%Y-%m-%d")
+                               if self._buckets else start)
+                days = (last.date() - start.date()).days + 1
+                before = self._select(kind, start - timedelta(days=days), start - timedelta(days=1))
+                previous = self._counts(kind, before, keys)[0]
+            rows = sum(b.rows for b in buckets)
+        items = [
+            {"key": key, "count": int(counts[i]), "error": int(counts[i] - lower[i]),
+             **({"previous": int(previous[j])} if previous is not None else {})}
+            for j, (key, i) in enumerate(zip(keys, order))
+        ]
+        return {"by": kind, "rows": rows, "items": items}
+
+    def catch_up(self) -> int:
+        """Count rows created past the high-water mark; returns how many were read."""
+        from .. import reports
+        if not self._catching_up.acquire(blocking=False):
+            return 0   # another thread is already reading
+        try:
+            newest, total = None, 0
+            for page in reports.iter_created_after(CATCH_UP_COLUMNS, self._mark):
+                created = [_created(r["created_at"]) for r in page]
+                latest = max(created)
+                newest = latest if newest is None or latest > newest else newest
+                mark = newest - CATCH_UP_LAG
+                fresh = []
+                with self._lock:
+                    # rows are read in timestamp order, so the mark only tells ingest what to skip;
+                    # ids at or below it are not remembered, ingest's own ids are kept till the end
+                    if self._mark is None or mark > self._mark:
+                        self._mark = mark
+                    for r, ts in zip(page, created):
+                        if r["id"] in self._counted:
+                            continue
+                        if ts > self._mark:
+                            self._counted[r["id"]] = ts
+                        fresh.append(r)
+                    self._count(fresh)
+                total += len(page)
+            with self._lock:
+                if self._mark is not None:
+                    self._counted = {rid: ts for rid, ts in self._counted.items() if ts > self._mark}
+                self.warm = True
+            return total
+        finally:
+            self._catching_up.release()
+
+    def save(self, path: str | None = None):
+        path = Path(path or settings.HEAVY_HITTERS_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            mark = self._mark.isoformat() if self._mark else ""
+            counted_ids = np.array(list(self._counted), dtype=str)
+            counted_at = np.array([ts.isoformat() for ts in self._counted.values()], dtype=str)
+            names = np.array(["\t".join(k) for k in self._buckets], dtype=str)
+            tables = np.stack([b.cms.table for b in self._buckets.values()]) if names.size \
+                else np.zeros((0, DEPTH, WIDTH), np.uint32)
+            rows = np.array([b.rows for b in self._buckets.values()], dtype=np.int64)
+            owner, keys, counts, errors = [], [], [], []
+            for i, b in enumerate(self._buckets.values()):
+                for key, count in b.summary.counts.items():
+                    owner.append(i)
+                    keys.append(str(key))
+                    counts.append(count)
+                    errors.append(b.summary.errors[key])
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npz")   # workers may save at the same time
+        np.savez_compressed(
+            tmp, buckets=names, rows=rows, tables=tables, owner=np.array(owner, dtype=np.int32),
+            keys=np.array(keys, dtype=str), counts=np.array(counts, dtype=np.int64),
+            errors=np.array(errors, dtype=np.int64), mark=np.array(mark),
+            counted_ids=counted_ids, counted_at=counted_at,
+        )
+        tmp.replace(path)
+
+    def load(self, path: str | None = None) -> bool:
+        """Restore saved buckets and the high-water mark; call at startup, before rows
+        are observed, then catch_up() for whatever was stored since the save."""
+        path = Path(path or settings.HEAVY_HITTERS_PATH)
+        if not path.exists():
+            return False
+        with np.load(path) as npz:
+            data = {name: npz[name] for name in npz.files}   # NpzFile decompresses on every access
+        owner = data["owner"]
+        starts = np.searchsorted(owner, np.arange(len(data["buckets"]) + 1))
+        with self._lock:
+            for i, name in enumerate(data["buckets"]):
+                day, kind = str(name).split("\t")
+                sl = slice(starts[i], starts[i + 1])
+                keys = data["keys"][sl].tolist()
+                if kind == "user":
+                    keys = [int(k) for k in keys]
+                summary = SpaceSaving.restore(keys, data["counts"][sl], data["errors"][sl])
+                self._buckets[(day, kind)] = Bucket(CountMin(data["tables"][i].copy()), summary, int(data["rows"][i]))
+            mark = str(data["mark"])
+            self._mark = _created(mark) if mark else None
+            self._counted = {rid: _created(ts) for rid, ts in zip(data["counted_ids"].tolist(),
+                                                                  data["counted_at"].tolist())}
+        return True
+
+
+heavy_hitters = HeavyHitters()
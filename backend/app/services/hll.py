@@ -0,0 +1,140 @@
+"""
+HyperLogLog sketches for distinct-user counts.
+
+One sketch (4 KiB of uint8 registers, p=12) per (day, category, source)
+bucket. Sketches merge by element-wise max, so unique users for any date
+range and filter combination is the estimate of the merged buckets, with
+a relative standard error of 1.04 / sqrt(4096) ≈ 1.6%. Adding a user twice
+is a no-op, which makes replaying rows that are already counted harmless.
+"""
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+P = 12
+M = 1 << P
+RELATIVE_ERROR = 1.04 / np.sqrt(M)
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+_W = 64 - P   # hash bits left for the rank
+
+
+def _hash64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finaliser – cheap, well mixed 64-bit hashes of integer ids."""
+    z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class HyperLogLog:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: np.ndarray | None = None):
+        self.registers = np.zeros(M, dtype=np.uint8) if registers is None else registers
+
+    def add(self, ids: Iterable[int]):
+        h = _hash64(np.fromiter(ids, dtype=np.int64))
+        if not len(h):
+            return
+        idx = (h >> np.uint64(_W)).astype(np.intp)
+        w = h & np.uint64((1 << _W) - 1)
+        # rank = leading zeros in the low _W bits + 1; frexp's exponent is the exact bit length
+        _, bits = np.frexp(w.astype(np.float64))
+        rank = (_W - bits + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> float:
+        est = _ALPHA * M * M / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if est <= 2.5 * M and zeros:
+            est = M * np.log(M / zeros)   # linear counting for small cardinalities
+        return float(est)
+
+
+def _day(ts) -> str:
+    if isinstance(ts, str):
+        if ts.endswith(("Z", "+00:00")) or len(ts) <= 19:   # UTC / naive: no parsing needed
+            return ts[:10]
+        ts = datetime.fromisoformat(ts)
+    if ts.tzinfo:
+        ts = ts.astimezone(timezone.utc)
+    return ts.strftime("%Y-%m-%d")
+
+
+class UserSketches:
+    """HyperLogLog per (day, category, source), merged on demand."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sketches: Dict[Tuple[str, str, str], HyperLogLog] = {}
+        self.warm = False
+
+    def observe_rows(self, rows: Iterable[dict]):
+        batches: Dict[Tuple[str, str, str], list] = {}
+        for r in rows:
+            if r.get("id_user") is None:
+                continue
+            key = (_day(r["timestamp"]), r.get("category") or "", r.get("source") or "")
+            batches.setdefault(key, []).append(int(r["id_user"]))
+        with self._lock:
+            for key, ids in batches.items():
+                self._sketches.setdefault(key, HyperLogLog()).add(ids)
+
+    def unique_users(
+        self,
+        category: str | None,
+        source: str | None,
+        start: datetime | None,
+        end: datetime | None,
+    ) -> Tuple[int, int]:
+        """(estimate, ≈95% absolute error bound) over the days with rows in [start, end].
+
+        The dataset stamps messages at midnight, so the `timestamp <= end` of
+        reports.fetch_messages keeps the whole end day – and so do we.
+        """
+        cats = set(category.split(",")) if category else None
+        lo = start.strftime("%Y-%m-%d") if start else ""
+        hi = end.strftime("%Y-%m-%d") if end else "9999"
+        with self._lock:
+            regs = [s.registers for (day, cat, src), s in self._sketches.items()
+                    if lo <= day <= hi and (cats is None or cat in cats) and (not source or src == source)]
+            if not regs:
+                return 0, 0
+            merged = HyperLogLog(np.max(np.stack(regs), axis=0))
+        est = merged.estimate()
+        return int(round(est)), int(round(2 * RELATIVE_ERROR * est))
+
+    def save(self, path: str | None = None):
+        path = Path(path or settings.USER_SKETCH_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            keys = np.array(["\t".join(k) for k in self._sketches], dtype=str)
+            regs = np.stack([s.registers for s in self._sketches.values()]) if keys.size else np.zeros((0, M), np.uint8)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez_compressed(tmp, keys=keys, registers=regs)
+        tmp.replace(path)
+
+    def load(self, path: str | None = None) -> bool:
+        """Merge saved sketches in; they miss rows stored since the save, so `warm`
+        waits for the replay (rollups.warm_up)."""
+        path = Path(path or settings.USER_SKETCH_PATH)
+        if not path.exists():
+            return False
+        data = np.load(path)
+        with self._lock:
+            for key, reg in zip(data["keys"], data["registers"]):
+                sketch = self._sketches.setdefault(tuple(str(key).split("\t")), HyperLogLog())
+                sketch.merge(HyperLogLog(reg.copy()))
+        return True
+
+
+user_sketches = UserSketches()
@@ -6,6 +6,7 @@ from transformers import pipeline, Pipeline
 from loguru import logger
 
 from ..config import settings
+from ..telemetry import timed
 
 
 class HFService:
@@ -16,6 +17,7 @@ class HFService:
                                   model_id=model_id,
                                   hf_key=api_key)
 
+    @timed("llm.huggingface")
     async def chat(
         self,
         prompt: str,
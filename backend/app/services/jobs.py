@@ -0,0 +1,224 @@
+"""
+Asynchronous classification for ingest (CLASSIFY_ASYNC=true).
+
+Ingest stores the message with `category = NULL` and enqueues the stored
+row in a local SQLite table. Worker tasks claim batches, classify them
+with one model call and backfill Supabase with one UPDATE per distinct
+label.
+
+A claim is a lease: it records the claiming process and expires after
+CLASSIFY_LEASE_SECONDS, when any worker may take the job again. So work
+of a process that died survives restarts, and workers sharing the queue
+never take each other's live claims. Every claim counts as an attempt. A
+job that has failed, or whose lease has expired, CLASSIFY_MAX_ATTEMPTS
+times is dead-lettered: it keeps its row and last error but is not
+claimed again.
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+
+from ..config import settings
+
+
+class JobQueue:
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " message_id TEXT UNIQUE,"
+            " row TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " claimed_at REAL,"
+            " attempts INTEGER DEFAULT 0)"
+        )
+        # columns added after the first release; older queue files gain them here
+        have = {c[1] for c in self._conn.execute("PRAGMA table_info(jobs)")}
+        for col in ("claimed_by TEXT", "failed_at REAL", "error TEXT"):
+            if col.split()[0] not in have:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {col}")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._finished: deque = deque(maxlen=10_000)   # (finished_at, n) for throughput
+        self.processed = 0
+        self.failed = 0
+
+    def enqueue(self, rows: List[dict]):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (message_id, row, enqueued_at) VALUES (?, ?, ?)",
+                [(r["id"], json.dumps(r, default=str), now) for r in rows],
+            )
+
+    def claim(self, n: int) -> List[Tuple[int, dict]]:
+        """Lease up to n jobs: unclaimed ones, or ones whose lease has expired."""
+        now = time.time()
+        expired = now - settings.CLASSIFY_LEASE_SECONDS
+        with self._lock:
+            # a job whose every lease ran out (it keeps killing its worker?) stops here
+            self._conn.execute(
+                "UPDATE jobs SET failed_at = ?, error = 'lease expired' "
+                "WHERE failed_at IS NULL AND claimed_at < ? AND attempts >= ?",
+                (now, expired, settings.CLASSIFY_MAX_ATTEMPTS),
+            )
+            rows = self._conn.execute(
+                "SELECT id, row FROM jobs WHERE failed_at IS NULL AND (claimed_at IS NULL OR claimed_at < ?) "
+                "ORDER BY id LIMIT ?", (expired, n)
+            ).fetchall()
+            if rows:
+                self._conn.executemany(
+                    "UPDATE jobs SET claimed_at = ?, claimed_by = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now, self.owner, jid) for jid, _ in rows],
+                )
+        return [(jid, json.loads(row)) for jid, row in rows]
+
+    def complete(self, job_ids: List[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(j,) for j in job_ids])
+        self.processed += len(job_ids)
+        self._finished.append((time.time(), len(job_ids)))
+
+    def release(self, job_ids: List[int]):
+        """Put jobs back untried (shutdown); the claim does not count as an attempt."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET claimed_at = NULL, claimed_by = NULL, attempts = max(attempts - 1, 0) "
+                "WHERE id = ? AND claimed_by = ?", [(j, self.owner) for j in job_ids])
+
+    def fail(self, job_ids: List[int], error: str):
+        """Put failed jobs back for another try, or dead-letter those out of attempts."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET claimed_at = NULL, claimed_by = NULL, error = ?, "
+                "failed_at = CASE WHEN attempts >= ? THEN ? END WHERE id = ? AND claimed_by = ?",
+                [(error, settings.CLASSIFY_MAX_ATTEMPTS, time.time(), j, self.owner) for j in job_ids],
+            )
+
+    def release_stale(self):
+        """At startup: free expired claims, so stats count them as pending again.
+
+        The owner id is new in every process, so a claim left by a crash looks
+        like a live worker's and is only retaken once its lease expires.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET claimed_at = NULL, claimed_by = NULL "
+                "WHERE failed_at IS NULL AND claimed_at < ?",
+                (time.time() - settings.CLASSIFY_LEASE_SECONDS,),
+            )
+
+    def stats(self, window: float = 60.0) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            pending, in_flight, dead, oldest = self._conn.execute(
+                "SELECT sum(failed_at IS NULL AND claimed_at IS NULL), sum(failed_at IS NULL AND claimed_at IS NOT NULL), "
+                "sum(failed_at IS NOT NULL), min(CASE WHEN failed_at IS NULL THEN enqueued_at END) FROM jobs"
+            ).fetchone()
+        recent = sum(n for t, n in self._finished if t >= now - window)
+        return {
+            "depth": pending or 0,
+            "in_flight": in_flight or 0,
+            "dead_letter": dead or 0,
+            "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "throughput_per_s": round(recent / window, 3),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+
+@lru_cache
+def get_queue() -> JobQueue:
+    return JobQueue(settings.CLASSIFY_QUEUE_PATH)
+
+
+_wake = asyncio.Event()
+_workers: List[asyncio.Task] = []
+
+
+def submit(rows: List[dict]):
+    get_queue().enqueue(rows)
+    _wake.set()
+
+
+def _classify_and_update(rows: List[dict]) -> List[dict]:
+    """One batched model call, then one UPDATE per distinct result."""
+    from .. import reports
+    from ..ml.labels import labels_to_mask
+    from .bert_classifier import classify_batch, classify_multi, model_version
+
+    texts = [r.get("message") or "" for r in rows]
+    version = model_version()
+    if settings.MULTI_LABEL:
+        multi = classify_multi(texts)
+        updates = [{"category": labels[0], "labels_mask": labels_to_mask(labels), "model_version": version}
+                   for labels in multi]
+    else:
+        updates = [{"category": label, "model_version": version} for label in classify_batch(texts)]
+
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for r, upd in zip(rows, updates):
+        groups[json.dumps(upd, sort_keys=True)].append(r["id"])
+    for upd, ids in groups.items():
+        reports.supabase.table("messages").update(json.loads(upd)).in_("id", ids).execute()
+    return [{**r, **upd} for r, upd in zip(rows, updates)]
+
+
+async def _worker(n: int):
+    from .. import rollups
+    from . import local_store
+
+    queue = get_queue()
+    while True:
+        batch = await run_in_threadpool(queue.claim, settings.CLASSIFY_BATCH)
+        if not batch:
+            _wake.clear()
+            try:
+                await asyncio.wait_for(_wake.wait(), settings.CLASSIFY_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        ids = [jid for jid, _ in batch]
+        try:
+            done = await run_in_threadpool(_classify_and_update, [row for _, row in batch])
+        except asyncio.CancelledError:
+            queue.release(ids)
+            raise
+        except Exception as e:
+            logger.error(f"Classifier worker {n}: batch of {len(batch)} failed: {e}")
+            queue.failed += len(batch)
+            queue.fail(ids, str(e))
+            await asyncio.sleep(settings.CLASSIFY_POLL_SECONDS)
+            continue
+        queue.complete(ids)
+        rollups.observe(done)
+        if settings.ANALYTICS_BACKEND == "local":
+            local_store.append(done)
+
+
+async def start():
+    get_queue().release_stale()   # expired claims, e.g. of a process that died
+    for n in range(settings.CLASSIFY_WORKERS):
+        _workers.append(asyncio.create_task(_worker(n)))
+
+
+async def stop():
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
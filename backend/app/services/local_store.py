@@ -0,0 +1,342 @@
+"""
+Local columnar copy of the `messages` table for offline / low-latency analytics.
+
+Rows live in Parquet files partitioned by month and are queried with DuckDB,
+which prunes month partitions, pushes timestamp/category/source predicates
+into the Parquet row-group statistics and reads only the selected columns:
+
+    data/store/month=2024-11/part-<ns>.parquet
+
+Fresh rows from ingest are buffered in memory (and visible to queries)
+until LOCAL_STORE_FLUSH_ROWS accumulate; `scripts/sync_local_store.py`
+back-fills from Supabase and compacts small files.
+
+The same id can land in more than one part: the sync script cannot see
+another process's buffer, and a reclassified row is appended again. The
+part name carries its write time, so reads keep the most recently
+written copy of each id – the buffer's over any part's – and
+compaction keeps the same one.
+Needs the optional `duckdb` and `pyarrow` packages.
+"""
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import pandas as pd
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional – only needed with ANALYTICS_BACKEND=local
+    duckdb = None
+
+from ..config import settings
+from ..ml.labels import LABELS
+
+COLUMNS = ["id", "id_user", "timestamp", "source", "message", "category", "labels_mask", "created_at"]
+
+_lock = threading.Lock()
+_buffer: List[dict] = []
+_buffer_gen = 0   # bumped whenever _buffer changes, so readers can cache views of it
+_con = None
+
+
+def _root() -> Path:
+    return Path(settings.LOCAL_STORE_DIR)
+
+
+def _connection():
+    global _con
+    if duckdb is None:
+        raise RuntimeError("duckdb and pyarrow are required for the local analytics store")
+    if _con is None:
+        _con = duckdb.connect()
+    return _con.cursor()   # one cursor per call – safe across threads
+
+
+def _utc_naive(ts) -> datetime | None:
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return (ts.tz_convert("UTC").tz_localize(None) if ts.tzinfo else ts).to_pydatetime()
+
+
+def _frame(rows: List[dict]) -> pd.DataFrame:
+    df = pd.DataFrame(rows).reindex(columns=COLUMNS)
+    for col in ("timestamp", "created_at"):
+        df[col] = pd.to_datetime(df[col], utc=True, format="ISO8601").dt.tz_localize(None)
+    df["id_user"] = df["id_user"].astype("Int64")
+    df["labels_mask"] = df["labels_mask"].astype("Int16")
+    for col in ("id", "source", "message", "category"):
+        df[col] = df[col].astype("string")
+    return df
+
+
+# ── writes ────────────────────────────────────────────────────────────────
+def _written(path: Path) -> int:
+    """Write time (ns) from a part's name – the version of the rows in it."""
+    return int(path.stem.split("-")[1])
+
+
+def _stored_labels(ids: List[str], months: List[str]) -> Dict[str, tuple]:
+    """id → (category, labels_mask) of the current copy on disk."""
+    files = [str(p) for m in months for p in (_root() / f"month={m}").glob("*.parquet")]
+    if not files:
+        return {}
+    cur = _connection()
+    cur.register("_incoming", pd.DataFrame({"id": ids}))
+    found = cur.execute(
+        "SELECT p.id, p.category, p.labels_mask FROM read_parquet(?, union_by_name=true, filename=true) p "
+        "JOIN _incoming i USING (id) QUALIFY row_number() OVER (PARTITION BY p.id ORDER BY filename DESC) = 1",
+        [files],
+    ).fetchall()
+    return {rid: (cat, mask) for rid, cat, mask in found}
+
+
+def _write(df: pd.DataFrame, version: int | None = None):
+    month = df["timestamp"].dt.strftime("%Y-%m")
+    for m, part in df.groupby(month):
+        out = _root() / f"month={m}"
+        out.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pandas(part.sort_values("timestamp"), preserve_index=False)
+        pq.write_table(table, out / f"part-{version or time.time_ns()}-{uuid.uuid4().hex[:6]}.parquet",
+                       compression="zstd")
+
+
+def append(rows: List[dict], skip_existing: bool = False):
+    """Add rows; with skip_existing, rows already on disk with the same labels are
+    dropped (sync re-runs) and relabelled ones are written as the newer copy."""
+    if not rows:
+        return
+    if skip_existing:
+        df = _frame(rows)
+        months = sorted(df["timestamp"].dt.strftime("%Y-%m").unique())
+        stored = _stored_labels(df["id"].tolist(), months)
+        with _lock:
+            stored.update({r.get("id"): (r.get("category"), r.get("labels_mask")) for r in _buffer})
+        same = [
+            rid in stored and stored[rid][0] == (None if pd.isna(cat) else cat)
+            and (pd.isna(stored[rid][1]) if pd.isna(mask) else stored[rid][1] == mask)
+            for rid, cat, mask in zip(df["id"], df["category"], df["labels_mask"])
+        ]
+        df = df[[not s for s in same]]
+        if len(df):
+            _write(df)
+        return
+    global _buffer_gen
+    with _lock:
+        _buffer.extend(rows)
+        _buffer_gen += 1
+        full = len(_buffer) >= settings.LOCAL_STORE_FLUSH_ROWS
+    if full:
+        flush()
+
+
+def flush():
+    global _buffer_gen
+    with _lock:
+        rows, _buffer[:] = list(_buffer), []
+        _buffer_gen += 1
+    if rows:
+        _write(_frame(rows))
+
+
+def compact(month: str | None = None) -> int:
+    """Rewrite each month's parts as one file holding the newest copy of each id.
+    Returns files removed."""
+    removed = 0
+    dirs = [_root() / f"month={month}"] if month else sorted(_root().glob("month=*"))
+    for d in dirs:
+        parts = sorted(d.glob("*.parquet"))
+        if len(parts) < 2:
+            continue
+        df = _connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM read_parquet(?, union_by_name=true, filename=true) "
+            "QUALIFY row_number() OVER (PARTITION BY id ORDER BY filename DESC) = 1 "
+            "ORDER BY timestamp",
+            [[str(p) for p in parts]],
+        ).df()
+        # named as the newest part it replaces, so a part written meanwhile still wins
+        _write(df, max(_written(p) for p in parts))
+        for p in parts:
+            p.unlink()
+        removed += len(parts)
+    return removed
+
+
+# ── reads ─────────────────────────────────────────────────────────────────
+def _source(cur, start: datetime | None, end: datetime | None) -> Tuple[str, list] | None:
+    """SQL for the union of on-disk partitions and the ingest buffer, one row per id."""
+    parts, params = [], []
+    cols = ", ".join(COLUMNS)
+    with _lock:
+        # later rows for an id replace earlier ones (a reclassified row is appended again)
+        buffered = list({r.get("id") or id(r): r for r in _buffer}.values())
+    if buffered:
+        cur.register("_buffered", _frame(buffered))
+    files = part_files()
+    if files:
+        # copies of an id share its timestamp, so time filters can go before the dedupe;
+        # category filters cannot – a stale copy may match where the newest does not
+        prune = []
+        if start:
+            prune += ["month >= ?", "timestamp >= ?"]
+            params += [start.strftime("%Y-%m"), start]
+        if end:
+            prune += ["month <= ?", "timestamp <= ?"]
+            params += [end.strftime("%Y-%m"), end]
+        if buffered:
+            prune.append("id NOT IN (SELECT id FROM _buffered WHERE id IS NOT NULL)")
+        where = f" WHERE {' AND '.join(prune)}" if prune else ""
+        # a compacted month is one file and needs no dedupe
+        dedupe = len(files) > len({p.parent for p in files})
+        parts.append(
+            f"SELECT {cols} FROM read_parquet('{_root()}/month=*/*.parquet', hive_partitioning=true, "
+            f"union_by_name=true{', filename=true' if dedupe else ''}){where}"
+            + (" QUALIFY row_number() OVER (PARTITION BY id ORDER BY filename DESC) = 1" if dedupe else "")
+        )
+    if buffered:
+        parts.append(f"SELECT {cols} FROM _buffered")
+    if not parts:
+        return None
+    return " UNION ALL ".join(parts), params
+
+
+def _where(category, source, start, end) -> Tuple[str, list]:
+    clauses, params = [], []
+    if category:
+        cats = category.split(",")
+        clauses.append(f"category IN ({', '.join('?' * len(cats))})")
+        params.extend(cats)
+    if source:
+        clauses.append("source = ?")
+        params.append(source)
+    if start:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        clauses.append("timestamp <= ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _query(select: str, category, source, start, end, tail: str = "") -> pd.DataFrame | None:
+    start, end = _utc_naive(start), _utc_naive(end)
+    cur = _connection()
+    src = _source(cur, start, end)
+    if src is None:
+        return None
+    sql, params = src
+    where, wparams = _where(category, source, start, end)
+    return cur.execute(f"SELECT {select} FROM ({sql}){where} {tail}", params + wparams).df()
+
+
+def fetch(category, source, start, end, columns: str = "*") -> pd.DataFrame:
+    cols = ", ".join(COLUMNS) if columns == "*" else columns
+    df = _query(cols, category, source, start, end)
+    if df is None or df.empty:
+        return pd.DataFrame()
+    if "timestamp" in df:
+        df["timestamp"] = pd.to_datetime(df["timestamp"]).dt.tz_localize(timezone.utc)
+    return df
+
+
+def basic_metrics(category, source, start, end) -> Dict[str, Any]:
+    """Same shape as reports.basic_metrics, aggregated inside DuckDB in one scan."""
+    label_sums = ", ".join(f"sum((labels_mask >> {i}) & 1) AS l{i}" for i in range(len(LABELS)))
+    df = _query(
+        "grouping(category) AS is_total, category, count(*) AS n, count(DISTINCT id_user) AS users, "
+        f"count(labels_mask) AS masked, {label_sums}",
+        category, source, start, end, "GROUP BY GROUPING SETS ((category), ())",
+    )
+    total = df[df["is_total"] == 1] if df is not None else None
+    if total is None or total.empty or not total["n"].iloc[0]:
+        return {"total_messages": 0, "unique_users": 0, "categories": {}}
+    per_cat = df[(df["is_total"] == 0) & df["category"].notna()]
+    row = total.iloc[0]
+    metrics = {
+        "total_messages": int(row["n"]),
+        "unique_users": int(row["users"]),
+        "categories": {c: int(n) for c, n in zip(per_cat["category"], per_cat["n"])},
+    }
+    if row["masked"]:
+        metrics["labels"] = {lab: int(row[f"l{i}"]) for i, lab in enumerate(LABELS) if row[f"l{i}"]}
+    return metrics
+
+
+def iter_pages(columns: str = "*", category=None, source=None, start=None, end=None,
+               page_size: int = 1000, created_after=None) -> Iterator[List[dict]]:
+    """Rows in (timestamp, id) order, streamed from DuckDB in record batches."""
+    cols = COLUMNS if columns == "*" else list(dict.fromkeys(columns.split(",") + ["timestamp", "id"]))
+    start, end = _utc_naive(start), _utc_naive(end)
+    cur = _connection()
+    src = _source(cur, start, end)
+    if src is None:
+        return
+    sql, params = src
+    where, wparams = _where(category, source, start, end)
+    if created_after is not None:
+        where += (" AND" if where else " WHERE") + " created_at > ?"
+        wparams.append(_utc_naive(created_after))
+    reader = cur.execute(
+        f"SELECT {', '.join(cols)} FROM ({sql}){where} ORDER BY timestamp, id", params + wparams
+    ).fetch_record_batch(page_size)
+    for batch in reader:
+        yield batch.to_pylist()
+
+
+def daily_counts(category, source, start, end) -> pd.Series:
+    df = _query("date_trunc('day', timestamp) AS day, count(*) AS n", category, source, start, end,
+                "GROUP BY 1 ORDER BY 1")
+    if df is None or df.empty:
+        return pd.Series(dtype="int64")
+    return df.set_index("day")["n"]
+
+
+def part_files() -> List[Path]:
+    """Parquet parts on disk, oldest month first."""
+    return sorted(_root().glob("month=*/*.parquet"))
+
+
+def buffered_frame(since: int | None = None) -> Tuple[int, pd.DataFrame | None]:
+    """(generation, ingest rows not yet flushed); the frame is None if unchanged since `since`."""
+    with _lock:
+        if _buffer_gen == since:
+            return since, None
+        gen, rows = _buffer_gen, list(_buffer)
+    return gen, _frame(rows) if rows else pd.DataFrame(columns=COLUMNS)
+
+
+def take(path: Path, rows: List[int], columns: str = "*") -> pd.DataFrame:
+    """Rows of one Parquet part by position, in the order given."""
+    cols = ", ".join(COLUMNS) if columns == "*" else columns
+    df = _connection().execute(
+        f"SELECT file_row_number AS _row, {cols} FROM read_parquet(?, file_row_number=true) "
+        f"WHERE file_row_number IN ({', '.join('?' * len(rows))})",
+        [str(path), *rows],
+    ).df()
+    return df.set_index("_row").loc[rows].reset_index(drop=True)
+
+
+def any_rows(category, source, start, end) -> bool:
+    df = _query("1 AS hit", category, source, start, end, "LIMIT 1")
+    return df is not None and not df.empty
+
+
+def edge_timestamp(latest: bool, start=None, end=None) -> datetime | None:
+    """Newest (latest=True) or oldest timestamp within [start, end]."""
+    df = _query("timestamp", None, None, start, end, f"ORDER BY timestamp {'DESC' if latest else 'ASC'} LIMIT 1")
+    if df is None or df.empty:
+        return None
+    return df["timestamp"][0].to_pydatetime().replace(tzinfo=timezone.utc)
+
+
+def max_timestamp() -> datetime | None:
+    df = _query("max(timestamp) AS ts", None, None, None, None)
+    if df is None or pd.isna(df["ts"][0]):
+        return None
+    return df["ts"][0].to_pydatetime().replace(tzinfo=timezone.utc)
@@ -0,0 +1,152 @@
+"""
+Write-behind local mirror of ingested messages.
+
+Requests only enqueue rows; a single background task owns the output
+file, so concurrent requests can never interleave partial lines. Rows are
+flushed in batches (MIRROR_FLUSH_ROWS or MIRROR_FLUSH_SECONDS, whichever
+comes first), fsynced, and files rotate daily or at MIRROR_ROTATE_BYTES:
+
+    data/messages_mirror-20241101-000.csv[.gz] | .ndjson[.gz] | -<ns>.parquet
+
+`stop()` drains the queue and fsyncs before shutdown completes.
+"""
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+from loguru import logger
+
+from ..config import settings
+from .local_store import COLUMNS
+
+FORMATS = ("csv", "csv.gz", "ndjson", "ndjson.gz", "parquet")
+_STOP = object()
+
+
+class MirrorWriter:
+    def __init__(
+        self,
+        path: str,
+        fmt: str = "csv",
+        flush_rows: int = 500,
+        flush_seconds: float = 2.0,
+        rotate_bytes: int = 64 * 1024 * 1024,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"MIRROR_FORMAT must be one of {FORMATS}")
+        base = Path(path)
+        self.dir, self.stem = base.parent, base.name.split(".")[0]
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = rotate_bytes
+        self.queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._day, self._seq = None, 0
+        self.rows_written = 0
+
+    # ── lifecycle ─────────────────────────────────────────────────────────
+    async def start(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self.queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+    def enqueue(self, rows: List[dict]):
+        if self.queue is None:   # writer not started (scripts, tests) – write through
+            self._write(rows)
+            return
+        for r in rows:
+            self.queue.put_nowait(r)
+
+    # ── background loop ───────────────────────────────────────────────────
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            while len(batch) < self.flush_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Mirror flush of {len(batch)} rows failed: {e}")
+
+    # ── file handling ─────────────────────────────────────────────────────
+    def _current_path(self) -> Path:
+        day = datetime.utcnow().strftime("%Y%m%d")
+        if day != self._day:
+            self._day, self._seq = day, 0
+        while True:
+            path = self.dir / f"{self.stem}-{day}-{self._seq:03d}.{self.fmt}"
+            if not path.exists() or path.stat().st_size < self.rotate_bytes:
+                return path
+            self._seq += 1
+
+    def _write(self, rows: List[dict]):
+        if not rows:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        if self.fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # one immutable part per flush – a crash can never leave a footer-less file
+            path = self.dir / f"{self.stem}-{time.time_ns()}.parquet"
+            pq.write_table(pa.Table.from_pylist(rows), path, compression="zstd")
+            self.rows_written += len(rows)
+            return
+
+        path = self._current_path()
+        new_file = not path.exists() or path.stat().st_size == 0
+        buf = io.StringIO()
+        if self.fmt.startswith("csv"):
+            w = csv.DictWriter(buf, fieldnames=COLUMNS, extrasaction="ignore")
+            if new_file:
+                w.writeheader()
+            w.writerows(rows)
+        else:
+            buf.writelines(json.dumps(r, default=str) + "\n" for r in rows)
+
+        data = buf.getvalue().encode("utf-8")
+        if self.fmt.endswith(".gz"):
+            data = gzip.compress(data)   # concatenated gzip members are a valid stream
+        with path.open("ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self.rows_written += len(rows)
+
+
+mirror = MirrorWriter(
+    settings.MIRROR_PATH,
+    settings.MIRROR_FORMAT,
+    settings.MIRROR_FLUSH_ROWS,
+    settings.MIRROR_FLUSH_SECONDS,
+    settings.MIRROR_ROTATE_BYTES,
+)
@@ -0,0 +1,231 @@
+"""
+Local registry of classifier versions with zero-downtime hot swap.
+
+    models/registry/
+        manifest.json   {"versions": {"<id>": {"created_at", "source", "notes"}}}
+        ACTIVE          id of the version serving traffic
+        <id>/           save_pretrained() output
+
+`scripts/register_model.py` copies a trained model directory in; the id
+defaults to its content hash, which is what `model_version()` has always
+stamped, so registering the current model does not make rows look stale.
+
+`ModelSlot.activate()` loads a version in a background thread, warms it
+with a sample batch, swaps it in atomically and then waits for calls still
+running on the old model before letting it go. Other processes sharing the
+registry notice the new ACTIVE pointer within MODEL_REGISTRY_POLL_SECONDS
+and swap the same way. Without an ACTIVE pointer the slot loads its
+fallback directory (bert_classifier.MODEL_DIR) as before.
+"""
+import gc
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+from loguru import logger
+
+from ..config import settings
+
+
+# ── registry on disk ──────────────────────────────────────────────────────
+def _root() -> Path:
+    return Path(settings.MODEL_REGISTRY_DIR)
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text)
+    tmp.replace(path)
+
+
+@lru_cache(maxsize=32)
+def content_hash(*dirs: str) -> str:
+    """sha256[:12] over the relative paths and bytes of every file in `dirs`."""
+    h = hashlib.sha256()
+    for d in dirs:
+        for root, _, files in sorted(os.walk(d)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                h.update(os.path.relpath(path, d).encode())
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        h.update(block)
+    return h.hexdigest()[:12]
+
+
+def manifest() -> Dict[str, Any]:
+    path = _root() / "manifest.json"
+    return json.loads(path.read_text()) if path.exists() else {"versions": {}}
+
+
+def version_path(version: str) -> Path:
+    if version not in manifest()["versions"]:
+        raise KeyError(f"Unknown model version {version!r}")
+    return _root() / version
+
+
+def register(src: str | Path, version: str | None = None, notes: str | None = None) -> str:
+    """Copy a model directory into the registry; returns its version id."""
+    version = version or content_hash(str(src))
+    dest = _root() / version
+    if dest.exists():
+        raise FileExistsError(f"Version {version} is already registered")
+    _root().mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{version}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    shutil.copytree(src, tmp)
+    tmp.rename(dest)
+    m = manifest()
+    m["versions"][version] = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": str(src),
+        "notes": notes,
+    }
+    _write_atomic(_root() / "manifest.json", json.dumps(m, indent=2))
+    return version
+
+
+def active_version() -> str | None:
+    path = _root() / "ACTIVE"
+    return path.read_text().strip() or None if path.exists() else None
+
+
+def set_active(version: str):
+    version_path(version)
+    _write_atomic(_root() / "ACTIVE", version)
+
+
+# ── hot-swappable model ───────────────────────────────────────────────────
+class _Loaded:
+    __slots__ = ("version", "path", "model", "in_flight")
+
+    def __init__(self, version: str, path: str, model: Any):
+        self.version, self.path, self.model = version, path, model
+        self.in_flight = 0
+
+
+class ModelSlot:
+    """The active model plus the machinery to replace it without a cold start."""
+
+    def __init__(self, loader: Callable[[str], Any], warmup: Callable[[Any], None],
+                 fallback: Callable[[], Tuple[str, str]]):
+        self.loader, self.warmup, self.fallback = loader, warmup, fallback
+        self._current: _Loaded | None = None
+        self._cond = threading.Condition()
+        self._first_load = threading.Lock()
+        self._checked = time.monotonic()
+        self.loading: str | None = None
+        self.previous: str | None = None
+        self.last_error: str | None = None
+        self.swapped_at: str | None = None
+        self.warmup_ms: float | None = None
+
+    def _initial(self) -> Tuple[str, str]:
+        v = active_version()
+        return (v, str(version_path(v))) if v else self.fallback()
+
+    def version(self) -> str:
+        """Version that serves (or will serve, once loaded) the next call."""
+        cur = self._current
+        return cur.version if cur else self._initial()[0]
+
+    def path(self) -> str:
+        cur = self._current
+        return cur.path if cur else self._initial()[1]
+
+    def current(self) -> _Loaded:
+        if self._current is None:
+            with self._first_load:   # the first call loads synchronously, as lru_cache did
+                if self._current is None:
+                    version, path = self._initial()
+                    self._current = _Loaded(version, path, self.loader(path))
+        self._follow_pointer()
+        return self._current
+
+    @contextmanager
+    def use(self):
+        """Yield the active model, counted as in flight until the block exits."""
+        self.current()
+        with self._cond:
+            cur = self._current
+            cur.in_flight += 1
+        try:
+            yield cur.model
+        finally:
+            with self._cond:
+                cur.in_flight -= 1
+                if not cur.in_flight:
+                    self._cond.notify_all()
+
+    def activate(self, version: str) -> bool:
+        """Start a background swap to `version`; False if a swap is already running."""
+        version_path(version)
+        with self._cond:
+            if self.loading:
+                return False
+            self.loading = version
+        threading.Thread(target=self._swap, args=(version,), daemon=True, name=f"model-swap-{version}").start()
+        return True
+
+    def _swap(self, version: str):
+        try:
+            path = str(version_path(version))
+            t0 = time.perf_counter()
+            model = self.loader(path)
+            t1 = time.perf_counter()
+            self.warmup(model)
+            self.warmup_ms = round((time.perf_counter() - t1) * 1000, 1)
+            with self._cond:
+                old, self._current = self._current, _Loaded(version, path, model)
+            if active_version() != version:
+                set_active(version)
+            self.swapped_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            self.last_error = None
+            logger.info(f"Classifier {version} active (load {t1 - t0:.1f}s, warm-up {self.warmup_ms}ms)")
+            if old is not None:
+                self.previous = old.version
+                with self._cond:
+                    drained = self._cond.wait_for(lambda: not old.in_flight, timeout=settings.MODEL_DRAIN_SECONDS)
+                if not drained:
+                    logger.warning(f"Released {old.version} with {old.in_flight} call(s) still running")
+                old = None
+                gc.collect()
+        except Exception as e:
+            self.last_error = f"{version}: {e}"
+            logger.exception(f"Swapping to classifier {version} failed")
+        finally:
+            self.loading = None
+
+    def _follow_pointer(self):
+        """Pick up an ACTIVE pointer changed by another process."""
+        now = time.monotonic()
+        if now - self._checked < settings.MODEL_REGISTRY_POLL_SECONDS:
+            return
+        self._checked = now
+        try:
+            v = active_version()
+            if v and v != self._current.version and not self.loading and not (self.last_error or "").startswith(f"{v}:"):
+                self.activate(v)
+        except Exception as e:
+            logger.warning(f"Model registry check failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        cur = self._current
+        return {
+            "active": cur.version if cur else None,
+            "path": cur.path if cur else None,
+            "in_flight": cur.in_flight if cur else 0,
+            "loading": self.loading,
+            "previous": self.previous,
+            "swapped_at": self.swapped_at,
+            "warmup_ms": self.warmup_ms,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,245 @@
+"""
+Shared DistilBERT inference process for multi-worker deployments.
+
+One process loads the model and serves every uvicorn worker over a Unix
+socket, so the weights are in memory once and torch threads are sized for
+the whole machine instead of fighting per worker:
+
+    MODEL_SERVER_SOCKET=/tmp/model.sock python -m app.services.model_server &
+    MODEL_SERVER_SOCKET=/tmp/model.sock uvicorn app.main:app --workers 4
+
+With MODEL_SERVER_SOCKET set, `bert_classifier` sends its DistilBERT work
+(logits, multi-label, embeddings, model_version, hot swaps) here instead
+of loading the model. Concurrent requests for the same op are merged into one forward
+pass: a batch closes after MODEL_SERVER_MAX_WAIT_MS or MODEL_SERVER_MAX_BATCH
+texts, whichever comes first. Forward passes run one at a time on a single
+thread that owns all intra-op threads.
+
+Frames (both directions): 8-byte header `!II` (json length, body length),
+a JSON object, then the raw bytes of the arrays it describes.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ..config import settings
+
+_FRAME = struct.Struct("!II")
+
+
+def _pack(header: Dict[str, Any], arrays: Sequence[np.ndarray] = ()) -> bytes:
+    header = {**header, "arrays": [{"shape": a.shape, "dtype": a.dtype.str} for a in arrays]}
+    head = json.dumps(header).encode()
+    body = b"".join(np.ascontiguousarray(a).tobytes() for a in arrays)
+    return _FRAME.pack(len(head), len(body)) + head + body
+
+
+def _unpack(head: bytes, body: bytes) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+    header = json.loads(head)
+    arrays, offset = [], 0
+    for meta in header.pop("arrays", []):
+        dtype = np.dtype(meta["dtype"])
+        n = int(np.prod(meta["shape"])) * dtype.itemsize
+        arrays.append(np.frombuffer(body, dtype, offset=offset, count=n // dtype.itemsize).reshape(meta["shape"]))
+        offset += n
+    return header, arrays
+
+
+# ── client (used by bert_classifier) ──────────────────────────────────────
+class ModelClient:
+    """Blocking client; one persistent connection per calling thread."""
+
+    def __init__(self, path: str, connect_timeout: float = 30.0):
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Model server not reachable at {self.path}")
+                time.sleep(0.2)   # server still starting
+
+    @staticmethod
+    def _read(sock: socket.socket, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("Model server closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def call(self, op: str, texts: List[str] | None = None, **args) -> Tuple[Dict[str, Any], List[np.ndarray]]:
+        frame = _pack({"op": op, "texts": texts or [], **args})
+        for attempt in range(2):   # one reconnect, e.g. after a server restart
+            sock = getattr(self._local, "sock", None) or self._connect()
+            self._local.sock = sock
+            try:
+                sock.sendall(frame)
+                head_len, body_len = _FRAME.unpack(self._read(sock, _FRAME.size))
+                header, arrays = _unpack(self._read(sock, head_len), self._read(sock, body_len))
+                break
+            except (ConnectionError, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt:
+                    raise
+        if header.get("error"):
+            raise RuntimeError(f"Model server: {header['error']}")
+        return header, arrays
+
+
+@lru_cache()
+def model_client() -> ModelClient:
+    return ModelClient(settings.MODEL_SERVER_SOCKET)
+
+
+# ── server ────────────────────────────────────────────────────────────────
+class _Batcher:
+    """Queues requests for one op and runs them as merged forward passes."""
+
+    def __init__(self, op: str, fn: Callable[[List[str]], Tuple[np.ndarray, ...]], executor: ThreadPoolExecutor):
+        self.op, self.fn, self.executor = op, fn, executor
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.max_batch = settings.MODEL_SERVER_MAX_BATCH
+        self.max_wait = settings.MODEL_SERVER_MAX_WAIT_MS / 1000
+
+    async def submit(self, texts: List[str]) -> Tuple[np.ndarray, ...]:
+        if not texts:
+            # zero rows of every output, shaped by the model (a merged empty batch has no arrays)
+            return tuple(a[:0] for a in await self.submit([""]))
+        fut = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, fut))
+        return await fut
+
+    def _run_batch(self, texts: List[str]) -> Tuple[np.ndarray, ...]:
+        from ..telemetry import observe_size, span
+        observe_size("batch", len(texts), f"model_server.{self.op}")
+        with span(f"model_server.{self.op}"):
+            parts = [self.fn(texts[i:i + self.max_batch]) for i in range(0, len(texts), self.max_batch)]
+        return tuple(np.concatenate(cols) for cols in zip(*parts))
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            n = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n += len(item[0])
+            texts = [t for ts, _ in items for t in ts]
+            try:
+                out = await loop.run_in_executor(self.executor, self._run_batch, texts)
+            except Exception as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+            i = 0
+            for ts, fut in items:
+                fut.set_result(tuple(a[i:i + len(ts)] for a in out))
+                i += len(ts)
+
+
+def _ops() -> Dict[str, Callable[[List[str]], Tuple[np.ndarray, ...]]]:
+    from . import bert_classifier as bc
+    return {
+        "logits": lambda texts: (bc._bert_logits_local(texts).numpy().astype(np.float32),),
+        "embed": lambda texts: (bc._embed_local(texts, batch_size=len(texts)).astype(np.float32),),
+        "multi": lambda texts: tuple(t.numpy() for t in bc._multi_hits_local(texts)),
+    }
+
+
+async def serve(path: str):
+    import torch
+    from . import bert_classifier as bc
+
+    threads = bc.torch_threads(workers=1)
+    bc.configure_threads(workers=1)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass   # already fixed by an earlier parallel op
+    bc._load()
+    if settings.MULTI_LABEL:
+        bc._load_multi()
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+    batchers = {op: _Batcher(op, fn, executor) for op, fn in _ops().items()}
+    tasks = [asyncio.create_task(b.run()) for b in batchers.values()]
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head_len, body_len = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+                req, _ = _unpack(await reader.readexactly(head_len), await reader.readexactly(body_len))
+                op = req.get("op")
+                try:
+                    if op == "version":
+                        frame = _pack({"version": bc._model_version_local()})
+                    elif op == "activate":
+                        frame = _pack({"started": bc.classifier.activate(req["version"])})
+                    elif op == "status":
+                        frame = _pack({"status": bc.classifier.status()})
+                    elif op in batchers:
+                        frame = _pack({}, await batchers[op].submit(req["texts"]))
+                    else:
+                        frame = _pack({"error": f"unknown op {op!r}"})
+                except Exception as e:
+                    logger.exception(f"Model server {op} failed")
+                    frame = _pack({"error": str(e)})
+                writer.write(frame)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)   # stale socket from a previous run
+    server = await asyncio.start_unix_server(handle, path=path)
+    logger.info(f"Model server {bc._model_version_local()} on {path}: {threads} torch threads, "
+                f"batches ≤{settings.MODEL_SERVER_MAX_BATCH} / {settings.MODEL_SERVER_MAX_WAIT_MS}ms; "
+                f"suggest uvicorn --workers {os.cpu_count()}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for t in tasks:
+            t.cancel()
+        executor.shutdown(wait=False)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--socket", default=settings.MODEL_SERVER_SOCKET or "/tmp/model.sock")
+    args = p.parse_args()
+    asyncio.run(serve(args.socket))
@@ -5,6 +5,7 @@ from openai import OpenAI
 from loguru import logger
 
 from ..config import settings
+from ..telemetry import timed
 
 
 class OpenAIService:
@@ -13,6 +14,7 @@ class OpenAIService:
             raise RuntimeError("OPENAI_API_KEY missing")
         self.client = OpenAI(api_key=api_key)
 
+    @timed("llm.openai")
     async def chat(
         self,
         prompt: str,
@@ -0,0 +1,359 @@
+"""
+Inverted index over the local analytics store for GET /messages/search.
+
+One segment per Parquet part of `local_store` (plus one for its ingest
+buffer), saved next to the part it covers:
+
+    data/search_index/month=2024-11/part-<ns>.npz
+
+A segment holds positional postings – for every term the (row, position)
+pairs of its occurrences, sorted – and per-row timestamp, category, source
+and length for filtering and BM25. Parts written by ingest or
+`scripts/sync_local_store.py` are indexed on the next search, segments of
+parts removed by compaction are dropped, and months outside the date
+filter are skipped. Ids and text are read back from the Parquet part only
+for the rows on the returned page.
+
+A reclassified row is appended again, so one id can sit in several parts.
+As in `local_store` reads the copy in the last part by name wins and the
+ingest buffer beats every part; the older copies are left out of results,
+totals and the BM25 statistics.
+
+Queries use the websearch syntax Postgres' websearch_to_tsquery accepts,
+so both backends answer the same question:
+
+    piggy bank          rows with both words
+    "piggy bank"        the phrase
+    deposit -bonus      with deposit, without bonus
+
+With `partial`, each word matches every indexed word containing it
+(piggy → piggybank), like the trigram ILIKE path in Postgres.
+"""
+import base64
+import bisect
+import json
+import re
+import threading
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ..config import settings
+from ..ml.labels import LABELS
+from . import local_store
+
+SOURCES = ("livechat", "telegram")
+RESULT_COLUMNS = ("id", "id_user", "timestamp", "source", "message", "category")
+BUFFER = "~buffer"          # sorts after every month=… part
+K1, B = 1.2, 0.75           # BM25
+
+_TOKEN = re.compile(r"\w+")
+_PHRASE = re.compile(r'"([^"]*)"')
+_EMPTY = np.empty(0, dtype=np.int32)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def parse_query(q: str) -> Tuple[List[str], List[List[str]], List[str]]:
+    """(words, phrases, excluded words) of a websearch-style query."""
+    words, phrases, excluded = [], [], []
+    for m in _PHRASE.finditer(q):
+        tokens = tokenize(m.group(1))
+        if len(tokens) > 1:
+            phrases.append(tokens)
+        else:
+            words.extend(tokens)
+    for part in _PHRASE.sub(" ", q).split():
+        if part.startswith("-"):
+            excluded.extend(tokenize(part))
+        else:
+            words.extend(tokenize(part))
+    if not words and not phrases:
+        raise ValueError("The query needs at least one word to search for")
+    return list(dict.fromkeys(words)), phrases, excluded
+
+
+def _counts(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """np.unique(rows, return_counts=True) for an already sorted array."""
+    if not len(rows):
+        return rows, rows
+    starts = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+    return rows[starts], np.diff(np.append(starts, len(rows)))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(",", ":")).encode()).decode()
+
+
+def decode_cursor(cursor: str | None, length: int) -> List[Any] | None:
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def snippet(text: str, terms: Sequence[str], partial: bool = False, words: int = 30) -> str:
+    """Up to `words` words around the first match, matches wrapped in ** (ts_headline style)."""
+    tokens = list(_TOKEN.finditer(text))
+    hit = [any(t in m.group().lower() for t in terms) if partial else m.group().lower() in terms
+           for m in tokens]
+    first = hit.index(True) if True in hit else 0
+    lo = max(0, min(first - words // 3, len(tokens) - words))
+    window = range(lo, min(len(tokens), lo + words))
+    if not window:
+        return text
+    out, pos = [], tokens[window[0]].start()
+    for i in window:
+        m = tokens[i]
+        out.append(text[pos:m.start()])
+        out.append(f"**{m.group()}**" if hit[i] else m.group())
+        pos = m.end()
+    end = tokens[window[-1]].end() if window[-1] + 1 < len(tokens) else len(text)
+    out.append(text[pos:end])
+    return ("… " if lo else "") + "".join(out) + (" …" if window[-1] + 1 < len(tokens) else "")
+
+
+# ── segments ──────────────────────────────────────────────────────────────
+class Segment:
+    """Positional postings plus filter columns for one batch of rows."""
+
+    def __init__(self, name: str, arrays: Dict[str, np.ndarray], frame: pd.DataFrame | None = None):
+        self.name = name
+        self.month = name.split("/")[0].removeprefix("month=") if name != BUFFER else None
+        self.vocab = arrays["vocab"]
+        self.terms = {t: i for i, t in enumerate(self.vocab.tolist())}
+        self.offsets, self.rows, self.pos = arrays["offsets"], arrays["rows"], arrays["pos"]
+        self.ts, self.cat, self.src, self.length = arrays["ts"], arrays["cat"], arrays["src"], arrays["length"]
+        self.ids = arrays.get("ids")   # None for segments saved before ids were kept
+        self.live: np.ndarray | None = None   # rows not superseded by a newer copy (None: all of them)
+        self.frame = frame   # the buffer segment keeps its rows; parts are read back from Parquet
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @classmethod
+    def build(cls, name: str, df: pd.DataFrame, keep_frame: bool = False) -> "Segment":
+        tokens = df["message"].fillna("").astype(str).str.lower().str.findall(_TOKEN.pattern)
+        length = tokens.str.len().to_numpy(np.int32)
+        codes, vocab = pd.factorize(pd.Series(list(chain.from_iterable(tokens)), dtype=object))
+        rows = np.repeat(np.arange(len(df), dtype=np.int32), length)
+        pos = (np.arange(len(rows)) - np.repeat(np.cumsum(length) - length, length)).astype(np.int32)
+        order = np.argsort(codes, kind="stable")   # rows and positions are already ascending
+        ts = pd.to_datetime(df["timestamp"], utc=True).dt.tz_localize(None)
+        arrays = {
+            "vocab": np.asarray(vocab, dtype=str),
+            "offsets": np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(vocab)))]).astype(np.int64),
+            "rows": rows[order],
+            "pos": pos[order],
+            "ts": ts.astype("datetime64[ns]").to_numpy().view(np.int64),
+            "cat": df["category"].map({c: i for i, c in enumerate(LABELS)}).fillna(-1).to_numpy(np.int8),
+            "src": df["source"].map({s: i for i, s in enumerate(SOURCES)}).fillna(-1).to_numpy(np.int8),
+            "length": length,
+            "ids": np.asarray(df["id"].astype(object).where(df["id"].notna(), "").astype(str), dtype=str),
+        }
+        return cls(name, arrays, df.reset_index(drop=True) if keep_frame else None)
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp, vocab=self.vocab, offsets=self.offsets, rows=self.rows, pos=self.pos,
+                 ts=self.ts, cat=self.cat, src=self.src, length=self.length, ids=self.ids)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, name: str, path: Path) -> "Segment":
+        with np.load(path) as z:
+            return cls(name, dict(z))
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        i = self.terms.get(term)
+        if i is None:
+            return _EMPTY, _EMPTY
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return self.rows[a:b], self.pos[a:b]
+
+    def occurrences(self, unit: List[str], partial: bool) -> np.ndarray:
+        """Sorted row of every occurrence of a word (one token) or phrase."""
+        if len(unit) == 1:
+            if not partial:
+                return self.postings(unit[0])[0]
+            found = self.vocab[np.char.find(self.vocab, unit[0]) >= 0] if len(self.vocab) else []
+            return np.sort(np.concatenate([_EMPTY] + [self.postings(t)[0] for t in found]))
+        rows, pos = self.postings(unit[0])
+        keys = (rows.astype(np.int64) << 32) | pos
+        for k, term in enumerate(unit[1:], 1):
+            r, p = self.postings(term)
+            nxt = (r.astype(np.int64) << 32) | p          # sorted, like keys
+            if not len(nxt):
+                return _EMPTY
+            at = np.minimum(np.searchsorted(nxt, keys + k), len(nxt) - 1)
+            keys = keys[nxt[at] == keys + k]
+        return (keys >> 32).astype(np.int32)
+
+    def mask(self, category: str | None, source: str | None, start: int | None, end: int | None) -> np.ndarray | None:
+        """Rows passing the filters (None when nothing is filtered)."""
+        m = None
+        if category:
+            codes = [LABELS.index(c) for c in category.split(",") if c in LABELS]
+            m = np.isin(self.cat, codes)
+        if source:
+            m = (self.src == (SOURCES.index(source) if source in SOURCES else -2)) & (True if m is None else m)
+        if start is not None:
+            m = (self.ts >= start) & (True if m is None else m)
+        if end is not None:
+            m = (self.ts <= end) & (True if m is None else m)
+        return m
+
+    def read(self, rows: List[int], path: Path | None) -> pd.DataFrame:
+        if self.frame is not None:
+            return self.frame.iloc[rows][list(RESULT_COLUMNS)].reset_index(drop=True)
+        return local_store.take(path, rows, ", ".join(RESULT_COLUMNS))
+
+
+def _supersede(segments: List[Segment]):
+    """Set `live` on each segment: rows whose id does not come again later on."""
+    ids = pd.Series(np.concatenate([s.ids for s in segments]))
+    stale = (ids.duplicated(keep="last") & (ids != "")).to_numpy()
+    for seg, m in zip(segments, np.split(stale, np.cumsum([len(s) for s in segments])[:-1])):
+        seg.live = ~m if m.any() else None
+
+
+# ── the index ─────────────────────────────────────────────────────────────
+class SearchIndex:
+    def __init__(self):
+        self._segments: Dict[str, Segment] = {}
+        self._buffer: Segment | None = None
+        self._buffer_gen: int | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _root() -> Path:
+        return Path(settings.SEARCH_INDEX_DIR)
+
+    def refresh(self) -> List[Segment]:
+        """Index new parts (and the ingest buffer), drop compacted ones; segments by name."""
+        store = Path(settings.LOCAL_STORE_DIR)
+        parts = {p.relative_to(store).as_posix(): p for p in local_store.part_files()}
+        with self._lock:
+            changed = False
+            for name in set(self._segments) - set(parts):
+                del self._segments[name]
+                (self._root() / name).with_suffix(".npz").unlink(missing_ok=True)
+                changed = True
+            for name in sorted(set(parts) - set(self._segments)):
+                changed = True
+                saved = (self._root() / name).with_suffix(".npz")
+                if saved.exists() and saved.stat().st_mtime >= parts[name].stat().st_mtime:
+                    seg = Segment.load(name, saved)
+                    if seg.ids is not None:
+                        self._segments[name] = seg
+                        continue
+                df = pd.read_parquet(parts[name], columns=["id", "timestamp", "source", "message", "category"])
+                seg = self._segments[name] = Segment.build(name, df)
+                seg.save(saved)
+            self._buffer_gen, buffered = local_store.buffered_frame(self._buffer_gen)
+            if buffered is not None:
+                self._buffer = Segment.build(BUFFER, buffered, keep_frame=True) if len(buffered) else None
+                changed = True
+            segments = [self._segments[n] for n in sorted(self._segments)]
+            segments += [self._buffer] if self._buffer is not None else []
+            if changed and segments:
+                _supersede(segments)
+            return segments
+
+    def search(self, q: str, category: str | None = None, source: str | None = None,
+               start=None, end=None, limit: int = 20, cursor: str | None = None,
+               partial: bool = False) -> Dict[str, Any]:
+        words, phrases, excluded = parse_query(q)
+        after = decode_cursor(cursor, 4)
+        units = [[w] for w in words] + phrases
+        start_ns = pd.Timestamp(local_store._utc_naive(start)).value if start else None
+        end_ns = pd.Timestamp(local_store._utc_naive(end)).value if end else None
+        segments = self.refresh()
+
+        # corpus statistics for BM25 come from every current row, filtered or not
+        live = [(s.live, len(s) if s.live is None else int(s.live.sum())) for s in segments]
+        n_docs = sum(n for _, n in live) or 1
+        avg_len = sum(int(s.length.sum() if m is None else s.length[m].sum())
+                      for s, (m, _) in zip(segments, live)) / n_docs
+        lo_month = start.strftime("%Y-%m") if start else None
+        hi_month = end.strftime("%Y-%m") if end else None
+        per_seg = []
+        doc_freq = np.zeros(len(units))
+        for seg, (m, _) in zip(segments, live):
+            uniq = [_counts(seg.occurrences(u, partial)) for u in units]
+            if m is not None:
+                uniq = [(u[m[u]], c[m[u]]) for u, c in uniq]
+            doc_freq += [len(u) for u, _ in uniq]
+            if seg.month and ((lo_month and seg.month < lo_month) or (hi_month and seg.month > hi_month)):
+                continue   # still counted for idf, like an unfiltered Postgres ts_rank would
+            per_seg.append((seg, uniq))
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+        names = [seg.name for seg, _ in per_seg]
+        found = []   # (score, ts, segment #, row) per matching row
+        for k, (seg, uniq) in enumerate(per_seg):
+            cand = uniq[0][0]
+            for u, _ in uniq[1:]:
+                cand = np.intersect1d(cand, u, assume_unique=True)
+            for word in excluded:
+                cand = np.setdiff1d(cand, seg.occurrences([word], partial), assume_unique=False)
+            m = seg.mask(category, source, start_ns, end_ns)
+            if m is not None:
+                cand = cand[m[cand]]
+            if not len(cand):
+                continue
+            norm = K1 * (1 - B + B * seg.length[cand] / avg_len)
+            score = np.zeros(len(cand))
+            for w, (u, counts) in zip(idf, uniq):
+                tf = counts[np.searchsorted(u, cand)]
+                score += w * tf * (K1 + 1) / (tf + norm)
+            found.append((score, seg.ts[cand], np.full(len(cand), k), cand))
+        if not found:
+            return {"total": 0, "results": [], "next_cursor": None}
+        score, ts, seg_no, rows = (np.concatenate(c) for c in zip(*found))
+        total = len(score)
+
+        # best first; ties newest first, then by position – the cursor is the last key served
+        if after is not None:
+            a_score, a_ts, a_name, a_row = after
+            at = bisect.bisect_left(names, a_name)
+            same = (seg_no == at) if at < len(names) and names[at] == a_name else np.zeros(total, bool)
+            later = seg_no >= bisect.bisect_right(names, a_name)
+            keep = (score < a_score) | (score == a_score) & (
+                (ts < a_ts) | (ts == a_ts) & (later | same & (rows > a_row)))
+            score, ts, seg_no, rows = score[keep], ts[keep], seg_no[keep], rows[keep]
+        order = np.lexsort((rows, seg_no, -ts, -score))[:limit + 1]
+        page = order[:limit]
+
+        results: List[Dict[str, Any] | None] = [None] * len(page)
+        store = Path(settings.LOCAL_STORE_DIR)
+        for k in np.unique(seg_no[page]):
+            seg = per_seg[k][0]
+            idx = np.flatnonzero(seg_no[page] == k)
+            for i, row in zip(idx, seg.read(rows[page[idx]].tolist(), store / seg.name).to_dict("records")):
+                results[i] = row
+        terms = words + [t for p in phrases for t in p]
+        for i, row in enumerate(results):
+            stamp = pd.Timestamp(row["timestamp"])
+            row["timestamp"] = (stamp.tz_localize("UTC") if stamp.tzinfo is None else stamp).isoformat()
+            row["id_user"] = int(row["id_user"]) if pd.notna(row["id_user"]) else None
+            row["score"] = round(float(score[page[i]]), 4)
+            row["snippet"] = snippet(row["message"] or "", terms, partial)
+        last = page[-1]
+        next_cursor = encode_cursor([float(score[last]), int(ts[last]), names[seg_no[last]], int(rows[last])]) \
+            if len(order) > limit else None
+        return {"total": total, "results": results, "next_cursor": next_cursor}
+
+
+search_index = SearchIndex()
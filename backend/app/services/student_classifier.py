@@ -0,0 +1,72 @@
+"""
+fastText-style student distilled from the DistilBERT classifier.
+
+Hashed word uni/bi-grams → mean EmbeddingBag → linear layer. Trained by
+`scripts/distill_classifier.py` and selected with CLASSIFIER_BACKEND=student.
+"""
+import json
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+import torch
+from torch import nn
+
+from ..config import settings
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def featurize(text: str, buckets: int) -> List[int]:
+    toks = _TOKEN_RE.findall(text.lower())
+    grams = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+    # bucket 0 doubles as the "empty message" feature
+    return [zlib.crc32(g.encode()) % buckets for g in grams] or [0]
+
+
+class FastTextClassifier(nn.Module):
+    def __init__(self, num_labels: int, buckets: int = 2 ** 18, dim: int = 64):
+        super().__init__()
+        self.buckets = buckets
+        self.dim = dim
+        self.embedding = nn.EmbeddingBag(buckets, dim, mode="mean")
+        self.fc = nn.Linear(dim, num_labels)
+
+    def encode(self, texts: List[str]):
+        ids, offsets = [], []
+        for t in texts:
+            offsets.append(len(ids))
+            ids.extend(featurize(t, self.buckets))
+        return torch.tensor(ids, dtype=torch.long), torch.tensor(offsets, dtype=torch.long)
+
+    def forward(self, ids: torch.Tensor, offsets: torch.Tensor) -> torch.Tensor:
+        return self.fc(self.embedding(ids, offsets))
+
+
+def save(model: FastTextClassifier, out_dir: str | Path, labels: List[str]):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), out / "student.pt")
+    (out / "config.json").write_text(json.dumps({
+        "labels": labels,
+        "buckets": model.buckets,
+        "dim": model.dim,
+    }, indent=2))
+
+
+@lru_cache()
+def _load():
+    path = Path(settings.STUDENT_MODEL_DIR)
+    cfg = json.loads((path / "config.json").read_text())
+    mdl = FastTextClassifier(len(cfg["labels"]), cfg["buckets"], cfg["dim"])
+    mdl.load_state_dict(torch.load(path / "student.pt", map_location="cpu"))
+    mdl.eval()
+    return cfg["labels"], mdl
+
+
+def logits(texts: List[str]) -> torch.Tensor:
+    _, mdl = _load()
+    with torch.no_grad():
+        return mdl(*mdl.encode(texts))
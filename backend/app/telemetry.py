@@ -0,0 +1,171 @@
+"""
+Hot-path instrumentation: stage spans, histograms and a Prometheus text endpoint.
+
+    with span("chat.fetch"):          # times a stage
+        ...
+    @timed("reports.fetch_messages")  # same, as a decorator (sync or async)
+    observe_size("rows", len(rows), stage="reports.fetch_messages")
+
+Every request is timed by the middleware; the stages it passed through are
+returned in a `Server-Timing` header, so a slow /chat shows its split in the
+browser's network tab. Aggregates are exposed at GET /metrics (Prometheus
+text format) – not to be confused with /api/v1/messages/metrics.
+
+With TELEMETRY_ENABLED=false `span()` returns a shared no-op context
+manager, `timed` returns the function unchanged and nothing is installed.
+"""
+import asyncio
+import contextlib
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from .config import settings
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+enabled = settings.TELEMETRY_ENABLED
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labelnames: Tuple[str, ...] = ()):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series: Dict[tuple, List] = {}   # labels → [bucket counts…, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, s in sorted(series.items()):
+            base = ",".join(f'{n}="{v}"' for n, v in zip(self.labelnames, key))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s[:-2]):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+            labels = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{labels} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{labels} {s[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency",
+                            LATENCY_BUCKETS, ("method", "endpoint", "status"))
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Time spent in instrumented stages",
+                          LATENCY_BUCKETS, ("stage",))
+SIZES = Histogram("stage_items", "Rows fetched / batch sizes per stage", SIZE_BUCKETS, ("metric", "stage"))
+
+_stages: ContextVar[Dict[str, float] | None] = ContextVar("telemetry_stages", default=None)
+
+
+# ── span API ──────────────────────────────────────────────────────────────
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        STAGE_SECONDS.observe(dt, stage=self.name)
+        acc = _stages.get()
+        if acc is not None:
+            acc[self.name] = acc.get(self.name, 0.0) + dt
+        return False
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def span(name: str):
+    return _Span(name) if enabled else _NOOP
+
+
+def timed(name: str):
+    def decorate(fn):
+        if not enabled:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with _Span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_size(metric: str, n: int, stage: str):
+    """Record a size (rows fetched, batch size, …) for a stage."""
+    if enabled:
+        SIZES.observe(n, metric=metric, stage=stage)
+
+
+def render() -> str:
+    lines = []
+    for h in (REQUEST_SECONDS, STAGE_SECONDS, SIZES):
+        lines.extend(h.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── FastAPI wiring ────────────────────────────────────────────────────────
+def install(app: FastAPI):
+    """Timing middleware + GET /metrics. Call before mounting the static files."""
+    if not enabled:
+        return
+
+    @app.middleware("http")
+    async def time_requests(request: Request, call_next):
+        acc: Dict[str, float] = {}
+        token = _stages.set(acc)
+        t0 = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _stages.reset(token)
+        dt = time.perf_counter() - t0
+        # labelled by endpoint name: route.path is router-relative for included routers;
+        # unmatched paths (static files, 404s) share one label to bound cardinality
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(dt, method=request.method,
+                                endpoint=getattr(route, "name", "other"), status=response.status_code)
+        if acc:
+            response.headers["Server-Timing"] = ", ".join(
+                f"{name.replace('.', '-')};dur={v * 1000:.1f}" for name, v in acc.items()
+            ) + f", total;dur={dt * 1000:.1f}"
+        return response
+
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1 @@
+"""Offline benchmarks: in-memory Supabase + fake LLM, no network needed."""
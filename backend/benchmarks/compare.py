@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Compare two benchmark result files; exit 1 if any case regressed.
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def main(base: Path, new: Path, threshold: float, metric: str) -> int:
+    a, b = json.loads(base.read_text()), json.loads(new.read_text())
+    for side, data in (("base", a), ("new", b)):
+        m = data["meta"]
+        print(f"{side:>4}: {m['commit']}  {m['date']}  model={m['model']}  llm={m['llm_latency_s']}s")
+    print(f"\n{'case':<36} {'base':>10} {'new':>10} {'change':>8}")
+
+    regressions = 0
+    for case in sorted(set(a["results"]) | set(b["results"])):
+        ra, rb = a["results"].get(case), b["results"].get(case)
+        if ra is None or rb is None:
+            print(f"{case:<36} {'-' if ra is None else ra[metric]:>10} {'-' if rb is None else rb[metric]:>10}")
+            continue
+        change = (rb[metric] - ra[metric]) / ra[metric] if ra[metric] else 0.0
+        flag = ""
+        if change > threshold:
+            flag, regressions = "  ▲ regression", regressions + 1
+        elif change < -threshold:
+            flag = "  ▼ faster"
+        print(f"{case:<36} {ra[metric]:>10.2f} {rb[metric]:>10.2f} {change:>+8.1%}{flag}")
+
+    print(f"\n{regressions} regression(s) above {threshold:.0%} on {metric}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("base", type=Path)
+    p.add_argument("new", type=Path)
+    p.add_argument("--threshold", type=float, default=0.10, help="relative slow-down that counts as a regression")
+    p.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "mean_ms", "max_ms"])
+    args = p.parse_args()
+    sys.exit(main(args.base, args.new, args.threshold, args.metric))
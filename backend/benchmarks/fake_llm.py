@@ -0,0 +1,56 @@
+"""Deterministic LLMServiceProtocol stand-in with configurable latency."""
+import asyncio
+import json
+import random
+import re
+from typing import List
+
+from app.api.v1.endpoints.chatbot import _regex_parse, _top_request
+
+_QUOTED = re.compile(r'"([^"]*)"')
+_VS = re.compile(r"\s+vs\.?\s+", re.I)
+
+
+def _filters(text: str) -> dict:
+    category, source, days = _regex_parse(text)
+    return {k: v for k, v in {"category": category, "source": source, "days_back": days}.items() if v}
+
+
+class FakeLLMService:
+    """Answers instantly after `latency` (± `jitter`) seconds; same input → same output.
+
+    Tool calls come back in the OpenAI shape (`{"tool_call": {"function": {...}}}`),
+    which is what production returns. A question with " vs " gets one filter set
+    per side; "top users" / "most repeated phrases" questions call the second
+    tool (top_contacts) when it is offered.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, seed: int = 0):
+        self.latency, self.jitter = latency, jitter
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    async def chat(self, prompt: str, history: List[str] | None = None, tools: list[dict] | None = None):
+        self.calls += 1
+        delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        await asyncio.sleep(max(0.0, delay))
+        if tools:
+            m = _QUOTED.search(prompt)
+            question = m.group(1) if m else prompt
+            top = _top_request(question)
+            sides = _VS.split(question)
+            sets = [_filters(side) for side in sides]
+            if top is not None and len(tools) > 1:
+                tool, args = tools[1], top
+            elif len(sets) > 1:
+                # the window and channel are usually said once, after the last side
+                shared = {k: v for k, v in sets[-1].items() if k != "category"}
+                tool, args = tools[0], {"filter_sets": [{**s, **shared, "label": side.strip()}
+                                                        for side, s in zip(sides, sets)]}
+            else:
+                tool, args = tools[0], sets[0]
+            return {"tool_call": {
+                "id": f"call_{self.calls}", "type": "function",
+                "function": {"name": tool["name"], "arguments": json.dumps(args)},
+            }}
+        return f"Deterministic answer #{len(prompt) % 97} for a {len(prompt)}-char prompt."
@@ -0,0 +1,225 @@
+"""
+In-memory stand-in for the supabase-py client.
+
+Implements the PostgREST query-builder calls the app makes (reports.py,
+crud.py, the endpoints and scripts): select / insert / update with eq,
+in_, gt, gte, lte, is_, not_.in_, the keyset `or_` used by
+iter_supabase_messages, order, limit, and the `message_dimensions` /
+`count_messages` RPCs. Rows live in a pandas DataFrame kept in
+(timestamp, id) order; results come back as lists of JSON-ish dicts the
+way PostgREST returns them, so decoding cost stays part of the picture.
+"""
+import re
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any, Callable, List
+
+import numpy as np
+import pandas as pd
+
+_KEYSET = re.compile(r'^timestamp\.gt\."([^"]+)",and\(timestamp\.eq\."([^"]+)",id\.gt\.([^)]+)\)$')
+
+
+def _utc(value) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+class _Store:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        self.df["_ts"] = pd.to_datetime(self.df["timestamp"], utc=True, format="ISO8601")
+        self.pending: List[dict] = []   # inserts are merged lazily, like a WAL
+
+    def frame(self) -> pd.DataFrame:
+        if self.pending:
+            new = pd.DataFrame(self.pending)
+            new["_ts"] = pd.to_datetime(new["timestamp"], utc=True, format="ISO8601")
+            self.df = pd.concat([self.df, new], ignore_index=True).sort_values(["_ts", "id"], ignore_index=True)
+            self.pending = []
+        return self.df
+
+
+class _Not:
+    def __init__(self, query: "Query"):
+        self._q = query
+
+    def in_(self, column: str, values):
+        values = list(values)
+        return self._q._filter(lambda df: df[column].notna() & ~df[column].isin(values))
+
+
+class Query:
+    def __init__(self, store: _Store):
+        self._store = store
+        self._op, self._payload, self._columns = "select", None, "*"
+        self._filters: List[Callable[[pd.DataFrame], pd.Series]] = []
+        self._order: List[str] = []
+        self._descending: List[bool] = []
+        self._limit: int | None = None
+        self._after: tuple | None = None   # keyset cursor (timestamp, id)
+
+    # ── operations ────────────────────────────────────────────────────────
+    def select(self, columns: str = "*"):
+        self._columns = columns
+        return self
+
+    def insert(self, rows):
+        self._op, self._payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: dict):
+        self._op, self._payload = "update", values
+        return self
+
+    # ── filters ───────────────────────────────────────────────────────────
+    def _filter(self, fn):
+        self._filters.append(fn)
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter(lambda df: df[column] == value)
+
+    def in_(self, column: str, values):
+        values = list(values)
+        return self._filter(lambda df: df[column].isin(values))
+
+    def gte(self, column: str, value):
+        if column == "timestamp":
+            return self._filter(lambda df: df["_ts"] >= _utc(value))
+        return self._filter(lambda df: df[column] >= value)
+
+    def gt(self, column: str, value):
+        if column == "timestamp":
+            return self._filter(lambda df: df["_ts"] > _utc(value))
+        if column == "created_at":
+            return self._filter(lambda df: pd.to_datetime(df[column], utc=True, format="ISO8601") > _utc(value))
+        return self._filter(lambda df: df[column] > value)
+
+    def lte(self, column: str, value):
+        if column == "timestamp":
+            return self._filter(lambda df: df["_ts"] <= _utc(value))
+        return self._filter(lambda df: df[column] <= value)
+
+    def is_(self, column: str, value):
+        assert value == "null", "only is_(col, 'null') is supported"
+        return self._filter(lambda df: df[column].isna())
+
+    @property
+    def not_(self):
+        return _Not(self)
+
+    def or_(self, expr: str):
+        m = _KEYSET.match(expr)
+        if not m:
+            raise NotImplementedError(f"or_ filter not supported by the fake: {expr}")
+        self._after = (_utc(m.group(1)), m.group(3))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._order.append(column)
+        self._descending.append(desc)
+        return self
+
+    def limit(self, n: int):
+        self._limit = n
+        return self
+
+    # ── execution ─────────────────────────────────────────────────────────
+    def _mask(self, df: pd.DataFrame) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+        for fn in self._filters:
+            mask &= fn(df)
+        return mask
+
+    def execute(self):
+        if self._op == "insert":
+            now = datetime.now(timezone.utc).isoformat()
+            rows = [{"id": str(uuid.uuid4()), "created_at": now, **r} for r in self._payload]
+            self._store.pending.extend(rows)
+            return SimpleNamespace(data=rows)
+
+        df = self._store.frame()
+        if self._op == "update":
+            mask = self._mask(df)
+            for col, val in self._payload.items():
+                if col not in df:
+                    df[col] = None
+                df.loc[mask, col] = val
+            return SimpleNamespace(data=[])
+
+        if self._after is not None:
+            # the store is in (timestamp, id) order, so a cursor is a binary search – like the index
+            ts, mid = self._after
+            pos = int(df["_ts"].searchsorted(ts, side="left"))
+            while pos < len(df) and df["_ts"].iat[pos] == ts and df["id"].iat[pos] <= mid:
+                pos += 1
+            df = df.iloc[pos:]
+        keyset_order = self._order in ([], ["timestamp"], ["timestamp", "id"]) and not any(self._descending)
+        if self._limit is not None and keyset_order:
+            # evaluate filters window by window until the page is full
+            parts, need, step = [], self._limit, max(self._limit * 4, 10_000)
+            for start in range(0, len(df), step):
+                win = df.iloc[start:start + step]
+                hit = win[self._mask(win)] if self._filters else win
+                parts.append(hit.head(need))
+                need -= len(parts[-1])
+                if need <= 0:
+                    break
+            out = pd.concat(parts) if parts else df.iloc[:0]
+        else:
+            out = df[self._mask(df)] if self._filters else df
+            if not keyset_order:
+                out = out.sort_values(self._order, ascending=[not d for d in self._descending])
+            if self._limit is not None:
+                out = out.head(self._limit)
+        cols = [c for c in df.columns if c != "_ts"] if self._columns == "*" else self._columns.split(",")
+        out = out[cols]
+        return SimpleNamespace(data=out.astype(object).where(out.notna(), None).to_dict("records"))
+
+
+class _RPC:
+    def __init__(self, store: _Store, fn: str, params: dict | None):
+        self._store, self._fn, self._params = store, fn, params or {}
+
+    def execute(self):
+        df = self._store.frame()
+        if self._fn == "message_dimensions":
+            return SimpleNamespace(data={   # 005 shape
+                "categories": sorted(df["category"].dropna().unique()),
+                "sources": sorted(df["source"].dropna().unique()),
+                "category_counts": df["category"].value_counts().to_dict(),
+                "source_counts": df["source"].value_counts().to_dict(),
+                "total": len(df),
+                "first": df["_ts"].min().isoformat() if len(df) else None,
+                "last": df["_ts"].max().isoformat() if len(df) else None,
+            })
+        if self._fn == "count_messages":
+            q = Query(self._store)
+            for col in ("category", "source"):
+                if self._params.get(col):
+                    q.eq(col, self._params[col])
+            if self._params.get("start"):
+                q.gte("timestamp", self._params["start"])
+            if self._params.get("end"):
+                q.lte("timestamp", self._params["end"])
+            return SimpleNamespace(data=[{"count": int(q._mask(df).sum())}])
+        raise NotImplementedError(f"rpc {self._fn} not supported by the fake")
+
+
+class FakeSupabase:
+    """Drop-in for `reports.supabase` (only the `messages` table)."""
+
+    def __init__(self, messages: pd.DataFrame):
+        self._store = _Store(messages)
+
+    def table(self, name: str) -> Query:
+        assert name == "messages", f"unknown table {name}"
+        return Query(self._store)
+
+    def rpc(self, fn: str, params: dict | None = None) -> _RPC:
+        return _RPC(self._store, fn, params)
+
+    def __len__(self) -> int:
+        return len(self._store.frame())
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+"""Run the offline benchmark suite and save the results as JSON.
+
+Supabase is replaced by benchmarks.fake_supabase seeded with synthetic
+rows, the LLM by benchmarks.fake_llm with a fixed latency, so runs are
+repeatable and need no network. If the trained classifier weights are not
+on disk, an untrained DistilBERT with the same config stands in (same
+compute, meaningless labels); the results record which one was used.
+
+    cd backend
+    python -m benchmarks.run                              # 10k / 100k / 1M rows
+    python -m benchmarks.run --rows 10000 --only metrics chat
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+_TMP = tempfile.mkdtemp(prefix="bench-")
+# settings are read at import time – point every local file somewhere disposable
+os.environ.setdefault("SUPABASE_URL", "http://localhost:1")
+os.environ.setdefault("SUPABASE_KEY", "offline")
+os.environ.update(
+    ROLLUP_WARMUP="false",
+    EMBED_ON_INGEST="false",
+    ANALYTICS_BACKEND="supabase",
+    CLASSIFY_ASYNC="false",
+    DIMENSIONS_TTL_SECONDS="0",
+    HEAVY_HITTERS_SYNC_SECONDS="0",
+    MIRROR_PATH=f"{_TMP}/mirror.csv",
+    USER_SKETCH_PATH=f"{_TMP}/users.npz",
+    HEAVY_HITTERS_PATH=f"{_TMP}/heavy_hitters.npz",
+    CLASSIFY_QUEUE_PATH=f"{_TMP}/jobs.sqlite",
+    EMBEDDING_INDEX_DIR=f"{_TMP}/embeddings",
+    LOCAL_STORE_DIR=f"{_TMP}/store",
+    SEARCH_INDEX_DIR=f"{_TMP}/search_index",
+)
+
+import torch  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import reports, rollups  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+from app.ml.dedup import classify_deduplicated  # noqa: E402
+from app.services import bert_classifier, get_llm_service, local_store  # noqa: E402
+from app.services.dimensions import dimensions  # noqa: E402
+from app.services.heavy_hitters import heavy_hitters  # noqa: E402
+from app.services.hll import user_sketches  # noqa: E402
+from app.services.search_index import search_index  # noqa: E402
+
+from . import synthetic  # noqa: E402
+from .fake_llm import FakeLLMService  # noqa: E402
+from .fake_supabase import FakeSupabase  # noqa: E402
+
+RESULTS = Path(__file__).parent / "results"
+SUITES = ("metrics", "chat", "classify", "ingest", "search")
+
+
+def _stats(samples: List[float], items: int = 1) -> Dict[str, float]:
+    ms = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.95))], 3),
+        "max_ms": round(ms[-1], 3),
+        "items_per_s": round(items * len(ms) / (sum(ms) / 1000), 1) if sum(ms) else None,
+    }
+
+
+def _time(fn: Callable, repeat: int, warmup: int = 1, items: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return _stats(samples, items)
+
+
+def _ok(response):
+    assert response.status_code < 400, f"{response.status_code}: {response.text[:200]}"
+    return response
+
+
+def _use_model() -> str:
+    weights = [f for f in os.listdir(bert_classifier.MODEL_DIR)
+               if f.endswith((".safetensors", ".bin"))] if os.path.isdir(bert_classifier.MODEL_DIR) else []
+    if weights:
+        return "trained"
+    from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer
+
+    def _untrained(path: str):
+        tok = AutoTokenizer.from_pretrained(path)
+        mdl = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(path))
+        return tok, mdl.eval()
+    bert_classifier.classifier.loader = _untrained
+    return "untrained (no weights on disk)"
+
+
+# ── suites ────────────────────────────────────────────────────────────────
+def bench_metrics(client: TestClient, rows: int, repeat: int) -> Dict[str, dict]:
+    out = {}
+    queries = {
+        "metrics_all": "",
+        "metrics_category": "?category=withdraw",
+        "metrics_filtered": "?category=withdraw,deposit&source=telegram&start=2024-12-01&end=2025-01-30",
+        "metrics_exact_users": "?category=withdraw&exact=true",
+    }
+    t0 = time.perf_counter()
+    rollups.warm_up()   # the steady state: roll-ups and sketches warm
+    heavy_hitters.catch_up()
+    out["rollup_warmup"] = _stats([time.perf_counter() - t0], rows)
+    for name, qs in queries.items():
+        out[name] = _time(lambda: _ok(client.get(f"/api/v1/messages/metrics{qs}")), repeat)
+    for by in ("user", "phrase"):
+        out[f"metrics_top_{by}s"] = _time(
+            lambda: _ok(client.get(f"/api/v1/messages/metrics/top?by={by}&start=2024-12-01")), repeat)
+    out["timeseries_day"] = _time(
+        lambda: _ok(client.get("/api/v1/messages/timeseries?interval=day&group_by=category")), repeat)
+    return out
+
+
+def bench_chat(client: TestClient, rows: int, repeat: int) -> Dict[str, dict]:
+    prompts = {
+        "chat_category_source": "How many withdraw issues came via telegram in the last 30 days?",
+        "chat_all": "Give me an overview of the last 90 days",
+        "chat_compare": "Deposit vs withdraw issues in the last 30 days",
+        "chat_top_users": "Which users contacted support most in the last 30 days?",
+    }
+    return {name: _time(lambda: _ok(client.post("/api/v1/chat", json={"message": p})), repeat)
+            for name, p in prompts.items()}
+
+
+def bench_classify(client: TestClient, rows: int, repeat: int) -> Dict[str, dict]:
+    texts = synthetic.messages(1024, seed=7)["message"].tolist()
+    return {
+        "classify_endpoint": _time(
+            lambda: _ok(client.post("/api/v1/messages/classify", json={"message": texts[0]})), repeat * 4),
+        "classify_batch_256": _time(lambda: bert_classifier.classify_batch(texts[:256]), repeat, items=256),
+        "classify_dedup_1024": _time(
+            lambda: classify_deduplicated(texts, bert_classifier.classify_batch, 0.9), repeat, items=1024),
+    }
+
+
+def bench_ingest(client: TestClient, rows: int, repeat: int) -> Dict[str, dict]:
+    batch = synthetic.messages(500, seed=11)
+    items = [{"id_user": int(r.id_user), "timestamp": r.timestamp, "source": r.source, "message": r.message}
+             for r in batch.itertuples()]
+    labelled = [{**it, "category": "other"} for it in items]
+    return {
+        "ingest_single_classify": _time(lambda: _ok(client.post("/api/v1/messages", json=items[0])), repeat * 4),
+        "ingest_single_labelled": _time(lambda: _ok(client.post("/api/v1/messages", json=labelled[0])), repeat * 4),
+        "ingest_bulk_500": _time(lambda: _ok(client.post("/api/v1/messages/bulk", json=items)), repeat, items=500),
+    }
+
+
+def bench_search(client: TestClient, rows: int, repeat: int) -> Dict[str, dict]:
+    """/search on the local store's inverted index (Postgres: scripts/benchmark_queries.py --search)."""
+    for path in (settings.LOCAL_STORE_DIR, settings.SEARCH_INDEX_DIR):
+        shutil.rmtree(path, ignore_errors=True)
+    search_index._segments.clear()
+    local_store.append(synthetic.messages(rows).to_dict("records"), skip_existing=True)
+    out = {"search_index_build": _time(search_index.refresh, 1, warmup=0, items=rows)}
+    out["search_index_load"] = _time(lambda: (search_index._segments.clear(), search_index.refresh()), repeat,
+                                     warmup=0, items=rows)
+    queries = {
+        "search_word": "q=deposit",
+        "search_words": "q=withdraw money",
+        "search_phrase": 'q="game froze"',
+        "search_exclude": "q=deposit -failed",
+        "search_filtered": "q=bonus&category=bonus&source=telegram&start=2024-12-01&end=2025-01-30",
+        "search_partial": "q=withdraw&partial=true",
+    }
+    settings.ANALYTICS_BACKEND = "local"
+    try:
+        for name, qs in queries.items():
+            out[name] = _time(lambda: _ok(client.get(f"/api/v1/messages/search?{qs}")), repeat)
+        cursor = None
+        for _ in range(10):
+            cursor = _ok(client.get("/api/v1/messages/search", params={"q": "deposit", "cursor": cursor})).json()["next_cursor"]
+        out["search_page_11"] = _time(
+            lambda: _ok(client.get("/api/v1/messages/search", params={"q": "deposit", "cursor": cursor})), repeat)
+    finally:
+        settings.ANALYTICS_BACKEND = "supabase"
+    return out
+
+
+BENCHES = {"metrics": bench_metrics, "chat": bench_chat, "classify": bench_classify, "ingest": bench_ingest,
+           "search": bench_search}
+PER_DATASET = {"metrics", "chat", "search"}   # the others do not depend on the table size
+
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def main(row_counts: List[int], only: List[str], repeat: int, llm_latency: float, out: Path | None):
+    model = _use_model()
+    llm = FakeLLMService(latency=llm_latency)
+    app.dependency_overrides[get_llm_service] = lambda: llm
+    results: Dict[str, dict] = {}
+
+    for i, rows in enumerate(row_counts):
+        print(f"Seeding {rows:,} synthetic rows…")
+        reports.supabase = FakeSupabase(synthetic.messages(rows))
+        dimensions.loaded_at = None
+        user_sketches._sketches.clear()
+        user_sketches.warm = False
+        heavy_hitters._buckets.clear()
+        heavy_hitters._mark, heavy_hitters._counted = None, {}
+        heavy_hitters.warm = False
+        with TestClient(app) as client:
+            for suite in only:
+                if suite not in PER_DATASET and i:
+                    continue
+                for name, stat in BENCHES[suite](client, rows, repeat).items():
+                    key = f"{name}@{rows}" if suite in PER_DATASET else name
+                    results[key] = stat
+                    print(f"  {key:<36} p50 {stat['p50_ms']:>10.2f} ms   p95 {stat['p95_ms']:>10.2f} ms")
+
+    payload = {
+        "meta": {
+            "commit": _git_sha(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "torch_threads": torch.get_num_threads(),
+            "model": model,
+            "llm_latency_s": llm_latency,
+            "rows": row_counts,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    out = out or RESULTS / f"{payload['meta']['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(payload, indent=2))
+    print(f"\n✅ Results → {out}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--only", nargs="+", choices=SUITES, default=list(SUITES))
+    p.add_argument("--repeat", type=int, default=5, help="timed runs per case (after one warm-up run)")
+    p.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    p.add_argument("--out", type=Path, help="default: benchmarks/results/<commit>.json")
+    args = p.parse_args()
+    main(args.rows, args.only, args.repeat, args.llm_latency, args.out)
@@ -0,0 +1,37 @@
+"""Deterministic synthetic `messages` rows shaped like the production data."""
+import numpy as np
+import pandas as pd
+
+from app.ml.labels import LABELS
+
+START, END = pd.Timestamp("2024-01-11", tz="UTC"), pd.Timestamp("2025-01-30", tz="UTC")
+
+TEMPLATES = {
+    "bonus": ["where is my bonus", "the welcome bonus was not credited", "free spins bonus missing"],
+    "deposit": ["my deposit has not arrived", "deposit failed but money was taken", "how long does a deposit take"],
+    "withdraw": ["I can't withdraw my money", "withdrawal pending for days", "why was my withdraw rejected"],
+    "game_issue": ["the game froze during a spin", "slot keeps crashing", "live game disconnected"],
+    "login_account": ["I cannot log in", "password reset does not work", "my account is blocked"],
+    "anger_feedback": ["this is a scam", "worst support ever", "I am very angry about this"],
+    "other": ["hello", "what are your opening hours", "thanks for the help"],
+}
+
+
+def messages(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ts = pd.to_datetime(np.sort(rng.integers(START.value, END.value, n)), utc=True)
+    cat_idx = rng.choice(len(LABELS), n, p=[0.15, 0.2, 0.2, 0.1, 0.15, 0.05, 0.15])
+    tpl = rng.integers(0, 3, n)
+    text = np.array([TEMPLATES[c] for c in LABELS], dtype=object)[cat_idx, tpl]
+    suffix = rng.integers(0, 1000, n).astype(str)
+    return pd.DataFrame({
+        "id": [f"{i:08x}-0000-4000-8000-{seed:012x}" for i in range(n)],
+        "id_user": rng.integers(1, max(2, n // 20), n),
+        "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+        "source": np.where(rng.random(n) < 0.6, "livechat", "telegram"),
+        "message": text + " #" + suffix,
+        "category": np.array(LABELS, dtype=object)[cat_idx],
+        "labels_mask": None,
+        "model_version": "synthetic",
+        "created_at": ts.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+    })
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Embed every stored message into the similar-message index.
+
+Only ids missing from the index are embedded, so re-running after a
+partial build (or to catch up with ingest) is cheap. `--ivf` rebuilds the
+coarse quantiser used once the corpus passes EMBEDDING_IVF_MIN_ROWS.
+"""
+import argparse
+import time
+
+from app.reports import iter_supabase_messages
+from app.services.bert_classifier import embed
+from app.services.embedding_index import get_index
+
+PAGE = 1000
+
+
+def main(batch_size: int, ivf: bool):
+    index = get_index()
+    done, start, scanned = 0, time.perf_counter(), 0
+    # keyset pages: each one is an index range scan, where offset paging re-reads every earlier row
+    for rows in iter_supabase_messages("id,message", page_size=PAGE):
+        scanned += len(rows)
+        todo = [r for r in rows if r["id"] not in index]
+        if todo:
+            index.append([r["id"] for r in todo],
+                         embed([r["message"] or "" for r in todo], batch_size=batch_size))
+            done += len(todo)
+        print(f"Progress: {scanned} scanned, {done} embedded "
+              f"({done / (time.perf_counter() - start):.0f} msg/s)")
+
+    if ivf:
+        print("Building IVF quantiser…")
+        index.build_ivf()
+    print(f"\n✅ Index holds {len(index)} messages → {index.path}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--ivf", action="store_true")
+    args = p.parse_args()
+    main(args.batch_size, args.ivf)
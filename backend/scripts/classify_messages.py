@@ -3,22 +3,21 @@
 import csv
 import pandas as pd
 from pathlib import Path
-from app.services.bert_classifier import classify
+from app.ml.dedup import classify_deduplicated, print_stats
+from app.services.bert_classifier import classify_batch
 
-def classify_messages(input_csv: Path, output_csv: Path):
+def classify_messages(input_csv: Path, output_csv: Path, dedup_threshold: float = 0.9):
     # Read input CSV
     df = pd.read_csv(input_csv)
     
     print(f"Processing {len(df)} messages...")
+    messages = df['message'].astype(str).tolist()
+    # Near-duplicates share one model call; their label is propagated
+    categories, stats = classify_deduplicated(messages, classify_batch, dedup_threshold)
+    print_stats(stats)
+
     results = []
-    for idx, row in df.iterrows():
-        if idx % 100 == 0:
-            print(f"Progress: {idx}/{len(df)}")
-            
-        message = row['message']
-        # Get classification
-        category = classify(message)
-        
+    for (_, row), category in zip(df.iterrows(), categories):
         # Add to results
         result = row.to_dict()
         result['category'] = category
@@ -43,6 +42,8 @@ if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("input_csv", type=Path)
     p.add_argument("output_csv", type=Path)
+    p.add_argument("--dedup-threshold", type=float, default=0.9,
+                   help="MinHash Jaccard similarity for near-duplicates (1.0 = exact repeats only)")
     args = p.parse_args()
     
-    classify_messages(args.input_csv, args.output_csv) 
\ No newline at end of file
+    classify_messages(args.input_csv, args.output_csv, args.dedup_threshold) 
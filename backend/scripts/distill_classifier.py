@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Distil `distilbert-classifier-saved` into a fastText-style student.
+
+The teacher labels the full message corpus with soft targets, the student
+is trained on them with a temperature-scaled KL loss, and the script then
+reports single-message latency for both models plus their agreement.
+
+    python scripts/distill_classifier.py data/LLM-DataScientist-Task_Data.csv
+    CLASSIFIER_BACKEND=student uvicorn app.main:app
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+import pandas as pd
+import torch
+import torch.nn.functional as F
+
+from app.services import student_classifier
+from app.services.bert_classifier import LABELS, bert_logits
+from app.services.student_classifier import FastTextClassifier
+
+
+def teacher_logits(msgs, batch_size: int) -> torch.Tensor:
+    out = []
+    for i in range(0, len(msgs), batch_size):
+        if i % (batch_size * 20) == 0:
+            print(f"Teacher: {i}/{len(msgs)}")
+        out.append(bert_logits(msgs[i:i + batch_size]))
+    return torch.cat(out)
+
+
+def train_student(msgs, soft, args) -> FastTextClassifier:
+    model = FastTextClassifier(len(LABELS), args.buckets, args.dim)
+    opt = torch.optim.Adam(model.parameters(), lr=args.lr)
+    T = args.temperature
+    order = list(range(len(msgs)))
+
+    for epoch in range(args.epochs):
+        random.shuffle(order)
+        model.train()
+        total = 0.0
+        for i in range(0, len(order), args.batch_size):
+            idx = order[i:i + args.batch_size]
+            logits = model(*model.encode([msgs[j] for j in idx]))
+            target = F.softmax(soft[idx] / T, dim=-1)
+            loss = F.kl_div(F.log_softmax(logits / T, dim=-1), target, reduction="batchmean") * T * T
+            opt.zero_grad()
+            loss.backward()
+            opt.step()
+            total += loss.item() * len(idx)
+        print(f"Epoch {epoch + 1}/{args.epochs} – loss {total / len(order):.4f}")
+
+    model.eval()
+    return model
+
+
+def per_message_ms(fn, msgs) -> float:
+    start = time.perf_counter()
+    for m in msgs:
+        fn([m])
+    return (time.perf_counter() - start) * 1000 / len(msgs)
+
+
+def main(args):
+    df = pd.read_csv(args.csv)
+    msgs = df["message"].astype(str).tolist()
+    print(f"Processing {len(msgs)} messages...")
+
+    soft = teacher_logits(msgs, args.batch_size)
+
+    split = list(range(len(msgs)))
+    random.Random(0).shuffle(split)
+    n_hold = max(1, int(len(msgs) * args.holdout))
+    hold, train = split[:n_hold], split[n_hold:]
+
+    model = train_student([msgs[i] for i in train], soft[train], args)
+    student_classifier.save(model, args.out, LABELS)
+
+    with torch.no_grad():
+        pred = model(*model.encode(msgs)).argmax(-1)
+    teacher = soft.argmax(-1)
+    agree_all = (pred == teacher).float().mean().item()
+    agree_hold = (pred[hold] == teacher[hold]).float().mean().item()
+
+    sample = random.Random(1).sample(msgs, min(args.timing_sample, len(msgs)))
+    with torch.no_grad():
+        teacher_ms = per_message_ms(bert_logits, sample)
+        student_ms = per_message_ms(lambda b: model(*model.encode(b)), sample)
+
+    print(f"\n✅ Student saved → {args.out}/")
+    print(f"Agreement with teacher: {agree_hold:.3f} held-out, {agree_all:.3f} overall")
+    print(f"Latency per message: teacher {teacher_ms:.2f} ms, student {student_ms:.3f} ms "
+          f"→ {teacher_ms / student_ms:.0f}× faster")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("csv", type=Path, nargs="?", default=Path("data/LLM-DataScientist-Task_Data.csv"))
+    p.add_argument("--out", default="distilbert-classifier-student")
+    p.add_argument("--epochs", type=int, default=10)
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--lr", type=float, default=0.05)
+    p.add_argument("--dim", type=int, default=64)
+    p.add_argument("--buckets", type=int, default=2 ** 18)
+    p.add_argument("--temperature", type=float, default=2.0)
+    p.add_argument("--holdout", type=float, default=0.1)
+    p.add_argument("--timing-sample", type=int, default=200)
+    main(p.parse_args())
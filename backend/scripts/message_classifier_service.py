@@ -35,6 +35,8 @@ from pydantic import Field
 import pandas as pd
 from tqdm.auto import tqdm
 
+from app.ml.dedup import cluster, cluster_stats, print_stats
+
 try:
     import openai
 except ImportError:
@@ -192,23 +194,30 @@ def keyword_label(msg: str) -> str:
 
 # ==== Main ==================================================================
 
-async def main(path: str):
+async def main(path: str, dedup_threshold: float = 0.9):
     df = pd.read_csv(path)
     if "message" not in df.columns:
         raise ValueError("CSV must have a 'message' column")
 
     msgs = df["message"].astype(str).tolist()
 
+    # Only one message per near-duplicate cluster goes to the LLM
+    reps = cluster(msgs, dedup_threshold)
+    print_stats(cluster_stats(reps, msgs))
+    uniq = sorted(set(reps.tolist()))
+    uniq_msgs = [msgs[i] for i in uniq]
+
     # Try LLM route; fallback to keywords
     try:
-        categories = await discover_categories(msgs)
-        labels = await label_messages(msgs, categories)
+        categories = await discover_categories(uniq_msgs)
+        labels = await label_messages(uniq_msgs, categories)
     except Exception as e:
         print(f"[Warning] Falling back to keyword classifier: {e}")
         categories = [{"name": k, "description": "auto‑keyword"} for k in KEYWORD_CATS]
-        labels = [keyword_label(m) for m in tqdm(msgs, desc="Keyword classify")]
+        labels = [keyword_label(m) for m in tqdm(uniq_msgs, desc="Keyword classify")]
 
-    df["category"] = labels
+    by_rep = dict(zip(uniq, labels))
+    df["category"] = [by_rep[r] for r in reps.tolist()]
     out_path = str(Path(path)) + "_labelled.csv"
     df.to_csv(out_path, index=False)
     print(f"Saved: {out_path}")
@@ -219,5 +228,7 @@ async def main(path: str):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Classify support messages.")
     parser.add_argument("dataset", help="CSV file with a 'message' column")
+    parser.add_argument("--dedup-threshold", type=float, default=0.9,
+                        help="MinHash Jaccard similarity for near-duplicates (1.0 = exact repeats only)")
     args = parser.parse_args()
-    asyncio.run(main(args.dataset))
+    asyncio.run(main(args.dataset, args.dedup_threshold))
@@ -0,0 +1,24 @@
+-- Indexes for the filters every analytics query uses:
+--   reports.fetch_messages / crud.fetch_messages  →  timestamp range [+ category] [+ source]
+--   reports.iter_supabase_messages (keyset paging) →  order by timestamp, id
+--
+-- The composite indexes INCLUDE the /metrics columns (reports.METRIC_COLUMNS),
+-- so those reads can be index-only scans once the visibility map is current.
+-- On a large live table run each statement as `create index concurrently`
+-- (outside a transaction) to avoid blocking ingest.
+
+create index if not exists messages_timestamp_id_idx
+  on messages (timestamp, id);
+
+create index if not exists messages_category_timestamp_idx
+  on messages (category, timestamp) include (id_user, labels_mask);
+
+create index if not exists messages_source_timestamp_idx
+  on messages (source, timestamp) include (id_user, category, labels_mask);
+
+-- tiny (kilobytes) and effective because rows arrive roughly in timestamp order;
+-- the planner prefers it for wide ranges where the b-tree would visit most pages
+create index if not exists messages_timestamp_brin
+  on messages using brin (timestamp) with (pages_per_range = 32);
+
+analyze messages;
@@ -0,0 +1,56 @@
+-- OPTIONAL: convert `messages` into monthly range partitions on timestamp.
+--
+-- Worth it once the table holds tens of millions of rows: date-bounded
+-- queries touch only the months they cover and old months can be detached
+-- or dropped cheaply. The table is copied, so run it in a maintenance
+-- window, then re-run 001_messages_indexes.sql (indexes created on the
+-- partitioned parent are created on every partition).
+--
+-- The primary key becomes (id, timestamp) – Postgres requires the partition
+-- key in every unique constraint. Keep new months available with
+--   select create_message_partitions(date_trunc('month', now())::date, 3);
+-- (pg_cron or any monthly job); rows outside every range land in messages_default.
+
+begin;
+
+alter table messages rename to messages_unpartitioned;
+alter table messages_unpartitioned rename constraint messages_pkey to messages_unpartitioned_pkey;
+drop index if exists messages_timestamp_id_idx, messages_category_timestamp_idx,
+                      messages_source_timestamp_idx, messages_timestamp_brin;
+
+create table messages (like messages_unpartitioned including defaults including constraints)
+  partition by range (timestamp);
+alter table messages add primary key (id, timestamp);
+create table messages_default partition of messages default;
+
+create or replace function create_message_partitions(from_month date, months int)
+returns void language plpgsql as $$
+declare
+  m date;
+begin
+  for i in 0 .. months - 1 loop
+    m := date_trunc('month', from_month)::date + make_interval(months => i);
+    execute format(
+      'create table if not exists %I partition of messages for values from (%L) to (%L)',
+      'messages_' || to_char(m, 'YYYY_MM'), m, (m + interval '1 month')::date
+    );
+  end loop;
+end $$;
+
+-- every month that has data, plus a year ahead
+select create_message_partitions(
+  lo,
+  (extract(year from age(hi, lo)) * 12 + extract(month from age(hi, lo)))::int + 13
+)
+from (
+  select date_trunc('month', coalesce(min(timestamp), now()))::date as lo,
+         date_trunc('month', greatest(coalesce(max(timestamp), now()), now()))::date as hi
+  from messages_unpartitioned
+) bounds;
+
+insert into messages select * from messages_unpartitioned;
+
+commit;
+
+-- after verifying row counts:
+-- drop table messages_unpartitioned;
@@ -0,0 +1,30 @@
+-- message_dimensions(): distinct categories / sources and timestamp bounds
+-- for the filter panel (GET /messages/categories, /sources, /bounds).
+--
+-- The recursive CTEs are "loose index scans": each step jumps to the next
+-- distinct value through messages_category_timestamp_idx /
+-- messages_source_timestamp_idx (001_messages_indexes.sql), so the cost is
+-- one index probe per distinct value instead of a pass over every row.
+
+create or replace function message_dimensions()
+returns json
+language sql stable
+as $$
+  with recursive
+  cats as (
+    select min(category) as v from messages
+    union all
+    select (select min(category) from messages where category > cats.v) from cats where cats.v is not null
+  ),
+  srcs as (
+    select min(source) as v from messages
+    union all
+    select (select min(source) from messages where source > srcs.v) from srcs where srcs.v is not null
+  )
+  select json_build_object(
+    'categories', (select coalesce(json_agg(v order by v), '[]'::json) from cats where v is not null),
+    'sources',    (select coalesce(json_agg(v order by v), '[]'::json) from srcs where v is not null),
+    'first',      (select min(timestamp) from messages),
+    'last',       (select max(timestamp) from messages)
+  );
+$$;
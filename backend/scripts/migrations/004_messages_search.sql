@@ -0,0 +1,87 @@
+-- Full-text search behind GET /messages/search (reports.search_messages).
+--
+-- message_tsv is a stored tsvector ('simple' config: lower-cased words, no
+-- stemming or stop words, the same tokens as app/services/search_index.py)
+-- with a GIN index for word and phrase queries. The trigram index serves
+-- `partial` searches, where a word may be part of a longer one
+-- (piggy → piggybank) and the query becomes ILIKE '%piggy%'.
+--
+-- Adding a stored generated column rewrites the table; on a large live
+-- table add the indexes with `create index concurrently` afterwards.
+
+create extension if not exists pg_trgm;
+
+alter table messages add column if not exists message_tsv tsvector
+  generated always as (to_tsvector('simple', coalesce(message, ''))) stored;
+
+create index if not exists messages_message_tsv_idx
+  on messages using gin (message_tsv);
+
+create index if not exists messages_message_trgm_idx
+  on messages using gin (message gin_trgm_ops);
+
+-- Ranked matches, best first (ties: newest, then id). The caller pages with
+-- the (score, timestamp, id) of the last row it got; `total` counts every
+-- match regardless of the cursor. Word queries rank with ts_rank_cd,
+-- partial ones by word_similarity to the query words.
+create or replace function search_messages(
+  q             text,
+  partial_terms text[]      default null,
+  categories    text[]      default null,
+  src           text        default null,
+  start_ts      timestamptz default null,
+  end_ts        timestamptz default null,
+  after_score   real        default null,
+  after_ts      timestamptz default null,
+  after_id      uuid        default null,
+  page_size     int         default 20
+)
+returns table (id uuid, id_user int, "timestamp" timestamptz, source text, message text,
+               category text, score real, snippet text, total bigint)
+language plpgsql stable
+as $$
+declare
+  tsq   tsquery;
+  match text;
+  rank  text;
+begin
+  if partial_terms is null then
+    tsq   := websearch_to_tsquery('simple', q);
+    match := 'm.message_tsv @@ $1';
+    rank  := 'ts_rank_cd(m.message_tsv, $1)';
+  else
+    -- one ILIKE per word so each can use the trigram index; prefix query only for the headline
+    tsq   := to_tsquery('simple', array_to_string(
+               array(select quote_literal(t) || ':*' from unnest(partial_terms) t), ' | '));
+    match := array_to_string(
+               array(select format('m.message ilike %L', '%' || t || '%') from unnest(partial_terms) t), ' and ');
+    rank  := format('word_similarity(%L, m.message)', array_to_string(partial_terms, ' '));
+  end if;
+
+  -- dynamic so every call is planned with its own filters (null ones drop out)
+  return query execute format($sql$
+    with hits as (
+      select m.id, m.id_user, m.timestamp, m.source, m.message, m.category, (%s)::real as score
+      from messages m
+      where %s
+        and ($2::text[] is null or m.category = any ($2))
+        and ($3::text is null or m.source = $3)
+        and ($4::timestamptz is null or m.timestamp >= $4)
+        and ($5::timestamptz is null or m.timestamp <= $5)
+    ),
+    counted as (
+      select h.*, count(*) over () as total from hits h
+    )
+    select c.id, c.id_user, c.timestamp, c.source, c.message, c.category, c.score,
+           ts_headline('simple', c.message, $1, 'StartSel=**, StopSel=**, MaxWords=30, MinWords=10, MaxFragments=1'),
+           c.total
+    from counted c
+    where $6::real is null
+       or c.score < $6
+       or c.score = $6 and (c.timestamp < $7 or c.timestamp = $7 and c.id > $8)
+    order by c.score desc, c.timestamp desc, c.id
+    limit $9
+  $sql$, rank, match)
+  using tsq, categories, src, start_ts, end_ts, after_score, after_ts, after_id, page_size;
+end;
+$$;
@@ -0,0 +1,109 @@
+-- Per-category / per-source counts and the total, kept current by triggers,
+-- so message_dimensions() (first defined in 003) can return them without
+-- scanning `messages`. The app reloads the snapshot every
+-- DIMENSIONS_TTL_SECONDS from every worker; with this table each reload is
+-- a read of a few dozen rows plus two index probes for the bounds.
+--
+-- The triggers are statement-level with transition tables: a multi-row
+-- insert (bulk ingest, ingest_csv.py) updates each counter once per
+-- statement, not once per row. Concurrent writers serialise on the
+-- counter rows they touch until commit – fine at support-message volumes.
+--
+-- message_dimensions() keeps the 003 keys (categories, sources, first,
+-- last) and adds category_counts, source_counts and total;
+-- app/services/dimensions.py reads either shape.
+--
+-- After 002_messages_monthly_partitions.sql, re-run this file: the
+-- triggers belong to the table that was renamed away.
+
+create table if not exists message_dimension_counts (
+  dim   text   not null,   -- 'category' | 'source' | 'total'
+  value text   not null,   -- '' for the total
+  n     bigint not null,
+  primary key (dim, value)
+);
+
+-- (dim, value, delta) rows of a statement; old_rows / new_rows only exist for
+-- the operations that have them, hence one branch per operation
+create or replace function message_dimension_counts_apply()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op = 'INSERT' then
+    insert into message_dimension_counts as c (dim, value, n)
+    select dim, value, count(*) from (
+      select 'category' as dim, category as value from new_rows where category is not null
+      union all select 'source', source from new_rows where source is not null
+      union all select 'total', '' from new_rows
+    ) d group by dim, value
+    on conflict (dim, value) do update set n = c.n + excluded.n;
+  elsif tg_op = 'DELETE' then
+    insert into message_dimension_counts as c (dim, value, n)
+    select dim, value, -count(*) from (
+      select 'category' as dim, category as value from old_rows where category is not null
+      union all select 'source', source from old_rows where source is not null
+      union all select 'total', '' from old_rows
+    ) d group by dim, value
+    on conflict (dim, value) do update set n = c.n + excluded.n;
+  else
+    -- updates that leave category and source alone (model_version, labels_mask) net to nothing
+    insert into message_dimension_counts as c (dim, value, n)
+    select dim, value, sum(delta) from (
+      select 'category' as dim, category as value, -1 as delta from old_rows where category is not null
+      union all select 'source', source, -1 from old_rows where source is not null
+      union all select 'category', category, 1 from new_rows where category is not null
+      union all select 'source', source, 1 from new_rows where source is not null
+    ) d group by dim, value having sum(delta) <> 0
+    on conflict (dim, value) do update set n = c.n + excluded.n;
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists messages_dimension_counts_insert on messages;
+drop trigger if exists messages_dimension_counts_update on messages;
+drop trigger if exists messages_dimension_counts_delete on messages;
+
+create trigger messages_dimension_counts_insert
+  after insert on messages referencing new table as new_rows
+  for each statement execute function message_dimension_counts_apply();
+-- async classification fills category with an update; old minus new keeps the counts right
+create trigger messages_dimension_counts_update
+  after update on messages referencing old table as old_rows new table as new_rows
+  for each statement execute function message_dimension_counts_apply();
+create trigger messages_dimension_counts_delete
+  after delete on messages referencing old table as old_rows
+  for each statement execute function message_dimension_counts_apply();
+
+-- one-off backfill, under a lock so no write slips between the count and the triggers
+begin;
+lock table messages in share mode;
+truncate message_dimension_counts;
+insert into message_dimension_counts (dim, value, n)
+select 'category', category, count(*) from messages where category is not null group by category
+union all
+select 'source', source, count(*) from messages where source is not null group by source
+union all
+select 'total', '', count(*) from messages;
+commit;
+
+create or replace function message_dimensions()
+returns json
+language sql stable
+as $$
+  select json_build_object(
+    'categories',      (select coalesce(json_agg(value order by value), '[]'::json)
+                        from message_dimension_counts where dim = 'category' and n > 0),
+    'sources',         (select coalesce(json_agg(value order by value), '[]'::json)
+                        from message_dimension_counts where dim = 'source' and n > 0),
+    'category_counts', (select coalesce(json_object_agg(value, n), '{}'::json)
+                        from message_dimension_counts where dim = 'category' and n > 0),
+    'source_counts',   (select coalesce(json_object_agg(value, n), '{}'::json)
+                        from message_dimension_counts where dim = 'source' and n > 0),
+    'total',           (select coalesce(sum(n), 0) from message_dimension_counts where dim = 'total'),
+    -- single probes of messages_timestamp_id_idx (001_messages_indexes.sql)
+    'first',           (select min(timestamp) from messages),
+    'last',            (select max(timestamp) from messages)
+  );
+$$;
@@ -0,0 +1,11 @@
+-- Index for the heavy-hitter catch-up (app/services/heavy_hitters.py):
+-- every HEAVY_HITTERS_SYNC_SECONDS each worker reads the rows created past
+-- its saved high-water mark, `where created_at > $mark`. Without this index
+-- that is a sequential scan of `messages` per worker per sync.
+--
+-- On a large live table run it as `create index concurrently` (outside a
+-- transaction) to avoid blocking ingest. After
+-- 002_messages_monthly_partitions.sql, re-run this file.
+
+create index if not exists messages_created_at_idx
+  on messages (created_at);
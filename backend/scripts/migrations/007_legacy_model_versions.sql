@@ -0,0 +1,16 @@
+-- Marks labels that predate the model_version column, so
+-- scripts/reclassify_stale.py does not overwrite them: they may be human
+-- labels from CSV imports or the dashboard, or come from a model nobody
+-- recorded. Run once, after adding model_version (setup_supabase.sql).
+--
+-- 'legacy' rows are skipped like 'manual' ones; re-label them on purpose
+-- with `reclassify_stale.py --include-legacy`. Rows without a category stay
+-- NULL – they are waiting for the classifier.
+--
+-- The update trigger from 005_message_dimension_counts.sql sees no
+-- category or source change, so the counts are untouched.
+
+update messages
+   set model_version = 'legacy'
+ where model_version is null
+   and category is not null;
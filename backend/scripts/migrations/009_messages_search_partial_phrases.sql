@@ -0,0 +1,88 @@
+-- Partial (`partial=true`) searches honour quoted phrases and -excluded
+-- words, like the local index (app/services/search_index.py) does. Until
+-- now the partial branch matched only the plain words, and a phrase-only
+-- query built an empty WHERE clause.
+--
+-- search_messages() gains an `excluded_terms` argument, so the old
+-- signature is dropped first; create or replace would add an overload.
+-- Run after 008.
+
+drop function if exists search_messages(text, text[], text[], text, timestamptz, timestamptz,
+                                        real, timestamptz, uuid, int);
+
+-- Ranked matches, best first (ties: newest, then id). The caller pages with
+-- the (score, timestamp, id) of the last row it got; `total` counts every
+-- match regardless of the cursor. Word queries rank with ts_rank_cd,
+-- partial ones by word_similarity to the query words. A partial term with
+-- spaces is a quoted phrase: its words in order, whole words only;
+-- excluded_terms are left out wherever they occur, as in the local index.
+create or replace function search_messages(
+  q             text,
+  partial_terms text[]      default null,
+  categories    text[]      default null,
+  src           text        default null,
+  start_ts      timestamptz default null,
+  end_ts        timestamptz default null,
+  after_score   real        default null,
+  after_ts      timestamptz default null,
+  after_id      uuid        default null,
+  page_size     int         default 20,
+  excluded_terms text[]     default null
+)
+returns table (id uuid, id_user int, "timestamp" timestamptz, source text, message text,
+               category text, score real, snippet text, total bigint)
+language plpgsql stable
+as $$
+declare
+  tsq   tsquery;
+  match text;
+  rank  text;
+begin
+  if partial_terms is null then
+    tsq   := websearch_to_tsquery('simple', q);
+    match := 'to_tsvector(''simple'', coalesce(m.message, '''')) @@ $1';
+    rank  := 'ts_rank_cd(to_tsvector(''simple'', coalesce(m.message, '''')), $1)';
+  elsif cardinality(partial_terms) = 0 then
+    raise exception 'search_messages: no words or phrases to match' using errcode = '22023';
+  else
+    -- one ILIKE (or regex) per term so each can use the trigram index; prefix query only for the headline
+    tsq   := to_tsquery('simple', array_to_string(
+               array(select quote_literal(w) || ':*'
+                     from unnest(partial_terms) t, regexp_split_to_table(t, '\s+') w), ' | '));
+    match := array_to_string(
+               array(select case when t ~ '\s'
+                                 then format('m.message ~* %L', '\m' || regexp_replace(t, '\s+', '\W+', 'g') || '\M')
+                                 else format('m.message ilike %L', '%' || t || '%') end
+                     from unnest(partial_terms) t)
+               || array(select format('m.message not ilike %L', '%' || t || '%')
+                        from unnest(coalesce(excluded_terms, '{}')) t), ' and ');
+    rank  := format('word_similarity(%L, m.message)', array_to_string(partial_terms, ' '));
+  end if;
+
+  -- dynamic so every call is planned with its own filters (null ones drop out)
+  return query execute format($sql$
+    with hits as (
+      select m.id, m.id_user, m.timestamp, m.source, m.message, m.category, (%s)::real as score
+      from messages m
+      where %s
+        and ($2::text[] is null or m.category = any ($2))
+        and ($3::text is null or m.source = $3)
+        and ($4::timestamptz is null or m.timestamp >= $4)
+        and ($5::timestamptz is null or m.timestamp <= $5)
+    ),
+    counted as (
+      select h.*, count(*) over () as total from hits h
+    )
+    select c.id, c.id_user, c.timestamp, c.source, c.message, c.category, c.score,
+           ts_headline('simple', c.message, $1, 'StartSel=**, StopSel=**, MaxWords=30, MinWords=10, MaxFragments=1'),
+           c.total
+    from counted c
+    where $6::real is null
+       or c.score < $6
+       or c.score = $6 and (c.timestamp < $7 or c.timestamp = $7 and c.id > $8)
+    order by c.score desc, c.timestamp desc, c.id
+    limit $9
+  $sql$, rank, match)
+  using tsq, categories, src, start_ts, end_ts, after_score, after_ts, after_id, page_size;
+end;
+$$;
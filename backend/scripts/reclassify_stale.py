@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""Re-label rows whose `model_version` differs from the deployed classifier.
+
+Streams only stale rows (no label yet, or an older version; "manual"
+labels, and "legacy" ones from 007_legacy_model_versions.sql unless
+--include-legacy, are left alone) in keyset order, classifies each page in one batched call and
+writes one UPDATE per (label, ids-chunk) on a bounded thread pool. Updated
+rows drop out of the stale set, so an interrupted run resumes by simply
+running it again.
+
+    python scripts/reclassify_stale.py --dry-run
+    python scripts/reclassify_stale.py --page-size 2000 --concurrency 8
+    python scripts/reclassify_stale.py --include-legacy   # also labels that predate model_version
+"""
+import argparse
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app.config import settings
+from app.ml.dedup import classify_deduplicated
+from app.ml.labels import labels_to_mask
+from app.reports import iter_supabase_messages, supabase
+from app.services.bert_classifier import classify_batch, classify_multi, model_version
+
+IDS_PER_UPDATE = 200  # keeps the PostgREST `id=in.(…)` URL well under proxy limits
+
+
+def _stale_passes(version: str, include_legacy: bool = False):
+    # a category without a version may be a human label from before the column existed
+    yield lambda q: q.is_("model_version", "null").is_("category", "null")
+    keep = [version, "manual"] if include_legacy else [version, "manual", "legacy"]
+    yield lambda q: q.not_.in_("model_version", keep)
+
+
+def _updates(rows: list[dict], version: str) -> dict[tuple, list[str]]:
+    """Group row ids by their new (category, labels_mask)."""
+    texts = [r["message"] or "" for r in rows]
+    if settings.MULTI_LABEL:
+        multi = classify_multi(texts)
+        keys = [(labels[0], labels_to_mask(labels)) for labels in multi]
+    else:
+        labels, _ = classify_deduplicated(texts, classify_batch, 1.0)
+        keys = [(label, None) for label in labels]
+    groups = defaultdict(list)
+    for r, key in zip(rows, keys):
+        groups[key].append(r["id"])
+    return groups
+
+
+def _write(category: str, mask: int | None, ids: list[str], version: str):
+    values = {"category": category, "model_version": version}
+    if mask is not None:
+        values["labels_mask"] = mask
+    supabase.table("messages").update(values).in_("id", ids).execute()
+
+
+def main(page_size: int, concurrency: int, limit: int | None, dry_run: bool, include_legacy: bool = False):
+    version = model_version()
+    print(f"Re-classifying rows not labelled by model {version}…")
+    done, changed, start = 0, defaultdict(int), time.perf_counter()
+    pending = set()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for where in _stale_passes(version, include_legacy):
+            for page in iter_supabase_messages("id,message,category", page_size=page_size, where=where):
+                page = page[: limit - done] if limit else page
+                for (cat, mask), ids in _updates(page, version).items():
+                    changed[cat] += len(ids)
+                    if dry_run:
+                        continue
+                    for i in range(0, len(ids), IDS_PER_UPDATE):
+                        # bounded in-flight writes: classification of the next page
+                        # overlaps the updates of this one without unbounded queueing
+                        if len(pending) >= concurrency * 2:
+                            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            for f in finished:
+                                f.result()
+                        pending.add(pool.submit(_write, cat, mask, ids[i:i + IDS_PER_UPDATE], version))
+                done += len(page)
+                rate = done / (time.perf_counter() - start)
+                print(f"Progress: {done} rows ({rate:.0f} rows/s)")
+                if limit and done >= limit:
+                    break
+            if limit and done >= limit:
+                break
+        for f in wait(pending).done:
+            f.result()
+
+    print(f"\n✅ {'Would re-label' if dry_run else 'Re-labelled'} {done} rows with model {version} "
+          f"in {time.perf_counter() - start:.1f}s")
+    for cat, n in sorted(changed.items(), key=lambda kv: -kv[1]):
+        print(f"  {cat}: {n}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--page-size", type=int, default=1000, help="rows per fetch and model call")
+    p.add_argument("--concurrency", type=int, default=4, help="parallel UPDATE requests")
+    p.add_argument("--limit", type=int, help="stop after this many rows")
+    p.add_argument("--dry-run", action="store_true", help="classify but do not write")
+    p.add_argument("--include-legacy", action="store_true",
+                   help="also re-label rows marked 'legacy' by 007_legacy_model_versions.sql")
+    args = p.parse_args()
+    main(args.page_size, args.concurrency, args.limit, args.dry_run, args.include_legacy)
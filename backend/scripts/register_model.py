@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Add a trained classifier directory to the local model registry.
+
+    python scripts/register_model.py distilbert-classifier-saved            # id = content hash
+    python scripts/register_model.py out/ --version 2025-06-retrain --notes "more KYC data"
+    python scripts/register_model.py out/ --activate   # running workers swap within MODEL_REGISTRY_POLL_SECONDS
+    python scripts/register_model.py --list
+
+A live swap on one worker: POST /api/v1/admin/models/<id>/activate.
+"""
+import argparse
+
+from app.config import settings
+from app.services import model_registry
+
+
+def main(src: str | None, version: str | None, notes: str | None, activate: bool, list_only: bool):
+    if list_only or not src:
+        active = model_registry.active_version()
+        for v, meta in model_registry.manifest()["versions"].items():
+            print(f"{'*' if v == active else ' '} {v:<24} {meta['created_at']}  {meta.get('notes') or ''}")
+        return
+    version = model_registry.register(src, version, notes)
+    print(f"Registered {src} as {version} in {settings.MODEL_REGISTRY_DIR}")
+    if activate:
+        model_registry.set_active(version)
+        print(f"ACTIVE → {version}")
+    else:
+        print(f"Activate with --activate or POST /api/v1/admin/models/{version}/activate")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("src", nargs="?", help="directory written by save_pretrained()")
+    p.add_argument("--version", help="default: content hash of the directory")
+    p.add_argument("--notes")
+    p.add_argument("--activate", action="store_true", help="point ACTIVE at the new version")
+    p.add_argument("--list", action="store_true", help="show registered versions")
+    args = p.parse_args()
+    main(args.src, args.version, args.notes, args.activate, args.list)
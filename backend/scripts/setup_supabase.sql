@@ -6,5 +6,11 @@ create table if not exists messages (
   source text check (source in ('livechat','telegram')),
   message text,
   category text,
+  labels_mask smallint,  -- multi-label bitmask, bit i = LABELS[i]
+  model_version text,    -- classifier hash that set category; 'manual' if supplied
   created_at timestamptz default now()
-);
\ No newline at end of file
+);
+
+-- upgrade existing tables
+alter table messages add column if not exists labels_mask smallint;
+alter table messages add column if not exists model_version text;
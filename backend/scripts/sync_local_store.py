@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Mirror Supabase `messages` into the local Parquet/DuckDB analytics store.
+
+Incremental by default: re-reads from the newest local timestamp minus a
+look-back window (to catch late inserts) and skips rows already on disk
+with the same labels; relabelled rows are written as the newer copy.
+
+    python scripts/sync_local_store.py            # incremental
+    python scripts/sync_local_store.py --full --compact
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from app.config import settings
+from app.reports import iter_supabase_messages
+from app.services import local_store
+
+
+def main(full: bool, lookback_hours: int, compact: bool):
+    since = None if full else local_store.max_timestamp()
+    if since is not None:
+        since -= timedelta(hours=lookback_hours)
+    print(f"Syncing messages since {since or 'the beginning'}…")
+
+    total, start = 0, time.perf_counter()
+    for page in iter_supabase_messages(start=since, page_size=5000):
+        local_store.append(page, skip_existing=True)
+        total += len(page)
+        print(f"Progress: {total} rows ({total / (time.perf_counter() - start):.0f} rows/s)")
+
+    if compact:
+        print(f"Compacted {local_store.compact()} part files")
+    print(f"\n✅ Synced {total} rows → {settings.LOCAL_STORE_DIR}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--full", action="store_true", help="ignore the local high-water mark")
+    p.add_argument("--lookback-hours", type=int, default=24)
+    p.add_argument("--compact", action="store_true", help="merge small Parquet parts per month")
+    args = p.parse_args()
+    main(args.full, args.lookback_hours, args.compact)
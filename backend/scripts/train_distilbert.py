@@ -1,5 +1,5 @@
-import re, argparse, pandas as pd, torch
-from datasets import Dataset
+import re, json, argparse, numpy as np, pandas as pd, torch
+from datasets import Dataset, Sequence, Value
 from evaluate import load as load_metric
 from transformers import (
     AutoTokenizer,
@@ -36,17 +36,43 @@ def weak_label(msg: str) -> str:
     return "other"
 
 
-def main(csv_path: str):
+def weak_labels_multi(msg: str) -> list[float]:
+    """Multi-hot target over LABELS – every matching pattern, else `other`."""
+    hot = [1.0 if re.search(PATTERNS[l], msg, re.I) else 0.0 for l in LABELS[:-1]]
+    return hot + [0.0 if any(hot) else 1.0]
+
+
+def tune_thresholds(probs: np.ndarray, targets: np.ndarray) -> dict:
+    """Pick the per-label threshold that maximises F1 on the training set."""
+    grid = np.linspace(0.1, 0.9, 17)
+    out = {}
+    for j, lab in enumerate(LABELS):
+        pred = probs[:, j][:, None] >= grid               # (n, len(grid)) in one pass
+        t = targets[:, j][:, None].astype(bool)
+        tp = (pred & t).sum(0)
+        f1 = 2 * tp / np.maximum(pred.sum(0) + t.sum(0), 1)
+        out[lab] = float(grid[f1.argmax()])
+    return out
+
+
+def main(csv_path: str, multi_label: bool = False):
     print("🔹 reading CSV")
     df = pd.read_csv(csv_path)
-    df["label"] = df["message"].apply(weak_label)
 
     label2id = {l: i for i, l in enumerate(LABELS)}
     id2label = {i: l for l, i in label2id.items()}
 
-    ds = Dataset.from_pandas(df[["message", "label"]]).map(
-        lambda x: {"label": label2id[x["label"]]}
-    )
+    if multi_label:
+        # BCEWithLogits wants float targets
+        df["label"] = df["message"].apply(weak_labels_multi)
+        ds = Dataset.from_pandas(df[["message", "label"]]).cast_column(
+            "label", Sequence(Value("float32"))
+        )
+    else:
+        df["label"] = df["message"].apply(weak_label)
+        ds = Dataset.from_pandas(df[["message", "label"]]).map(
+            lambda x: {"label": label2id[x["label"]]}
+        )
 
     tok = AutoTokenizer.from_pretrained("distilbert-base-uncased")
 
@@ -69,6 +95,7 @@ def main(csv_path: str):
         num_labels=len(LABELS),
         id2label=id2label,
         label2id=label2id,
+        problem_type="multi_label_classification" if multi_label else "single_label_classification",
     )
 
     args = TrainingArguments(
@@ -95,7 +122,7 @@ def main(csv_path: str):
         model,
         args,
         train_dataset=ds,
-        compute_metrics=compute,
+        compute_metrics=None if multi_label else compute,
         # data_collator=collator,      # enable if you comment out padding="max_length"
     )
 
@@ -105,12 +132,25 @@ def main(csv_path: str):
     #print(f"✅  finished – train accuracy ≈ {acc:.3f}")
     print(f"✅  finished – model trained")
 
-    model.save_pretrained("distilbert-classifier")
-    tok.save_pretrained("distilbert-classifier")
-    print("📦 saved directory: distilbert-classifier/")
+    out_dir = "distilbert-classifier-multilabel" if multi_label else "distilbert-classifier"
+    model.save_pretrained(out_dir)
+    tok.save_pretrained(out_dir)
+
+    if multi_label:
+        logits = trainer.predict(ds).predictions
+        probs = 1 / (1 + np.exp(-logits))
+        thresholds = tune_thresholds(probs, np.array(df["label"].tolist()))
+        with open(f"{out_dir}/thresholds.json", "w") as f:
+            json.dump(thresholds, f, indent=2)
+        print(f"🔹 per-label thresholds: {thresholds}")
+
+    print(f"📦 saved directory: {out_dir}/")
 
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("csv")
-    main(ap.parse_args().csv)
+    ap.add_argument("--multi-label", action="store_true",
+                    help="sigmoid head + per-label thresholds instead of softmax")
+    a = ap.parse_args()
+    main(a.csv, a.multi_label)
@@ -0,0 +1,38 @@
+"""Offline test settings: no Supabase, every local file in a throw-away directory."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="tests-")
+# settings are read at import time – set them before anything imports app.config
+os.environ.setdefault("SUPABASE_URL", "http://localhost:1")
+os.environ.setdefault("SUPABASE_KEY", "offline")
+os.environ.update(
+    ROLLUP_WARMUP="false",
+    EMBED_ON_INGEST="false",
+    HEAVY_HITTERS_SYNC_SECONDS="0",
+    MIRROR_PATH=f"{_TMP}/mirror.csv",
+    USER_SKETCH_PATH=f"{_TMP}/users.npz",
+    HEAVY_HITTERS_PATH=f"{_TMP}/heavy_hitters.npz",
+    CLASSIFY_QUEUE_PATH=f"{_TMP}/jobs.sqlite",
+    EMBEDDING_INDEX_DIR=f"{_TMP}/embeddings",
+    LOCAL_STORE_DIR=f"{_TMP}/store",
+    SEARCH_INDEX_DIR=f"{_TMP}/search_index",
+)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # `app` and `benchmarks`
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """reports.supabase backed by 500 synthetic rows; returns the fake."""
+    from app import reports
+    from benchmarks import synthetic
+    from benchmarks.fake_supabase import FakeSupabase
+
+    fake = FakeSupabase(synthetic.messages(500))
+    monkeypatch.setattr(reports, "supabase", fake)
+    monkeypatch.setattr(reports.settings, "ANALYTICS_BACKEND", "supabase")
+    return fake
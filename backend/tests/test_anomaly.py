@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import rollups
+from app.services.anomaly import AnomalyDetector, Series, score_counts
+from app.services.hll import UserSketches
+
+
+def _daily(counts):
+    return [(datetime(2025, 1, 1) + timedelta(days=i), n) for i, n in enumerate(counts)]
+
+
+# ── robust (median / MAD) scoring ─────────────────────────────────────────
+def test_spike_is_scored_against_median_and_mad():
+    found = score_counts(_daily([10, 12, 9, 11, 10, 8, 12, 10, 30, 10]))
+    assert [a["date"] for a in found] == ["2025-01-09"]
+    spike = found[0]
+    assert spike["count"] == 30 and spike["expected"] == 10.0
+    # median 10, MAD 1 → scale 1.4826
+    assert spike["score"] == round((30 - 10) / 1.4826, 2)
+
+
+def test_one_spike_does_not_mask_the_next():
+    # a mean / std baseline would absorb the first spike and miss the second
+    found = score_counts(_daily([10, 11, 9, 10, 10, 11, 9, 200, 10, 11, 9, 10, 40]))
+    assert [a["date"] for a in found] == ["2025-01-08", "2025-01-13"]
+
+
+def test_flat_baseline_falls_back_to_poisson_scale():
+    # MAD is 0: the scale becomes sqrt(median) = 3, so 20 is a spike (z 3.67), 19 is not
+    assert score_counts(_daily([9] * 7 + [20]))[0]["score"] == round(11 / 3, 2)
+    assert score_counts(_daily([9] * 7 + [19])) == []
+
+
+def test_no_score_before_min_periods_and_gaps_count_as_zero():
+    assert score_counts(_daily([1, 1, 1, 50])) == []
+    s = Series("day", window=28, threshold=3.5, min_periods=7)
+    s.observe(datetime(2025, 1, 1), 5)
+    s.observe(datetime(2025, 1, 4), 5)        # two empty days in between
+    assert list(s.history) == [5, 0, 0]
+    s.observe(datetime(2025, 1, 2), 3)        # late row patches the closed bucket
+    assert list(s.history) == [5, 3, 0]
+
+
+# ── catch-up of rows stored elsewhere ─────────────────────────────────────
+
+
+def _day_count(detector: AnomalyDetector, day: str) -> int:
+    s = detector._series[("day", "*", "*")]
+    assert s.bucket.strftime("%Y-%m-%d") == day
+    return s.count
+
+
+@pytest.fixture
+def fresh_rollups(fake_supabase, monkeypatch):
+    detector = AnomalyDetector()
+    monkeypatch.setattr(rollups, "detector", detector)
+    monkeypatch.setattr(rollups, "user_sketches", UserSketches())
+    monkeypatch.setattr(rollups, "_mark", None)
+    monkeypatch.setattr(rollups, "_counted", {})
+    rollups.warm_up()
+    return detector
+
+
+def test_catch_up_counts_rows_other_workers_stored_once(fake_supabase, fresh_rollups):
+    stored = fake_supabase.table("messages").insert([
+        {"id_user": 7, "timestamp": "2030-01-01T09:00:00+00:00", "message": "hi",
+         "category": "bonus", "source": "telegram"} for _ in range(5)
+    ]).execute().data
+    rollups.observe(stored[:2])   # this worker's ingest
+    rollups.catch_up()            # the rest: other workers, scripts
+    rollups.catch_up()
+    rollups.observe(stored[2:3])  # e.g. a worker's late hand-off of a row already caught up on
+    assert _day_count(fresh_rollups, "2030-01-01") == 5
+
+
+def test_catch_up_leaves_unlabelled_rows_to_the_worker(fake_supabase, fresh_rollups):
+    stored = fake_supabase.table("messages").insert([
+        {"id_user": 7, "timestamp": "2030-01-01T09:00:00+00:00", "message": "hi", "source": "telegram"}
+    ]).execute().data
+    rollups.catch_up()
+    assert fresh_rollups._series[("day", "*", "*")].bucket.year < 2030
+    rollups.observe([{**stored[0], "category": "bonus"}])   # labelled by the classification worker
+    assert _day_count(fresh_rollups, "2030-01-01") == 1
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+from app.api.v1.endpoints import chatbot
+from app.models import ChatRequest
+from app.services.heavy_hitters import HeavyHitters
+
+RANGE = (datetime(2024, 1, 1), datetime(2025, 1, 31))
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, 30), ("", 30), ("a week", 30), ([7], 30), (float("nan"), 30),
+    (7, 7), ("7", 7), (7.9, 7), ("1e9", 365), (-3, 1), (0, 1),
+])
+def test_int_arg_parses_and_clamps_llm_values(value, expected):
+    assert chatbot._int_arg(value, 30, 1, 365) == expected
+
+
+def test_top_facts_survives_malformed_arguments(monkeypatch):
+    monkeypatch.setattr(chatbot, "heavy_hitters", HeavyHitters())
+    period, facts, context = chatbot._top_facts({"by": "robots", "days_back": "lots", "limit": None}, RANGE)
+    assert period.startswith("January 01, 2025") and period.endswith("January 31, 2025")
+    assert "No user counts recorded" in facts
+    assert context.startswith("Top 0 users")
+
+
+def test_filter_sets_fall_back_to_defaults():
+    sets = chatbot._parse_filter_sets({"filter_sets": [
+        {"category": "bonus", "days_back": "x", "label": "bonus"},
+        "not a dict",
+        {"source": "telegram", "days_back": 9999, "offset_days": -5},
+    ]})
+    assert sets == [(("bonus", None, 30, 0), "bonus"), ((None, "telegram", 365, 0), None)]
+    assert chatbot._parse_filter_sets({}) == [((None, None, 30, 0), None)]
+
+
+def test_window_is_clamped_to_the_data():
+    assert chatbot._window((None, None, 30, 0), RANGE) == (datetime(2025, 1, 1), datetime(2025, 1, 31))
+    assert chatbot._window((None, None, 9999, 0), RANGE)[0] == RANGE[0]
+
+
+def test_overlapping_windows_share_one_scan():
+    sets = [("bonus", None, 30, 0), ("bonus", None, 7, 0), (None, None, 7, 100)]
+    windows, scans = chatbot._plan_scans(sets, RANGE)
+    assert len(windows) == 3
+    assert sorted(sorted(idxs) for *_, idxs in scans) == [[0, 1], [2]]
+
+
+# ── speculative fetch accounting ──────────────────────────────────────────
+class _LLM:
+    """Answers the filter-extraction call with `first`, every later call with text."""
+
+    def __init__(self, first):
+        self.calls, self.first = 0, first
+
+    async def chat(self, prompt, history=None, tools=None):
+        self.calls += 1
+        return self.first if self.calls == 1 else "An answer."
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    stats = {"attempts": 0, "hits": 0, "misses": 0, "saved_seconds": 0.0}
+    gathered = []
+
+    def fake_gather(filters, data_range, cancelled=None):
+        gathered.append(filters)
+        return {"start": RANGE[0], "end": RANGE[1], "stats": None, "seconds": 0.25}
+
+    async def fake_gather_sets(sets, data_range):
+        return [{"start": RANGE[0], "end": RANGE[1], "stats": None} for _ in sets]
+
+    monkeypatch.setattr(chatbot, "_speculation", stats)
+    monkeypatch.setattr(chatbot, "_memory", {})
+    monkeypatch.setattr(chatbot, "_data_range", lambda: RANGE)
+    monkeypatch.setattr(chatbot, "_gather", fake_gather)
+    monkeypatch.setattr(chatbot, "_gather_sets", fake_gather_sets)
+    monkeypatch.setattr(chatbot, "heavy_hitters", HeavyHitters())
+    monkeypatch.setattr(chatbot.settings, "CHAT_SPECULATIVE_FETCH", True)
+    return stats
+
+
+def _ask(text, llm):
+    return asyncio.run(chatbot.chat(ChatRequest(message=text), svc=llm))
+
+
+def _filter_call(**args):
+    return {"tool_call": {"name": "filter_messages", "arguments": {"filter_sets": [args]}}}
+
+
+def test_speculative_guess_that_matches_is_a_hit(speculation):
+    _ask("bonus messages in the last 7 days", _LLM(_filter_call(category="bonus", days_back=7)))
+    assert speculation["attempts"] == speculation["hits"] == 1 and speculation["misses"] == 0
+    assert speculation["saved_seconds"] > 0
+    _ask("and telegram only?", _LLM({"content": "no tool call"}))   # regex guess, filled from memory
+    assert (speculation["attempts"], speculation["hits"]) == (2, 2)
+
+
+def test_speculative_guess_that_differs_is_a_miss(speculation):
+    _ask("bonus messages in the last 7 days", _LLM(_filter_call(category="withdraw", days_back=7)))
+    assert (speculation["attempts"], speculation["hits"], speculation["misses"]) == (1, 0, 1)
+    assert speculation["saved_seconds"] == 0
+
+
+def test_top_questions_do_not_speculate(speculation):
+    _ask("who are the top users this week?", _LLM(None))
+    assert speculation["attempts"] == 0
+
+
+def test_failed_filter_extraction_cancels_the_prefetch(speculation, monkeypatch):
+    started, finished, seen = threading.Event(), threading.Event(), []
+
+    def slow_gather(filters, data_range, cancelled=None):
+        started.set()
+        seen.append(cancelled.wait(timeout=5))
+        finished.set()
+
+    class _Failing:
+        async def chat(self, prompt, history=None, tools=None):
+            await asyncio.to_thread(started.wait, 5)
+            raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(chatbot, "_gather", slow_gather)
+    with pytest.raises(RuntimeError):
+        _ask("bonus messages in the last 7 days", _Failing())
+    assert finished.wait(timeout=5) and seen == [True]
+    assert speculation["attempts"] == 0
@@ -0,0 +1,31 @@
+from app.ml.dedup import classify_deduplicated, cluster, normalize
+
+
+def test_normalize_ignores_case_punctuation_and_spacing():
+    assert normalize("Where is  my BONUS?!") == normalize("where is my bonus")
+
+
+def test_exact_repeats_share_the_first_index():
+    texts = ["hello", "Hello!", "other", "hello"]
+    assert cluster(texts, threshold=1.0).tolist() == [0, 0, 2, 0]
+
+
+def test_near_duplicates_cluster_and_distinct_texts_do_not():
+    base = "my withdrawal has been pending for three days and support does not answer"
+    texts = [base, base + " please", "the slot game froze during a free spin"]
+    reps = cluster(texts, threshold=0.7).tolist()
+    assert reps[0] == reps[1] == 0
+    assert reps[2] == 2
+
+
+def test_classify_deduplicated_calls_the_model_once_per_cluster():
+    calls = []
+
+    def classify(batch):
+        calls.append(list(batch))
+        return [f"label:{t}" for t in batch]
+
+    labels, stats = classify_deduplicated(["a b c d", "A b c d!", "x y z w"], classify, threshold=1.0)
+    assert calls == [["a b c d", "x y z w"]]
+    assert labels == ["label:a b c d", "label:a b c d", "label:x y z w"]
+    assert stats["messages"] == 3 and stats["clusters"] == 2 and stats["collapsed"] == 1
@@ -0,0 +1,67 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from app import export
+
+COLUMNS = list(export.EXPORT_COLUMNS)
+
+
+def _pages():
+    rows = [{"id": f"id{i}", "id_user": i, "timestamp": datetime(2025, 1, 1, 10, i),   # naive UTC, as DuckDB
+             "source": "telegram", "message": f'say "hi", {i}\nbye', "category": "bonus",
+             "labels_mask": None if i % 2 else 3, "created_at": f"2025-01-02T00:00:0{i}+00:00"}
+            for i in range(5)]
+    return [rows[:2], rows[2:], []]
+
+
+def _body(fmt, gz=False, columns=COLUMNS, pages=None):
+    return b"".join(export.encode(iter(_pages() if pages is None else pages), fmt, columns, gz))
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_csv_round_trip(gz):
+    body = _body("csv", gz)
+    rows = list(csv.DictReader(io.StringIO((gzip.decompress(body) if gz else body).decode())))
+    assert len(rows) == 5 and list(rows[0]) == COLUMNS
+    assert rows[1]["message"] == 'say "hi", 1\nbye'
+    assert rows[0]["timestamp"] == "2025-01-01T10:00:00+00:00"
+    assert rows[1]["labels_mask"] == "" and rows[0]["labels_mask"] == "3"
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_ndjson_round_trip(gz):
+    body = _body("ndjson", gz)
+    rows = [json.loads(line) for line in (gzip.decompress(body) if gz else body).decode().splitlines()]
+    assert [r["id"] for r in rows] == [f"id{i}" for i in range(5)]
+    assert rows[3] == {"id": "id3", "id_user": 3, "timestamp": "2025-01-01T10:03:00+00:00", "source": "telegram",
+                       "message": 'say "hi", 3\nbye', "category": "bonus", "labels_mask": None,
+                       "created_at": "2025-01-02T00:00:03+00:00"}
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_parquet_round_trip(gz):
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pq.read_table(io.BytesIO(_body("parquet", gz)))
+    assert table.column_names == COLUMNS and table.num_rows == 5
+    meta = pq.ParquetFile(io.BytesIO(_body("parquet", gz))).metadata
+    assert meta.num_row_groups == 3   # one per page
+    assert meta.row_group(0).column(0).compression == ("GZIP" if gz else "ZSTD")
+    rows = table.to_pylist()
+    assert rows[4]["timestamp"] == datetime(2025, 1, 1, 10, 4, tzinfo=timezone.utc)
+    assert rows[4]["created_at"] == datetime(2025, 1, 2, 0, 0, 4, tzinfo=timezone.utc)
+    assert [r["labels_mask"] for r in rows] == [3, None, 3, None, 3]
+
+
+def test_empty_exports_and_column_subsets():
+    assert _body("csv", pages=[]) == b"id,id_user,timestamp,source,message,category,labels_mask,created_at\r\n"
+    assert _body("ndjson", pages=[]) == b""
+    assert gzip.decompress(_body("ndjson", True, pages=[])) == b""
+    assert _body("csv", columns=["id", "category"]).decode().splitlines()[:2] == ["id,category", "id0,bonus"]
+    assert export.filename("csv", True) == "messages.csv.gz" and export.filename("parquet", True) == "messages.parquet"
+    assert export.media_type("ndjson", True) == "application/gzip"
+    assert export.media_type("parquet", True) == "application/vnd.apache.parquet"
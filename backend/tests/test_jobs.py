@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+import pytest
+
+from app.services import jobs
+
+
+@pytest.fixture
+def path(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs.settings, "CLASSIFY_LEASE_SECONDS", 300.0)
+    monkeypatch.setattr(jobs.settings, "CLASSIFY_MAX_ATTEMPTS", 3)
+    return str(tmp_path / "jobs.sqlite")
+
+
+def _claim(queue, n=10):
+    return [jid for jid, _ in queue.claim(n)]
+
+
+def test_enqueue_is_idempotent_per_message(path):
+    q = jobs.JobQueue(path)
+    q.enqueue([{"id": "a"}, {"id": "b"}])
+    q.enqueue([{"id": "a"}])
+    assert q.stats()["depth"] == 2
+    assert [row for _, row in q.claim(10)] == [{"id": "a"}, {"id": "b"}]
+
+
+def test_restart_keeps_live_workers_claims(path):
+    live, restarted = jobs.JobQueue(path), jobs.JobQueue(path)
+    live.enqueue([{"id": str(i)} for i in range(4)])
+    assert _claim(live, 2) == [1, 2]
+    restarted.release_stale()
+    assert _claim(restarted) == [3, 4]
+
+
+def test_expired_leases_are_claimed_again(path, monkeypatch):
+    dead, other = jobs.JobQueue(path), jobs.JobQueue(path)
+    dead.enqueue([{"id": "a"}])
+    assert _claim(dead) == [1]
+    assert _claim(other) == []
+    monkeypatch.setattr(jobs.settings, "CLASSIFY_LEASE_SECONDS", 0.01)
+    time.sleep(0.05)
+    assert _claim(other) == [1]
+
+
+def test_release_stale_frees_only_expired_claims(path, monkeypatch):
+    crashed = jobs.JobQueue(path)
+    crashed.enqueue([{"id": "a"}, {"id": "b"}])
+    assert _claim(crashed, 1) == [1]
+    restarted = jobs.JobQueue(path)
+    restarted.release_stale()
+    assert restarted.stats()["in_flight"] == 1   # indistinguishable from a live worker's claim
+    monkeypatch.setattr(jobs.settings, "CLASSIFY_LEASE_SECONDS", 0.01)
+    time.sleep(0.05)
+    restarted.release_stale()
+    assert restarted.stats()["in_flight"] == 0 and restarted.stats()["depth"] == 2
+
+
+def test_failures_retry_then_dead_letter(path):
+    q = jobs.JobQueue(path)
+    q.enqueue([{"id": "poison"}])
+    for _ in range(3):
+        ids = _claim(q)
+        assert ids == [1]
+        q.fail(ids, "model exploded")
+    assert _claim(q) == []
+    stats = q.stats()
+    assert stats["dead_letter"] == 1 and stats["depth"] == 0 and stats["in_flight"] == 0
+    error, = sqlite3.connect(path).execute("SELECT error FROM jobs").fetchone()
+    assert error == "model exploded"
+
+
+def test_only_the_owner_can_release_or_fail(path):
+    owner, other = jobs.JobQueue(path), jobs.JobQueue(path)
+    owner.enqueue([{"id": "a"}])
+    ids = _claim(owner)
+    other.fail(ids, "not mine")
+    other.release(ids)
+    assert owner.stats()["in_flight"] == 1
+
+
+def test_shutdown_release_is_not_an_attempt(path):
+    q = jobs.JobQueue(path)
+    q.enqueue([{"id": "a"}])
+    for _ in range(5):
+        q.release(_claim(q))
+    assert _claim(q) == [1]
+
+
+def test_old_queue_files_gain_the_new_columns(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, message_id TEXT UNIQUE, "
+                 "row TEXT NOT NULL, enqueued_at REAL NOT NULL, claimed_at REAL, attempts INTEGER DEFAULT 0)")
+    conn.execute("INSERT INTO jobs (message_id, row, enqueued_at) VALUES ('a', '{}', 0)")
+    conn.commit()
+    q = jobs.JobQueue(path)
+    assert _claim(q) == [1]
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+
+from app import reports
+
+
+def _ids(pages):
+    return [r["id"] for page in pages for r in page]
+
+
+def test_pages_cover_every_row_once_in_timestamp_id_order(fake_supabase):
+    pages = list(reports.iter_supabase_messages("id,category", page_size=64))
+    rows = [r for page in pages for r in page]
+    assert len(rows) == 500 and len(set(_ids(pages))) == 500
+    assert [(r["timestamp"], r["id"]) for r in rows] == sorted((r["timestamp"], r["id"]) for r in rows)
+    assert all(len(p) == 64 for p in pages[:-1])
+    assert set(rows[0]) == {"id", "category", "timestamp"}   # keyset columns are added
+
+
+def test_rows_sharing_a_timestamp_straddle_pages(fake_supabase):
+    same = [{"id_user": 1, "timestamp": "2030-01-01T00:00:00+00:00", "message": "x", "source": "telegram"}
+            for _ in range(10)]
+    fake_supabase.table("messages").insert(same).execute()
+    ids = _ids(reports.iter_supabase_messages("id", start=datetime(2030, 1, 1, tzinfo=timezone.utc), page_size=3))
+    assert len(ids) == 10 and ids == sorted(ids)
+
+
+def test_filters_and_where_apply_to_every_page(fake_supabase):
+    pages = reports.iter_supabase_messages("id,category,source", category="bonus,deposit", page_size=50,
+                                           where=lambda q: q.eq("source", "telegram"))
+    rows = [r for page in pages for r in page]
+    assert rows and all(r["category"] in ("bonus", "deposit") and r["source"] == "telegram" for r in rows)
+    everything = reports.fetch_messages("bonus,deposit", "telegram", None, None, columns="id,timestamp")
+    assert len(rows) == len(everything)
+
+
+def test_created_after_finds_late_rows_with_old_timestamps(fake_supabase):
+    newest = max(r["created_at"] for page in reports.iter_created_after("created_at", None) for r in page)
+    stored = fake_supabase.table("messages").insert(
+        [{"id_user": 1, "timestamp": "2024-02-01T00:00:00+00:00", "message": "late", "source": "telegram"}]
+    ).execute().data
+    after = datetime.fromisoformat(newest)
+    assert _ids(reports.iter_created_after("id", after)) == [stored[0]["id"]]
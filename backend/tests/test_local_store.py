@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from app.services import local_store  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store.settings, "LOCAL_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(local_store.settings, "LOCAL_STORE_FLUSH_ROWS", 1_000_000)
+    monkeypatch.setattr(local_store, "_buffer", [])
+    return local_store
+
+
+def _rows(n: int, category: str = "bonus"):
+    return [{"id": f"id{i:03d}", "id_user": i % 7, "timestamp": f"2025-01-{1 + i % 28:02d}T10:00:00+00:00",
+             "source": "telegram", "message": "m", "category": category, "labels_mask": None,
+             "created_at": "2025-02-01T00:00:00+00:00"} for i in range(n)]
+
+
+def _totals(store, category=None, start=None, end=None):
+    m = store.basic_metrics(category, None, start, end)
+    return m["total_messages"], m["categories"]
+
+
+def test_sync_rerun_writes_nothing(store):
+    store.append(_rows(50), skip_existing=True)
+    store.append(_rows(50), skip_existing=True)
+    assert len(store.part_files()) == 1
+    assert _totals(store) == (50, {"bonus": 50})
+
+
+def test_copies_in_several_parts_count_once(store):
+    store.append(_rows(50), skip_existing=True)
+    store.append(_rows(10))
+    store.flush()                                  # the same ids again, from ingest
+    assert len(store.part_files()) == 2
+    assert _totals(store) == (50, {"bonus": 50})
+    assert len(store.fetch(None, None, None, None)) == 50
+    assert sum(len(p) for p in store.iter_pages()) == 50
+
+
+def test_newest_copy_wins_for_reads_and_filters(store):
+    store.append(_rows(50), skip_existing=True)
+    store.append(_rows(5, category="withdraw"), skip_existing=True)   # relabelled upstream
+    assert _totals(store) == (50, {"bonus": 45, "withdraw": 5})
+    assert _totals(store, "bonus")[0] == 45
+    store.append([{**_rows(1)[0], "category": "deposit"}])           # buffered beats every part
+    assert _totals(store)[1] == {"bonus": 45, "deposit": 1, "withdraw": 4}
+    assert _totals(store, start=datetime(2025, 1, 2), end=datetime(2025, 1, 3))[0] == 2
+
+
+def test_compaction_keeps_the_newest_copy(store):
+    store.append(_rows(50), skip_existing=True)
+    store.append(_rows(5, category="withdraw"), skip_existing=True)
+    assert store.compact() == 2
+    assert len(store.part_files()) == 1
+    assert _totals(store) == (50, {"bonus": 45, "withdraw": 5})
+
+
+def test_probes(store):
+    assert not store.any_rows(None, None, None, None)
+    store.append(_rows(30))
+    assert store.any_rows("bonus", "telegram", None, None)
+    assert not store.any_rows("withdraw", None, None, None)
+    assert store.edge_timestamp(latest=True).day == 28
+    assert store.edge_timestamp(latest=False, end=datetime(2025, 1, 5)).day == 1
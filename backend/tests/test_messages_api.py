@@ -0,0 +1,93 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import messages
+
+
+@pytest.fixture
+def client(fake_supabase, monkeypatch):
+    stored = []
+    monkeypatch.setattr(messages, "_post_ingest", lambda rows, background: stored.extend(rows))
+    app = FastAPI()
+    app.include_router(messages.router, prefix="/messages")
+    c = TestClient(app)
+    c.stored = stored
+    return c
+
+
+def _item(i, **kw):
+    return {"id_user": i + 1, "timestamp": "2025-01-01T10:00:00+00:00", "source": "telegram",
+            "message": f"where is my bonus {i}", "category": "bonus", **kw}
+
+
+# ── POST /bulk ────────────────────────────────────────────────────────────
+def test_bulk_reports_each_item_in_order(client):
+    items = [_item(0), _item(1, id_user=0), {"message": "no fields"}, _item(3, category="deposit")]
+    r = client.post("/messages/bulk", json=items)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["received"], body["inserted"], body["failed"]) == (4, 2, 2)
+    assert [it["index"] for it in body["items"]] == [0, 1, 2, 3]
+    assert [it["status"] for it in body["items"]] == ["inserted", "invalid", "invalid", "inserted"]
+    assert body["items"][3]["category"] == "deposit" and body["items"][0]["id"]
+    assert "id_user" in body["items"][1]["error"]
+    assert [row["model_version"] for row in client.stored] == ["manual", "manual"]
+
+
+def test_bulk_accepts_ndjson(client):
+    lines = [json.dumps(_item(0)), "", "{not json", json.dumps(_item(2))]
+    r = client.post("/messages/bulk", content="\n".join(lines) + "\n",
+                    headers={"content-type": "application/x-ndjson"})
+    body = r.json()
+    assert body["received"] == 3   # blank lines are skipped
+    assert [it["status"] for it in body["items"]] == ["inserted", "invalid", "inserted"]
+    assert len(client.stored) == 2
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_bulk_rejects_more_than_the_item_limit(client, monkeypatch, ndjson):
+    monkeypatch.setattr(messages.settings, "BULK_MAX_ITEMS", 2)
+    items = [_item(i) for i in range(3)]
+    if ndjson:
+        r = client.post("/messages/bulk", content="\n".join(json.dumps(i) for i in items),
+                        headers={"content-type": "application/x-ndjson"})
+    else:
+        r = client.post("/messages/bulk", json=items)
+    assert r.status_code == 413
+    assert client.stored == []
+    assert client.post("/messages/bulk", json=items[:2]).json()["inserted"] == 2
+
+
+def test_bulk_rejects_a_body_that_is_not_an_array(client):
+    assert client.post("/messages/bulk", json={"message": "hi"}).status_code == 400
+    assert client.post("/messages/bulk", content=b"[1,", headers={"content-type": "application/json"}).status_code == 400
+
+
+# ── ETag / 304 ────────────────────────────────────────────────────────────
+class _Dimensions:
+    def __init__(self):
+        self.categories = ["bonus", "deposit"]
+
+    def snapshot(self):
+        return {"categories": self.categories, "sources": ["telegram"]}
+
+
+def test_unchanged_lists_answer_304(client, monkeypatch):
+    dims = _Dimensions()
+    monkeypatch.setattr(messages, "dimensions", dims)
+    first = client.get("/messages/categories")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json() == ["bonus", "deposit"]
+    assert first.headers["cache-control"] == "public, max-age=60"
+
+    again = client.get("/messages/categories", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert client.get("/messages/categories", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    assert client.get("/messages/sources", headers={"If-None-Match": etag}).status_code == 200
+
+    dims.categories = ["bonus", "deposit", "withdraw"]
+    changed = client.get("/messages/categories", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
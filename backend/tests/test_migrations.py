@@ -0,0 +1,118 @@
+"""The JSON the SQL functions in scripts/migrations return vs. what the app reads."""
+import inspect
+import re
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app import reports
+from app.services.dimensions import Dimensions
+
+MIGRATIONS = Path(__file__).resolve().parents[1] / "scripts" / "migrations"
+
+
+def _dimension_keys(name: str) -> set:
+    sql = (MIGRATIONS / name).read_text()
+    body = sql[sql.index("create or replace function message_dimensions()"):]
+    return set(re.findall(r"'(\w+)',\s+\(", body))
+
+
+def _function_args(name: str, fn: str) -> set:
+    sql = (MIGRATIONS / name).read_text()
+    head = sql[sql.index(f"create or replace function {fn}("):]
+    head = head[:head.index("\nreturns")]
+    return set(re.findall(r"^\s+(\w+)\s+\w", head, re.M))
+
+
+class _Rpc:
+    def __init__(self, data):
+        self.data = data
+
+    def rpc(self, fn, params=None):
+        assert fn == "message_dimensions"
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=self.data))
+
+
+V003 = {"categories": ["bonus", "deposit"], "sources": ["telegram"],
+        "first": "2024-01-01T00:00:00+00:00", "last": "2025-01-01T00:00:00+00:00"}
+V005 = {**V003, "category_counts": {"bonus": 3, "deposit": 2}, "source_counts": {"telegram": 5}, "total": 5}
+
+
+def test_migration_keys_match_the_shapes_dimensions_reads():
+    assert _dimension_keys("003_message_dimensions.sql") == set(V003)
+    assert _dimension_keys("005_message_dimension_counts.sql") == set(V005)
+
+
+def test_fake_supabase_returns_the_005_shape(fake_supabase):
+    assert set(fake_supabase.rpc("message_dimensions").execute().data) == set(V005)
+
+
+@pytest.fixture
+def dims(monkeypatch):
+    monkeypatch.setattr(Dimensions, "_stale", lambda self: self.loaded_at is None)
+    return Dimensions()
+
+
+def test_005_counts_are_used(dims, monkeypatch):
+    monkeypatch.setattr(reports, "supabase", _Rpc(V005))
+    assert dims.count("bonus") == 3 and dims.count(source="telegram") == 5 and dims.count() == 5
+    snap = dims.snapshot()
+    assert snap["categories"] == ["bonus", "deposit"] and snap["total"] == 5
+    assert snap["first"].year == 2024 and snap["first"].tzinfo is not None
+
+
+def test_003_shape_lists_values_but_counts_are_unknown(dims, monkeypatch):
+    monkeypatch.setattr(reports, "supabase", _Rpc(V003))
+    assert dims.count("bonus") is None and dims.count() is None   # never a false zero
+    snap = dims.snapshot()
+    assert snap["categories"] == ["bonus", "deposit"] and snap["sources"] == ["telegram"]
+    assert snap["category_counts"] is None and snap["total"] is None
+
+
+def test_search_rpc_arguments_exist_in_every_definition():
+    sent = set(re.findall(r'"(\w+)":', inspect.getsource(reports.search_messages).split("supabase.rpc")[1]
+                          .split("}).execute()")[0]))
+    assert sent == _function_args("009_messages_search_partial_phrases.sql", "search_messages")
+    for name in ("004_messages_search.sql", "008_messages_search_expression_index.sql"):
+        assert sent - {"excluded_terms"} == _function_args(name, "search_messages"), name
+
+
+class _SearchRpc:
+    def __init__(self):
+        self.params = None
+
+    def rpc(self, fn, params=None):
+        self.params = params
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[]))
+
+
+@pytest.mark.parametrize("q, terms, excluded", [
+    ('"piggy bank"', ["piggy bank"], []),
+    ('deposit "game froze" -bonus', ["deposit", "game froze"], ["bonus"]),
+])
+def test_partial_search_sends_phrases_and_exclusions(monkeypatch, q, terms, excluded):
+    fake = _SearchRpc()
+    monkeypatch.setattr(reports, "supabase", fake)
+    monkeypatch.setattr(reports.settings, "ANALYTICS_BACKEND", "supabase")
+    reports.search_messages(q, partial=True)
+    assert fake.params["partial_terms"] == terms and fake.params["excluded_terms"] == excluded
+    reports.search_messages(q)
+    assert fake.params["partial_terms"] is None and fake.params["excluded_terms"] is None
+
+
+@pytest.mark.parametrize("q", ["-bonus", '""', "!!!"])
+def test_search_without_terms_to_match_is_rejected(monkeypatch, q):
+    fake = _SearchRpc()
+    monkeypatch.setattr(reports, "supabase", fake)
+    monkeypatch.setattr(reports.settings, "ANALYTICS_BACKEND", "supabase")
+    with pytest.raises(ValueError):
+        reports.search_messages(q, partial=True)
+    assert fake.params is None
+
+
+def test_008_drops_the_stored_tsvector_column():
+    sql = (MIGRATIONS / "008_messages_search_expression_index.sql").read_text()
+    assert "drop column if exists message_tsv" in sql
+    function = sql[sql.index("create or replace function"):sql.index("$$;")]
+    assert "message_tsv" not in function
@@ -0,0 +1,99 @@
+import pytest
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+from app.services import local_store, search_index  # noqa: E402
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_store.settings, "LOCAL_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(local_store.settings, "SEARCH_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(local_store.settings, "LOCAL_STORE_FLUSH_ROWS", 1_000_000)
+    monkeypatch.setattr(local_store, "_buffer", [])
+    return search_index.SearchIndex()
+
+
+def _row(i: int, message: str, day: int = 1, category: str = "bonus"):
+    return {"id": f"id{i:03d}", "id_user": i, "timestamp": f"2025-01-{day:02d}T10:00:00+00:00",
+            "source": "telegram", "message": message, "category": category, "labels_mask": None,
+            "created_at": "2025-02-01T00:00:00+00:00"}
+
+
+def _ids(result):
+    return [r["id"] for r in result["results"]]
+
+
+def test_bm25_ranks_frequent_terms_in_short_rows_first(index):
+    local_store.append([
+        _row(1, "bonus please"),
+        _row(2, "where is my bonus bonus bonus"),
+        _row(3, "the bonus was mentioned once in a long message about many other things"),
+        _row(4, "deposit failed"),
+    ], skip_existing=True)
+    found = index.search("bonus")
+    assert found["total"] == 3
+    assert _ids(found)[-1] == "id003"
+    assert found["results"][0]["score"] >= found["results"][1]["score"] >= found["results"][2]["score"]
+    assert "**bonus**" in found["results"][0]["snippet"]
+
+
+def test_phrases_match_adjacent_words_in_order(index):
+    local_store.append([
+        _row(1, "my piggy bank is empty"),
+        _row(2, "the bank took my piggy"),
+        _row(3, "piggy and bank"),
+    ], skip_existing=True)
+    assert _ids(index.search('"piggy bank"')) == ["id001"]
+    assert sorted(_ids(index.search("piggy bank"))) == ["id001", "id002", "id003"]
+    assert sorted(_ids(index.search("piggy -empty"))) == ["id002", "id003"]
+
+
+def test_partial_matches_words_containing_the_term(index):
+    local_store.append([_row(1, "my piggybank"), _row(2, "a piggy"), _row(3, "nothing")], skip_existing=True)
+    assert _ids(index.search("piggy")) == ["id002"]
+    assert sorted(_ids(index.search("piggy", partial=True))) == ["id001", "id002"]
+    # phrases stay whole words, like the word-boundary regex of the Postgres partial path
+    assert _ids(index.search('"a piggy"', partial=True)) == ["id002"]
+    assert _ids(index.search('"my piggy"', partial=True)) == []
+
+
+def test_newest_copy_of_an_id_wins(index):
+    local_store.append([_row(i, "bonus missing") for i in range(5)], skip_existing=True)
+    local_store.append([_row(1, "bonus arrived", category="deposit")])
+    local_store.flush()                                    # a second part with id001 again
+    local_store.append([_row(2, "deposit arrived")])       # buffered beats every part
+    found = index.search("bonus")
+    assert found["total"] == 4
+    assert sorted(_ids(found)) == ["id000", "id001", "id003", "id004"]
+    assert next(r for r in found["results"] if r["id"] == "id001")["category"] == "deposit"
+    assert _ids(index.search("missing", category="bonus")) == ["id000", "id003", "id004"]
+    assert sorted(_ids(index.search("arrived"))) == ["id001", "id002"]
+
+
+def test_paging_through_ties_repeats_and_skips_nothing(index):
+    # equal scores and timestamps everywhere: only (segment, row) breaks the ties
+    local_store.append([_row(i, "bonus") for i in range(0, 11)], skip_existing=True)
+    local_store.append([_row(i, "bonus") for i in range(11, 17)])
+    local_store.flush()
+    local_store.append([_row(i, "bonus", day=2) for i in range(17, 20)] + [_row(3, "bonus")])
+    seen, cursor, totals = [], None, set()
+    while True:
+        page = index.search("bonus", limit=4, cursor=cursor)
+        seen += _ids(page)
+        totals.add(page["total"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 20
+    assert set(seen) == {f"id{i:03d}" for i in range(20)}
+    assert seen[:3] == ["id017", "id018", "id019"]       # newest first on equal scores
+    assert totals == {20}
+
+
+def test_bad_queries_and_cursors(index):
+    with pytest.raises(ValueError):
+        index.search("-bonus")
+    with pytest.raises(ValueError):
+        index.search("bonus", cursor="not-a-cursor")
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from app.services.heavy_hitters import HeavyHitters, phrase
+from app.services.hll import RELATIVE_ERROR, HyperLogLog, UserSketches
+
+
+def _rows(n: int, day: str = "2025-01-01", user=lambda i: i):
+    return [{"id_user": user(i), "timestamp": f"{day}T10:00:00+00:00", "category": "bonus", "source": "telegram"}
+            for i in range(n)]
+
+
+# ── HyperLogLog ───────────────────────────────────────────────────────────
+def test_hll_estimate_within_error():
+    h = HyperLogLog()
+    h.add(range(50_000))
+    assert abs(h.estimate() - 50_000) <= 3 * RELATIVE_ERROR * 50_000
+
+
+def test_hll_repeats_and_merge_are_idempotent():
+    a, b = HyperLogLog(), HyperLogLog()
+    a.add(range(1000))
+    b.add(range(500, 1500))
+    before = a.estimate()
+    a.add(range(1000))
+    assert a.estimate() == before
+    assert abs(a.merge(b).estimate() - 1500) <= 3 * RELATIVE_ERROR * 1500
+
+
+def test_unique_users_matches_fetch_messages_on_midnight_rows(monkeypatch):
+    from app import reports
+    from benchmarks import synthetic
+    from benchmarks.fake_supabase import FakeSupabase
+
+    df = synthetic.messages(400)
+    df["timestamp"] = pd.to_datetime(df["timestamp"]).dt.strftime("%Y-%m-%dT00:00:00+00:00")   # as stored
+    monkeypatch.setattr(reports, "supabase", FakeSupabase(df))
+    monkeypatch.setattr(reports.settings, "ANALYTICS_BACKEND", "supabase")
+    sketches = UserSketches()
+    sketches.observe_rows(df.to_dict("records"))
+    days = sorted(pd.to_datetime(df["timestamp"]).dt.tz_localize(None).unique())
+    for lo, hi in [(days[0], days[0]), (days[1], days[3]), (days[2], days[2] + pd.Timedelta(hours=12)), (None, days[4])]:
+        rows = reports.fetch_messages(None, None, lo, hi, columns="id_user,timestamp")
+        assert sketches.unique_users(None, None, lo, hi)[0] == rows["id_user"].nunique(), (lo, hi)
+    assert sketches.unique_users("no-such-category", None, None, None) == (0, 0)
+
+
+def test_loaded_sketches_are_not_warm(tmp_path):
+    sketches = UserSketches()
+    sketches.observe_rows(_rows(10))
+    sketches.save(tmp_path / "users.npz")
+    loaded = UserSketches()
+    assert loaded.load(tmp_path / "users.npz")
+    assert not loaded.warm   # rows stored since the save are missing until the replay
+    assert loaded.unique_users(None, None, None, None)[0] == 10
+
+
+def test_rollup_catch_up_adds_users_other_workers_stored(fake_supabase, monkeypatch):
+    from app import rollups
+    from app.services.anomaly import AnomalyDetector
+
+    sketches = UserSketches()
+    monkeypatch.setattr(rollups, "user_sketches", sketches)
+    monkeypatch.setattr(rollups, "detector", AnomalyDetector())
+    monkeypatch.setattr(rollups, "_mark", None)
+    assert rollups.catch_up() == 0          # nothing to catch up on before the replay
+    rollups.warm_up()
+    before = sketches.unique_users(None, None, None, None)[0]
+    fake_supabase.table("messages").insert([
+        {"id_user": 10_000 + i, "timestamp": "2024-06-01T00:00:00+00:00", "message": "hi",
+         "category": "bonus", "source": "telegram"} for i in range(20)
+    ]).execute()                            # not ingested here
+    assert rollups.catch_up() > 0
+    assert abs(sketches.unique_users(None, None, None, None)[0] - (before + 20)) <= 3 * RELATIVE_ERROR * (before + 20)
+
+
+# ── heavy hitters ─────────────────────────────────────────────────────────
+def _stored(n: int, start: datetime, prefix: str = "m"):
+    return [{"id": f"{prefix}{i}", "id_user": i % 5, "timestamp": (start + timedelta(minutes=i)).isoformat(),
+             "message": f"Where is my bonus {i}?", "created_at": (start + timedelta(minutes=i)).isoformat()}
+            for i in range(n)]
+
+
+def _user_rows(h: HeavyHitters) -> int:
+    return sum(b.rows for (_, kind), b in h._buckets.items() if kind == "user")
+
+
+def test_phrase_masks_numbers():
+    assert phrase("Where is my bonus 123?") == phrase("where is my BONUS 9")
+
+
+def test_top_counts_are_exact_below_capacity():
+    h = HeavyHitters()
+    h.observe_rows(_stored(100, datetime(2025, 1, 1, tzinfo=timezone.utc)))
+    top = h.top("user", k=5)
+    assert top["rows"] == 100
+    assert {item["key"]: item["count"] for item in top["items"]} == {u: 20 for u in range(5)}
+    assert all(item["error"] == 0 for item in top["items"])
+    assert h.top("phrase", k=1)["items"][0]["count"] == 100
+
+
+def test_observe_skips_rows_already_counted():
+    h = HeavyHitters()
+    rows = _stored(10, datetime(2025, 1, 1, tzinfo=timezone.utc))
+    h.observe_rows(rows)
+    h.observe_rows(rows[:5])
+    h.observe_rows([{**rows[0], "id": None}])   # not stored yet – left to catch_up
+    assert _user_rows(h) == 10
+
+
+def test_catch_up_counts_each_stored_row_once(fake_supabase):
+    h = HeavyHitters()
+    assert h.catch_up() == 500 and h.warm
+    stored = fake_supabase.table("messages").insert([
+        {"id_user": 7, "timestamp": "2025-01-02T00:00:00+00:00", "message": "hi", "source": "telegram"}
+        for _ in range(5)
+    ]).execute().data
+    h.observe_rows(stored[:2])   # this worker's ingest
+    h.catch_up()                 # the rest: other workers, scripts
+    h.catch_up()
+    assert _user_rows(h) == 505
+
+
+def test_restart_catches_up_past_the_saved_mark(fake_supabase, tmp_path):
+    h = HeavyHitters()
+    h.catch_up()
+    h.save(tmp_path / "hh.npz")
+    fake_supabase.table("messages").insert([
+        {"id_user": 7, "timestamp": "2024-06-01T00:00:00+00:00", "message": "late", "source": "telegram"}
+        for _ in range(3)
+    ]).execute()   # written after the save, e.g. before a crash
+
+    restarted = HeavyHitters()
+    assert restarted.load(tmp_path / "hh.npz")
+    assert _user_rows(restarted) == 500
+    restarted.catch_up()
+    assert _user_rows(restarted) == 503
+    assert restarted.warm
+
+
+def test_save_load_round_trip(tmp_path):
+    h = HeavyHitters()
+    h.observe_rows(_stored(50, datetime(2025, 1, 1, tzinfo=timezone.utc)))
+    h.save(tmp_path / "hh.npz")
+    loaded = HeavyHitters()
+    loaded.load(tmp_path / "hh.npz")
+    assert loaded.top("user", k=5) == h.top("user", k=5)
+    assert loaded._counted.keys() == h._counted.keys()
+    loaded.observe_rows(_stored(50, datetime(2025, 1, 1, tzinfo=timezone.utc)))
+    assert _user_rows(loaded) == 50
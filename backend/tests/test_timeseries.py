@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from app import reports
+
+
+def _frame(stamps, **cols):
+    return pd.DataFrame({"timestamp": pd.to_datetime(stamps, utc=True), **cols})
+
+
+def test_empty_buckets_are_zero_filled():
+    df = _frame(["2025-01-01T10:00:00Z", "2025-01-01T11:00:00Z", "2025-01-04T09:00:00Z"])
+    out = reports.timeseries(df, "day")
+    assert out == {"points": [{"date": "2025-01-01", "count": 2}, {"date": "2025-01-02", "count": 0},
+                              {"date": "2025-01-03", "count": 0}, {"date": "2025-01-04", "count": 1}],
+                   "downsampled": False}
+    hours = reports.timeseries(df.iloc[:2], "hour")["points"]
+    assert [p["date"] for p in hours] == ["2025-01-01 10:00", "2025-01-01 11:00"]
+
+
+def test_weeks_start_on_monday_and_groups_skip_zeros():
+    df = _frame(["2025-01-05T10:00:00Z", "2025-01-06T10:00:00Z", "2025-01-07T10:00:00Z"],
+                category=["bonus", "bonus", "deposit"])
+    out = reports.timeseries(df, "week", group_by="category")
+    assert out["points"] == [
+        {"date": "2024-12-30", "count": 1, "groups": {"bonus": 1}},
+        {"date": "2025-01-06", "count": 2, "groups": {"bonus": 1, "deposit": 1}},
+    ]
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    y = np.zeros(1000)
+    y[437], y[800] = 50, -20
+    keep = reports.lttb(y, 20)
+    assert len(keep) == 20 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert {437, 800} <= set(keep.tolist())
+    assert reports.lttb(y[:10], 20).tolist() == list(range(10))   # fewer points than asked: all of them
+
+
+def test_timeseries_is_capped_at_max_points():
+    stamps = pd.date_range("2024-01-01", periods=400, freq="D", tz="UTC").repeat(np.arange(400) % 7 + 1)
+    out = reports.timeseries(_frame(stamps), "day", max_points=50)
+    assert out["downsampled"] and len(out["points"]) == 50
+    assert out["points"][0]["date"] == "2024-01-01" and out["points"][-1]["date"] == "2025-02-03"
+    assert reports.timeseries(_frame([]), "day") == {"points": [], "downsampled": False}
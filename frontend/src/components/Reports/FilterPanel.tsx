@@ -45,6 +45,7 @@ const FilterPanel: React.FC<FilterPanelProps> = ({ onApplyFilters, isLoading })
   
   const [startDate, setStartDate] = useState<Date>(new Date('2024-01-01'));
   const [endDate, setEndDate] = useState<Date>(new Date('2025-01-30'));
+  const [dataRange, setDataRange] = useState<{ first: Date; last: Date } | null>(null);
 
   useEffect(() => {
     const fetchCategories = async () => {
@@ -55,7 +56,22 @@ const FilterPanel: React.FC<FilterPanelProps> = ({ onApplyFilters, isLoading })
         console.error("Error fetching categories:", error);
       }
     };
+    // default the picker to the data that actually exists
+    const fetchBounds = async () => {
+      try {
+        const bounds = await api.getBounds();
+        if (bounds.first && bounds.last) {
+          const range = { first: new Date(bounds.first), last: new Date(bounds.last) };
+          setDataRange(range);
+          setStartDate(range.first);
+          setEndDate(range.last);
+        }
+      } catch (error) {
+        console.error("Error fetching dataset bounds:", error);
+      }
+    };
     fetchCategories();
+    fetchBounds();
   }, []);
 
   const handleCategoryChange = (values: string[]) => {
@@ -63,8 +79,9 @@ const FilterPanel: React.FC<FilterPanelProps> = ({ onApplyFilters, isLoading })
   };
 
   const handleDatePresetClick = (days: number) => {
-    const end = new Date();
-    const start = new Date();
+    // presets count back from the newest message, not from today
+    const end = dataRange ? new Date(dataRange.last) : new Date();
+    const start = new Date(end);
     start.setDate(end.getDate() - days);
     
     setStartDate(start);
@@ -191,6 +208,7 @@ const FilterPanel: React.FC<FilterPanelProps> = ({ onApplyFilters, isLoading })
                       if (range?.to) setEndDate(range.to);
                     }}
                     numberOfMonths={2}
+                    disabled={dataRange ? [{ before: dataRange.first }, { after: dataRange.last }] : undefined}
                   />
                 </PopoverContent>
               </Popover>
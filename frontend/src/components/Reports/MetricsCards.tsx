@@ -6,6 +6,7 @@ import { Badge } from "@/components/ui/badge";
 interface MetricsData {
   totalMessages: number;
   uniqueUsers: number;
+  uniqueUsersError?: number;
   spikeAlerts: Array<{
     date: string;
     message: string;
@@ -48,7 +49,13 @@ const MetricsCards: React.FC<MetricsCardsProps> = ({ data, isLoading }) => {
             <div className="h-8 w-16 bg-muted animate-pulse rounded" />
           ) : (
             <p className="text-2xl font-bold">
+              {data?.uniqueUsersError ? "≈" : ""}
               {data ? data.uniqueUsers.toLocaleString() : "0"}
+              {data?.uniqueUsersError ? (
+                <span className="ml-1 text-sm font-normal text-muted-foreground">
+                  ±{data.uniqueUsersError.toLocaleString()}
+                </span>
+              ) : null}
             </p>
           )}
         </CardContent>
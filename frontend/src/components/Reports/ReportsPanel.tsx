@@ -7,10 +7,19 @@ import { api } from "@/services/api";
 const initialMetricsData = {
   totalMessages: 0,
   uniqueUsers: 0,
+  uniqueUsersError: undefined as number | undefined,
   spikeAlerts: [],
   daily_counts: []
 };
 
+// Coarser buckets for longer ranges keep the chart readable
+const pickInterval = (start: string, end: string): "hour" | "day" | "week" => {
+  const days = (new Date(end).getTime() - new Date(start).getTime()) / 86_400_000;
+  if (days <= 3) return "hour";
+  if (days > 180) return "week";
+  return "day";
+};
+
 const ReportsPanel: React.FC = () => {
   const [isLoading, setIsLoading] = useState(false);
   const [metricsData, setMetricsData] = useState(initialMetricsData);
@@ -19,18 +28,31 @@ const ReportsPanel: React.FC = () => {
     setIsLoading(true);
     
     try {
-      const response = await api.getMessagesMetrics({
+      const params = {
         category: filters.categories,
         source: filters.source === "any" ? undefined : filters.source,
         start: filters.dateRange.start,
         end: filters.dateRange.end,
-      });
+      };
+      const [response, series] = await Promise.all([
+        api.getMessagesMetrics(params),
+        api.getTimeseries({
+          ...params,
+          interval: pickInterval(params.start, params.end),
+          groupBy: "category",
+        }),
+      ]);
       
       setMetricsData({
         totalMessages: response.total_messages || 0,
         uniqueUsers: response.unique_users || 0,
+        uniqueUsersError: response.unique_users_error,
         spikeAlerts: response.spike_alerts || [],
-        daily_counts: response.daily_counts || [],
+        daily_counts: series.points.map((p) => ({
+          date: p.date,
+          count: p.count,
+          categories: p.groups,
+        })),
       });
     } catch (error) {
       console.error("Error fetching metrics:", error);
@@ -32,6 +32,8 @@ interface ChatResponse {
 interface MetricsResponse {
   total_messages: number;
   unique_users: number;
+  unique_users_error?: number; // ≈95% bound when counted via HyperLogLog
+  unique_users_exact?: boolean;
   spike_alerts: Array<{
     date: string;
     message: string;
@@ -43,6 +45,30 @@ interface MetricsResponse {
   }>;
 }
 
+interface TimeseriesRequest extends MetricsRequest {
+  interval?: "hour" | "day" | "week";
+  groupBy?: "category" | "source";
+  maxPoints?: number;
+}
+
+interface TimeseriesResponse {
+  interval: "hour" | "day" | "week";
+  group_by: "category" | "source" | null;
+  downsampled: boolean;
+  points: Array<{
+    date: string;
+    count: number;
+    groups?: Record<string, number>;
+  }>;
+}
+
+export interface DatasetBounds {
+  first: string | null;
+  last: string | null;
+  total: number;
+  category_counts: Record<string, number>;
+}
+
 interface ClassifyResponse {
   category: string;
   confidence?: number;
@@ -69,6 +95,19 @@ export const api = {
     }
   },
 
+  // Earliest / latest message and per-category counts
+  getBounds: async (): Promise<DatasetBounds> => {
+    try {
+      const response = await fetch(`${BASE_URL}/messages/bounds`);
+      if (!response.ok) {
+        throw new Error(`HTTP error ${response.status}`);
+      }
+      return await response.json();
+    } catch (error) {
+      return handleError(error as Error);
+    }
+  },
+
   // Chat endpoint
   sendChatMessage: async (request: ChatRequest): Promise<ChatResponse> => {
     try {
@@ -149,6 +188,43 @@ export const api = {
     }
   },
 
+  // Pre-binned counts for the charts
+  getTimeseries: async (params: TimeseriesRequest): Promise<TimeseriesResponse> => {
+    try {
+      const queryParams = new URLSearchParams();
+
+      if (params.category && params.category.length > 0) {
+        queryParams.set("category", params.category.join(","));
+      }
+
+      if (params.source) {
+        queryParams.set("source", params.source);
+      }
+
+      queryParams.set("start", params.start);
+      queryParams.set("end", params.end);
+      queryParams.set("interval", params.interval ?? "day");
+      if (params.groupBy) {
+        queryParams.set("group_by", params.groupBy);
+      }
+      if (params.maxPoints) {
+        queryParams.set("max_points", String(params.maxPoints));
+      }
+
+      const response = await fetch(
+        `${BASE_URL}/messages/timeseries?${queryParams.toString()}`
+      );
+
+      if (!response.ok) {
+        throw new Error(`HTTP error ${response.status}`);
+      }
+
+      return await response.json();
+    } catch (error) {
+      return handleError(error as Error);
+    }
+  },
+
   // Classify endpoint
   classifyMessage: async (request: ClassifyRequest): Promise<ClassifyResponse> => {
     try {